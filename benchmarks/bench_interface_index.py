@@ -0,0 +1,108 @@
+"""
+Бенчмарк поиска активного WAN-интерфейса.
+
+Сравнивает прежний рекурсивный обход JSON с плоским InterfaceIndex на записанных
+дампах `rci/show/interface` или на синтетическом дампе заданного размера.
+
+    python -m benchmarks.bench_interface_index dump1.json dump2.json
+    python -m benchmarks.bench_interface_index --synthetic 500
+"""
+
+import argparse
+import json
+import random
+import time
+
+from src.network.interfaceindex import InterfaceIndex
+
+
+def legacy_find_used_connection(data) -> str:
+    """Рекурсивный обход, который использовался до InterfaceIndex."""
+    active = ""
+    priority = 0
+
+    def recurse(node):
+        nonlocal active, priority
+        if isinstance(node, dict):
+            if node.get("connected", "") == "yes" or node.get("status", "") == "connected":
+                if node.get("priority", 0) > priority:
+                    active = node.get("id")
+                    priority = node.get("priority", 0)
+            for v in node.values():
+                recurse(v)
+        elif isinstance(node, list):
+            for item in node:
+                recurse(item)
+
+    recurse(data)
+    return active
+
+
+def synthetic_dump(interfaces: int, peers: int = 8, seed: int = 1) -> dict:
+    """Дамп с VLAN, Wi-Fi пирами и вложенными записями, помеченными как connected."""
+    rng = random.Random(seed)
+    dump = {}
+    for i in range(interfaces):
+        interface_id = f"Interface{i}"
+        dump[interface_id] = {
+            "id": interface_id,
+            "type": rng.choice(["GigabitEthernet", "Vlan", "WifiStation", "UsbLte", "AccessPoint"]),
+            "priority": rng.randint(0, 60000),
+            "connected": "no",
+            "link": "up",
+            "rssi": -60,
+            "noise": -90,
+            "mcs": 7,
+            "nss": 2,
+            "associations": [
+                {"id": f"{interface_id}/peer{p}", "status": "connected", "priority": 65000, "mac": f"00:00:00:00:{p:02x}"}
+                for p in range(peers)
+            ],
+            "statistics": {"rxbytes": rng.randint(0, 10**9), "txbytes": rng.randint(0, 10**9)},
+        }
+    active = f"Interface{rng.randrange(interfaces)}"
+    dump[active]["connected"] = "yes"
+    dump[active]["priority"] = 50000
+    return dump
+
+
+def timeit(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def run(name: str, dump, repeat: int):
+    index = InterfaceIndex.from_dump(dump)
+    active = index.active_wan()
+    active_id = active.id if active else ""
+    node = dump.get(active_id, {}) if isinstance(dump, dict) else {}
+
+    legacy_us = timeit(lambda: legacy_find_used_connection(dump), repeat)
+    build_us = timeit(lambda: InterfaceIndex.from_dump(dump), repeat)
+    update_us = timeit(lambda: (index.update(active_id, node), index.active_wan()), repeat)
+
+    print(
+        f"{name:<28} interfaces={len(index):<6} legacy={legacy_us:10.1f} us  build={build_us:10.1f} us  "
+        f"update+lookup={update_us:8.2f} us  legacy_active={legacy_find_used_connection(dump)!r} index_active={active_id!r}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска активного интерфейса Keenetic")
+    parser.add_argument("dumps", nargs="*", help="Записанные ответы rci/show/interface в JSON")
+    parser.add_argument("--synthetic", type=int, nargs="+", default=None, help="Размеры синтетических дампов")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for path in args.dumps:
+        with open(path) as f:
+            run(path, json.load(f), args.repeat)
+    sizes = args.synthetic if args.synthetic is not None else ([] if args.dumps else [10, 100, 1000])
+    for size in sizes:
+        run(f"synthetic-{size}", synthetic_dump(size), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Бенчмарк конвейера кадров на синтетическом источнике.
+
+Сценарии:
+    fanout   - пропускная способность распределителя на N потребителей-заглушек и потери кадров
+    pipe     - скорость записи кадров в канал через PipeWriter (приёмник - cat > /dev/null)
+    encoder  - FFmpegRTPStreamer на rtp://127.0.0.1 для каждого профиля SignalPolicyEngine:
+               real-time factor кодировщика и загрузка CPU
+    control  - цикл решения уровня на поддельном KeeneticRCIClient: опросы/с и число переключений
+
+    python -m benchmarks.bench_pipeline main.conf
+    python -m benchmarks.bench_pipeline main.conf --scenarios fanout pipe --consumers 5 --ring-slots 8
+    python -m benchmarks.bench_pipeline main.conf --json results.json
+
+Результаты в JSON удобно сравнивать между версиями перед выкаткой на машины.
+"""
+
+import argparse
+import json
+import random
+import resource
+import subprocess
+import time
+
+from src.config import Config
+from src.controller.bandwidth import BandwidthAllocator
+from src.controller.signalpolicy import SignalPolicyEngine
+from src.handlers.pipewriter import PipeWriter
+from src.handlers.streamerFFmpegRTPS import FFmpegRTPStreamer
+
+from .synthetic import FakeKeeneticRCIClient, NullRTPStreamer, SyntheticInputSource
+
+
+def children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_fanout(config: Config, args) -> dict:
+    source = SyntheticInputSource(
+        config.standard_resolution,
+        fps=args.fps,
+        ring_slots=args.ring_slots,
+        queue_size=args.queue_size,
+        overflow_policy=args.policy,
+    )
+    sinks = [NullRTPStreamer(delay=args.consumer_delay) for _ in range(args.consumers)]
+    for sink in sinks:
+        source.add_consumer(sink.process_frame)
+    source.start()
+    time.sleep(args.duration)
+    source.stop()
+    settings = source.get_current_settings()
+    source.release()
+
+    delivery = settings["distribution"].get("delivery", {})
+    dropped = settings["dropped"] + sum(stats["dropped"] for stats in delivery.values())
+    elapsed = settings["frames"] / settings["fps"] if settings["fps"] else args.duration
+    return {
+        "mode": settings["distribution"]["mode"],
+        "consumers": args.consumers,
+        "source_fps": settings["fps"],
+        "delivered_fps": round(sum(sink.frames for sink in sinks) / elapsed, 1),
+        "delivered_mb_s": round(sum(sink.bytes for sink in sinks) / elapsed / 1e6, 1),
+        "dropped": dropped,
+    }
+
+
+def bench_pipe(config: Config, args) -> dict:
+    width, height = map(int, config.standard_resolution.split("x"))
+    frame = SyntheticInputSource(config.standard_resolution, patterns=1)._frames[0]
+    proc = subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, bufsize=0)
+    writer = PipeWriter(proc.stdin.fileno(), pipe_size=args.pipe_size or width * height * 3, write_timeout=0.5)
+    started = time.monotonic()
+    while time.monotonic() - started < args.duration:
+        writer.write(frame)
+    elapsed = time.monotonic() - started
+    proc.stdin.close()
+    proc.wait()
+    stats = writer.get_stats()
+    return {
+        "pipe_size": stats["pipe_size"],
+        "frames_s": round(stats["frames"] / elapsed, 1),
+        "mb_s": round(stats["bytes"] / elapsed / 1e6, 1),
+        "skipped": stats["skipped"],
+        "stall_avg_ms": stats["stall_avg_ms"],
+        "stall_max_ms": stats["stall_max_ms"],
+    }
+
+
+def bench_encoder(config: Config, args) -> list:
+    results = []
+    engine = SignalPolicyEngine(config)
+    for level, profile in engine.profiles.items():
+        streamer = FFmpegRTPStreamer(
+            {
+                "source_id": "bench",
+                "output_url": f"rtp://127.0.0.1:{args.rtp_port}",
+                "resolution": profile["resolution"],
+                "fps": profile["fps"],
+                "preset": config.encoder_preset,
+                "frame_scaling": False,
+                # Ждём кодировщик, а не теряем кадры: замеряется его собственная скорость
+                "write_timeout": 5.0,
+            }
+        )
+        streamer.apply_profile(profile)
+        source = SyntheticInputSource(profile["resolution"], fps=0)
+        source.add_consumer(streamer.process_frame)
+        cpu_before = children_cpu_seconds()
+        started = time.monotonic()
+        source.start()
+        time.sleep(args.duration)
+        source.stop()
+        elapsed = time.monotonic() - started
+        writer = streamer.get_status()["writer"]
+        streamer.close()
+        source.release()
+        cpu = children_cpu_seconds() - cpu_before
+
+        encoded_fps = writer.get("frames", 0) / elapsed
+        results.append(
+            {
+                "level": level,
+                "profile": f"{profile['resolution']}@{profile['fps']} {profile['bitrate']}",
+                "encoded_fps": round(encoded_fps, 1),
+                "realtime_factor": round(encoded_fps / float(profile["fps"]), 2),
+                "skipped": writer.get("skipped", 0),
+                "cpu_cores": round(cpu / elapsed, 2),
+            }
+        )
+    return results
+
+
+def bench_control(config: Config, args) -> dict:
+    rng = random.Random(1)
+    # Слабый канал с дребезгом и провалом посередине
+    trace = [60 + rng.uniform(-10, 10) for _ in range(200)] + [25 + rng.uniform(-10, 10) for _ in range(50)]
+    client = FakeKeeneticRCIClient(trace, degradation_steps=config.degradation_steps)
+    engine = SignalPolicyEngine(config)
+    allocator = BandwidthAllocator(config)
+    profiles = {source_id: engine.profiles for source_id in config.device_configs} or {"bench": engine.profiles}
+
+    raw_switches = 0
+    previous_raw = None
+    started = time.monotonic()
+    for step in range(len(trace)):
+        client.authenticate()
+        signal = client.get_connection_info()
+        if previous_raw is not None and signal["level"] != previous_raw:
+            raw_switches += 1
+        previous_raw = signal["level"]
+        # Каждый опрос соответствует 5 секундам реального времени
+        allocator.plan_for_level(engine.decide(signal["score"], now=step * 5.0), profiles)
+    elapsed = time.monotonic() - started
+    return {
+        "polls": client.polls,
+        "polls_s": round(client.polls / elapsed, 1),
+        "raw_switches": raw_switches,
+        **{key: value for key, value in engine.get_stats().items() if key in ("switches", "switches_avoided")},
+    }
+
+
+SCENARIOS = {"fanout": bench_fanout, "pipe": bench_pipe, "encoder": bench_encoder, "control": bench_control}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера кадров на синтетическом источнике")
+    parser.add_argument("config", nargs="?", default="main.conf")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=5.0, help="Длительность одного замера, с")
+    parser.add_argument("--fps", type=float, default=0, help="Частота синтетического источника, 0 - без ограничения")
+    parser.add_argument("--consumers", type=int, default=5)
+    parser.add_argument("--consumer-delay", type=float, default=0.0, help="Задержка потребителя-заглушки, с")
+    parser.add_argument("--ring-slots", type=int, default=None)
+    parser.add_argument("--queue-size", type=int, default=None)
+    parser.add_argument("--policy", default=None)
+    parser.add_argument("--pipe-size", type=int, default=None)
+    parser.add_argument("--rtp-port", type=int, default=5004)
+    parser.add_argument("--json", default=None, help="Сохранить результаты в файл")
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    # Параметры конвейера по умолчанию берутся из конфигурации сервиса
+    args.ring_slots = config.frame_ring_slots if args.ring_slots is None else args.ring_slots
+    args.queue_size = config.consumer_queue_size if args.queue_size is None else args.queue_size
+    args.policy = args.policy or config.consumer_overflow_policy
+    args.pipe_size = config.ffmpeg_pipe_size if args.pipe_size is None else args.pipe_size
+
+    results = {}
+    for name in args.scenarios:
+        results[name] = SCENARIOS[name](config, args)
+        rows = results[name] if isinstance(results[name], list) else [results[name]]
+        for row in rows:
+            print(f"{name:<8} " + "  ".join(f"{key}={value}" for key, value in row.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
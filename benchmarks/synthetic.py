@@ -0,0 +1,180 @@
+"""
+Синтетические компоненты для бенчмарков конвейера без камер и роутера.
+
+SyntheticInputSource генерирует кадры NumPy с заданным разрешением и частотой и отдаёт их
+через тот же распределитель, что и настоящие источники. NullRTPStreamer считает кадры и
+байты (и при необходимости пишет их в файл), FakeKeeneticRCIClient отдаёт оценки сигнала
+по заданной трассе.
+"""
+
+import itertools
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from src.abstract.interfacedef import AbstractInputSource, AbstractRTPStreamer
+from src.handlers.framedistributor import create_frame_distributor
+from src.handlers.framering import frame_buffer
+from src.network.rciclient import KeeneticRCIClient
+from src.pkg.latency import first_frame_stats
+
+
+class SyntheticInputSource(AbstractInputSource):
+    """Источник кадров BGR с движущимся градиентом; fps=0 - максимально быстро."""
+
+    def __init__(
+        self,
+        resolution: str = "1920x1080",
+        fps: float = 30.0,
+        ring_slots: int = 0,
+        queue_size: int = 0,
+        overflow_policy: str = "drop_oldest",
+        patterns: int = 8,
+    ):
+        self.width, self.height = map(int, resolution.split("x"))
+        self.fps = float(fps)
+        self.distributor = create_frame_distributor(self.width, self.height, ring_slots, queue_size, overflow_policy)
+        # Кадры готовятся заранее, чтобы генерация не попадала в замер
+        ramp = np.linspace(0, 255, self.width, dtype=np.float32)
+        self._frames = []
+        for i in range(max(1, patterns)):
+            row = ((ramp + i * 256 / patterns) % 256).astype(np.uint8)
+            frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            frame[:] = row[np.newaxis, :, np.newaxis]
+            frame[:, :, 1] = (np.arange(self.height) % 256).astype(np.uint8)[:, np.newaxis]
+            self._frames.append(frame)
+        self.running = False
+        self.thread = None
+        self.frames_generated = 0
+        self.frames_dropped = 0
+        self.started_at = None
+        self.stopped_at = None
+        self.first_frame_at = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.started_at = time.monotonic()
+        self.first_frame_at = None
+        self.thread = threading.Thread(target=self._run, name="synthetic-source", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_due = time.monotonic()
+        for frame in itertools.cycle(self._frames):
+            if not self.running:
+                break
+            if self.distributor.publish(frame, time.monotonic()) is None and hasattr(self.distributor, "ring"):
+                # Все слоты кольца заняты потребителями
+                self.frames_dropped += 1
+            self.frames_generated += 1
+            if self.first_frame_at is None:
+                self.first_frame_at = time.monotonic()
+            if interval:
+                next_due += interval
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_due = time.monotonic()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.stopped_at = time.monotonic()
+
+    def add_consumer(self, consumer_fn):
+        self.distributor.add_consumer(consumer_fn)
+
+    def remove_consumer(self, consumer_fn):
+        self.distributor.remove_consumer(consumer_fn)
+
+    def release(self):
+        self.stop()
+        self.distributor.close()
+
+    def is_active(self) -> bool:
+        return self.running
+
+    def get_current_settings(self) -> dict:
+        elapsed = (self.stopped_at or time.monotonic()) - self.started_at if self.started_at else 0.0
+        return {
+            "active": self.running,
+            "frames": self.frames_generated,
+            "dropped": self.frames_dropped,
+            "fps": round(self.frames_generated / elapsed, 1) if elapsed else 0.0,
+            **first_frame_stats(self.started_at, self.first_frame_at),
+            "distribution": self.distributor.get_stats(),
+        }
+
+
+class NullRTPStreamer(AbstractRTPStreamer):
+    """Стример-заглушка: считает кадры и байты, может писать сырые кадры в файл."""
+
+    def __init__(self, output_path: Optional[str] = None, delay: float = 0.0):
+        self.output_path = output_path
+        self.delay = delay
+        self.profile = None
+        self.frames = 0
+        self.bytes = 0
+        self._file = open(output_path, "wb") if output_path else None
+
+    def process_frame(self, frame_bytes):
+        self.consume_frame(frame_bytes)
+
+    def consume_frame(self, frame_bytes):
+        view = memoryview(frame_buffer(frame_bytes)).cast("B")
+        if self._file:
+            self._file.write(view)
+        if self.delay:
+            # Имитация медленного потребителя
+            time.sleep(self.delay)
+        self.frames += 1
+        self.bytes += len(view)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def apply_profile(self, profile: dict):
+        self.profile = profile
+
+    def update_profile(self, profile: dict):
+        self.apply_profile(profile)
+
+    def start_streaming(self):
+        pass
+
+    def stop_streaming(self):
+        self.close()
+
+    def get_status(self) -> dict:
+        return {"active": True, "profile": self.profile, "frames": self.frames, "bytes": self.bytes}
+
+
+class FakeKeeneticRCIClient:
+    """Заменяет KeeneticRCIClient: отдаёт оценки сигнала из трассы по кругу."""
+
+    def __init__(self, scores: Iterable[float], degradation_steps: int = 3, latency: float = 0.0):
+        self._scores = itertools.cycle(list(scores))
+        self.degradation_steps = degradation_steps
+        self.latency = latency
+        self.polls = 0
+
+    def authenticate(self, force: bool = False) -> bool:
+        return True
+
+    def get_connection_info(self) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        self.polls += 1
+        score = next(self._scores)
+        return {"score": score, "level": KeeneticRCIClient._level_from_score(score, 100, self.degradation_steps)}
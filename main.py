@@ -1,6 +1,7 @@
 from src.restreamer import Restreamer
 from src.config import Config
 from src.pkg.logger import get_logger, LogType
+from src.pkg.metrics import MetricsServer
 import time
 import signal
 import sys
@@ -9,15 +10,18 @@ logger = get_logger(__name__, logType=LogType.SYSLOG)
 
 config = Config('main.conf')
 restreamer = None
+metrics_server = None
 
 def signal_handler(sig, frame):
     logger.info("Завершение работы...")
+    if metrics_server:
+        metrics_server.stop()
     if restreamer:
         restreamer.stop()
     sys.exit(0)
 
 def main():
-    global restreamer
+    global restreamer, metrics_server
     
     restreamer = Restreamer(config)
     
@@ -45,6 +49,10 @@ def main():
     else:
         logger.info("Запуск в режиме стандартного качества")
         restreamer.start_all_quality_mode()
+
+    if config.metrics_enabled:
+        metrics_server = MetricsServer(restreamer, config.metrics_host, config.metrics_port, config.metrics_sample_interval)
+        metrics_server.start()
     
     # Основной цикл с выводом статуса
     try:
@@ -25,8 +25,8 @@ class AbstractFrameDistributor(ABC):
         pass
 
 
-class AbstractInputSource(ABC):
-    """Base class for input sources"""
+class AbstractSourceControl(ABC):
+    """Control side of an input source: lifecycle and status, no access to frames."""
 
     @abstractmethod
     def start(self):
@@ -37,11 +37,11 @@ class AbstractInputSource(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def add_consumer(self, consumer_fn):
+    def is_active(self) -> bool:
         raise NotImplementedError
 
     @abstractmethod
-    def remove_consumer(self, consumer_fn):
+    def get_current_settings(self) -> dict:
         raise NotImplementedError
 
     @abstractmethod
@@ -50,24 +50,35 @@ class AbstractInputSource(ABC):
         self.stop()
 
 
-class AbstractRTPStreamer(ABC):
-    """Abstract base class for RTP streaming."""
+class AbstractInputSource(AbstractSourceControl):
+    """Base class for input sources"""
 
     @abstractmethod
-    def __init__(self, width, height, fps, host, port):
-        """Initialize the RTP streamer with configuration parameters."""
-        self.width = width
-        self.height = height
-        self.fps = fps
-        self.host = host
-        self.port = port
-        self.proc = None
+    def add_consumer(self, consumer_fn):
+        raise NotImplementedError
 
     @abstractmethod
-    def consume_frame(self, frame_bytes: bytes):
-        """Process and send a frame to the RTP stream."""
+    def remove_consumer(self, consumer_fn):
+        raise NotImplementedError
+
+
+class AbstractFrameProcessor(ABC):
+    """Abstract base class for per-frame processing stages."""
+
+    @abstractmethod
+    def process_frame(self, frame_bytes):
+        """Process a frame and return the result, or None if the frame is dropped."""
         pass
 
+    @abstractmethod
+    def release(self):
+        """Release buffers held by the processor."""
+        pass
+
+
+class AbstractStreamerControl(ABC):
+    """Control side of an RTP streamer: encoder lifecycle and profiles, no frame input."""
+
     @abstractmethod
     def close(self):
         """Clean up resources and close the stream."""
@@ -87,3 +98,22 @@ class AbstractRTPStreamer(ABC):
     def stop_streaming(self):
         """Stop the RTP streaming process."""
         pass
+
+
+class AbstractRTPStreamer(AbstractStreamerControl):
+    """Abstract base class for RTP streaming."""
+
+    @abstractmethod
+    def __init__(self, width, height, fps, host, port):
+        """Initialize the RTP streamer with configuration parameters."""
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.host = host
+        self.port = port
+        self.proc = None
+
+    @abstractmethod
+    def consume_frame(self, frame_bytes: bytes):
+        """Process and send a frame to the RTP stream."""
+        pass
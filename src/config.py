@@ -3,6 +3,18 @@ import configparser
 import os
 
 
+@dataclass
+class StreamVariant:
+    path: str
+    resolution: str
+    fps: str
+
+    @property
+    def pixels(self) -> int:
+        width, height = map(int, self.resolution.split("x"))
+        return width * height
+
+
 @dataclass
 class DeviceConfig:
     device_name: str
@@ -12,6 +24,39 @@ class DeviceConfig:
     fps: str
     ip_address: str = None
     stream_path: str = None
+    # Share of the uplink budget relative to other cameras
+    priority: int = 1
+    # Worst profile level the camera is still useful at, None allows every level
+    min_profile: int = None
+    # Extra RTP receivers (host:port) the encoded stream is copied to besides the main output
+    destinations: tuple = ()
+    # Streams the camera serves natively (main stream first), e.g. a low-resolution sub-stream
+    streams: tuple = ()
+
+    def stream_for(self, resolution: str, fps=None):
+        """Smallest native stream that still covers the profile resolution, the largest one if none does.
+
+        fps only breaks ties between streams of the same size: one that keeps up with the profile
+        fps is preferred, but a sub-stream with a lower native fps is still picked over the main one
+        """
+        if not self.streams:
+            return None
+        width, height = map(int, resolution.split("x"))
+        covering = [
+            stream
+            for stream in self.streams
+            if all(int(side) >= limit for side, limit in zip(stream.resolution.split("x"), (width, height)))
+        ]
+        if covering:
+            return min(
+                covering,
+                key=lambda stream: (
+                    stream.pixels,
+                    fps is not None and float(stream.fps) < float(fps),
+                    float(stream.fps),
+                ),
+            )
+        return max(self.streams, key=lambda stream: (stream.pixels, float(stream.fps)))
 
 
 class Config:
@@ -28,6 +73,43 @@ class Config:
         self.timeout = self.config.get("settings", "timeout", fallback="5")
         self.connection_type = self.config.get("settings", "connection_type")
         self.stream_monitor_interval = int(self.config.get("settings", "stream_monitor_interval", fallback="60"))
+        # 0 keeps the copying distributor, N > 0 enables a shared ring of N frame slots per source
+        self.frame_ring_slots = int(self.config.get("settings", "frame_ring_slots", fallback="0"))
+        # 0 delivers frames synchronously, N > 0 gives each consumer its own worker and a queue of N frames
+        self.consumer_queue_size = int(self.config.get("settings", "consumer_queue_size", fallback="0"))
+        # drop_oldest | drop_newest | latest | block
+        self.consumer_overflow_policy = self.config.get("settings", "consumer_overflow_policy", fallback="drop_oldest")
+        # ffmpeg stdin pipe size in bytes, 0 sizes it to one frame of the active profile
+        self.ffmpeg_pipe_size = int(self.config.get("settings", "ffmpeg_pipe_size", fallback="0"))
+        self.ffmpeg_write_timeout = float(self.config.get("settings", "ffmpeg_write_timeout", fallback="0.5"))
+        # restart | handover (start the new encoder in parallel and swap after a short overlap)
+        self.profile_switch_mode = self.config.get("settings", "profile_switch_mode", fallback="restart")
+        self.handover_frames = int(self.config.get("settings", "handover_frames", fallback="5"))
+        self.handover_timeout = float(self.config.get("settings", "handover_timeout", fallback="2.0"))
+        # Scale and decimate frames to the active profile before they reach the encoder pipe
+        self.frame_scaling = self.config.getboolean("settings", "frame_scaling", fallback=True)
+        # Remux IP cameras to RTP with -c copy while the top profile is active
+        self.rtsp_passthrough = self.config.getboolean("settings", "rtsp_passthrough", fallback=False)
+        self.rtsp_transport = self.config.get("settings", "rtsp_transport", fallback="tcp")
+        # Route encoder output through an in-process RTP fan-out so receivers can be added at runtime;
+        # always on for devices listed in device_destinations
+        self.rtp_fanout = self.config.getboolean("settings", "rtp_fanout", fallback=False)
+        # Interface the relay sockets are bound to: it sends to the receivers and takes their RTCP reports
+        # from them, so a loopback bind would cut off every off-box destination
+        self.rtp_fanout_host = self.config.get("settings", "rtp_fanout_host", fallback="0.0.0.0")
+        # Start a camera pipeline only once its stream has a subscriber or destination and tear it
+        # down after idle_timeout seconds without one; always_on devices run regardless
+        self.lazy_start = self.config.getboolean("settings", "lazy_start", fallback=False)
+        self.idle_timeout = float(self.config.get("settings", "idle_timeout", fallback="60"))
+        # Sources are brought up concurrently; each open (and wait for the first frame) is bounded by
+        # source_open_timeout, failed sources are retried in the background starting at source_retry_interval
+        self.source_open_timeout = float(self.config.get("settings", "source_open_timeout", fallback="5"))
+        self.source_retry_interval = float(self.config.get("settings", "source_retry_interval", fallback="5"))
+        # opencv: cv2.VideoCapture, ffmpeg: ffmpeg subprocess decoding to rawvideo on a pipe,
+        # scaled to the active profile resolution with decode_threads threads
+        self.input_backend = self.config.get("settings", "input_backend", fallback="opencv")
+        self.decode_threads = int(self.config.get("settings", "decode_threads", fallback="2"))
+        self.always_on = [name.strip() for name in self.config.get("settings", "always_on", fallback="").split(",") if name.strip()]
 
         self.standard_resolution = self.config.get("Profile", "resolution")
         self.standard_bitrate = self.config.get("Profile", "bitrate")
@@ -46,6 +128,71 @@ class Config:
         self.ping_ip = self.config.get("connection_check", "ping_ip")
         self.curl_url = self.config.get("connection_check", "curl_url")
 
+        # thread: all pipelines in this process, process: one worker process per camera pipeline
+        self.execution_mode = self.config.get("settings", "execution_mode", fallback="thread")
+
+        # thread: sleep-polling monitor, async: asyncio loop with poll/apply deadlines and concurrent apply
+        self.control_loop = self.config.get("settings", "control_loop", fallback="thread")
+        self.poll_timeout = float(self.config.get("settings", "poll_timeout", fallback="3"))
+        self.apply_timeout = float(self.config.get("settings", "apply_timeout", fallback="10"))
+
+        # Encoder settings
+        self.encoder_preset = self.config.get("encoder", "preset", fallback="ultrafast")
+        self.encoder_tuning_file = self.config.get("encoder", "tuning_file", fallback="encoder_tuning.json")
+        # An encoder below min_speed for slow_reports progress reports while the pipe pushes back gets a cheaper profile
+        self.encoder_min_speed = float(self.config.get("encoder", "min_speed", fallback="0.95"))
+        self.encoder_slow_reports = int(self.config.get("encoder", "slow_reports", fallback="6"))
+        # Each recover_checks consecutive encoder checks without overload lift one level of that downgrade
+        self.encoder_recover_checks = int(self.config.get("encoder", "recover_checks", fallback="12"))
+
+        # Signal decision stage: EWMA weights (drops are followed faster than recoveries),
+        # score margins past a level boundary and minimum seconds at a level before leaving it
+        self.policy_alpha_down = float(self.config.get("policy", "alpha_down", fallback="0.6"))
+        self.policy_alpha_up = float(self.config.get("policy", "alpha_up", fallback="0.2"))
+        self.policy_downgrade_margin = float(self.config.get("policy", "downgrade_margin", fallback="2"))
+        self.policy_upgrade_margin = float(self.config.get("policy", "upgrade_margin", fallback="8"))
+        self.policy_downgrade_dwell = float(self.config.get("policy", "downgrade_dwell", fallback="2"))
+        self.policy_upgrade_dwell = float(self.config.get("policy", "upgrade_dwell", fallback="30"))
+
+        # Uplink budget split across cameras by device_priority / device_min_profile
+        self.bandwidth_allocator = self.config.getboolean("bandwidth", "enabled", fallback=False)
+        self.uplink_kbps = int(self.config.get("bandwidth", "uplink_kbps", fallback="10000"))
+        self.uplink_headroom = float(self.config.get("bandwidth", "headroom", fallback="0.8"))
+
+        # RTCP receiver reports collected on a UDP port and fed into the signal policy as a second score
+        self.feedback_enabled = self.config.getboolean("feedback", "enabled", fallback=False)
+        self.feedback_host = self.config.get("feedback", "host", fallback="0.0.0.0")
+        self.feedback_port = int(self.config.get("feedback", "port", fallback="6000"))
+        # Reports older than max_age seconds are ignored
+        self.feedback_max_age = float(self.config.get("feedback", "max_age", fallback="10"))
+        # Values at which the delivery score drops to 0
+        self.feedback_loss_bad = float(self.config.get("feedback", "loss_bad", fallback="0.1"))
+        self.feedback_jitter_bad_ms = float(self.config.get("feedback", "jitter_bad_ms", fallback="100"))
+        self.feedback_rtt_bad_ms = float(self.config.get("feedback", "rtt_bad_ms", fallback="500"))
+
+        # Local Prometheus endpoint; status is sampled every sample_interval seconds, scrapes read the cached text
+        self.metrics_enabled = self.config.getboolean("metrics", "enabled", fallback=False)
+        self.metrics_host = self.config.get("metrics", "host", fallback="127.0.0.1")
+        self.metrics_port = int(self.config.get("metrics", "port", fallback="9108"))
+        self.metrics_sample_interval = float(self.config.get("metrics", "sample_interval", fallback="5"))
+        # Number of signal polls kept for get_status and metrics
+        self.signal_history_size = int(self.config.get("metrics", "signal_history", fallback="120"))
+
+        # At the worst signal level tile every camera into one low-bitrate stream instead of dropping the IP cameras
+        self.mosaic_enabled = self.config.getboolean("mosaic", "enabled", fallback=False)
+        self.mosaic_resolution = self.config.get("mosaic", "resolution", fallback="1280x720")
+        self.mosaic_bitrate = self.config.get("mosaic", "bitrate", fallback="800k")
+        self.mosaic_fps = self.config.get("mosaic", "fps", fallback="10")
+        self.mosaic_output = self.config.get("mosaic", "output", fallback=self.camera_output)
+
+        # Static cameras drop to keepalive_fps and min_bitrate after static_after seconds without motion
+        self.motion_devices = [name.strip() for name in self.config.get("motion", "devices", fallback="").split(",") if name.strip()]
+        self.motion_static_after = float(self.config.get("motion", "static_after", fallback="30"))
+        self.motion_keepalive_fps = float(self.config.get("motion", "keepalive_fps", fallback="2"))
+        self.motion_min_bitrate = self.config.get("motion", "min_bitrate", fallback="200k")
+        # Share of the downsampled frame that must change to count as motion
+        self.motion_threshold = float(self.config.get("motion", "threshold", fallback="0.01"))
+
         # Adaptive mode settings
         self.adaptive_mode = self.config.getboolean("adaptive_mode", "enabled", fallback=True)
 
@@ -57,13 +204,19 @@ class Config:
         if not input_devices_str:
             return
 
+        priorities = self._parse_device_map("device_priority")
+        min_profiles = self._parse_device_map("device_min_profile")
+        destinations = self._parse_device_map("device_destinations", str)
+
         devices = input_devices_str.split(",")
         for device in devices:
             parts = device.split(";")
             if len(parts) >= 3:
                 device_name = parts[0].strip()
                 ip_address = parts[1].strip()
-                stream_path = parts[2].strip()
+                # path[@WxH@fps]|path[@WxH@fps]...: the first stream is the main one
+                streams = tuple(self._parse_stream(item) for item in parts[2].split("|") if item.strip())
+                stream_path = streams[0].path if streams else ""
 
                 full_stream_url = f"rtsp://{self.camera_login}:{self.camera_password}@{ip_address}:{self.camera_port}"
 
@@ -75,6 +228,10 @@ class Config:
                     fps=self.standard_fps,
                     ip_address=full_stream_url,
                     stream_path=stream_path,
+                    priority=priorities.get(device_name, 1),
+                    min_profile=min_profiles.get(device_name),
+                    destinations=tuple(url.strip() for url in destinations.get(device_name, "").split("|") if url.strip()),
+                    streams=streams,
                 )
 
                 self.device_configs[device_name] = device_config
@@ -82,6 +239,21 @@ class Config:
                 # Log warning for improperly formatted device entries
                 print(f"Warning: Device entry '{device}' is not properly formatted. Expected format: 'name;ip;path'")
 
+    def _parse_stream(self, item):
+        """Parse 'path@WxH@fps'; untagged streams are taken to match the standard profile"""
+        path, _, tags = item.strip().partition("@")
+        resolution, _, fps = tags.partition("@")
+        return StreamVariant(path=path, resolution=resolution or self.standard_resolution, fps=fps or self.standard_fps)
+
+    def _parse_device_map(self, key, value_type=int):
+        """Parse 'name:value,name:value' maps from the Profile section"""
+        result = {}
+        for item in self.config.get("Profile", key, fallback="").split(","):
+            name, _, value = item.partition(":")
+            if name.strip() and value.strip():
+                result[name.strip()] = value_type(value.strip())
+        return result
+
     def get_device_by_ip(self, ip_address):
         for device_name, device_config in self.device_configs.items():
             if device_config.ip_address == ip_address:
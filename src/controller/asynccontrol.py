@@ -0,0 +1,181 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+
+from ..pkg.logger import LogType
+from ..pkg.logger import get_logger
+
+
+logger = get_logger(__name__, logType=LogType.BOTH)
+
+
+class AsyncControlLoop:
+    """
+    asyncio-цикл управления качеством для Restreamer.
+
+    Опрос роутера выполняется в пуле потоков и ограничен дедлайном, поэтому зависший HTTP-запрос
+    не задерживает следующий опрос. Профили всех источников применяются параллельно в отдельном
+    пуле, каждое применение ограничено своим дедлайном. После дедлайна Restreamer прерывает
+    применение, а источник применяется заново на следующих опросах, когда зависший поток
+    освободится. Пока он не освободился, новое применение для источника не запускается. Время
+    реакции на изменение канала определяется самым медленным стримером, а не суммой всех
+    перезапусков.
+    """
+
+    def __init__(self, restreamer, poll_interval: float = 5.0, poll_timeout: float = 3.0, apply_timeout: float = 10.0):
+        self.restreamer = restreamer
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+        self.apply_timeout = apply_timeout
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._apply_executor: Optional[ThreadPoolExecutor] = None
+        # Незавершённые применения профиля по источникам и источники, которые нужно применить заново
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stalled: Set[str] = set()
+
+        self.polls = 0
+        self.poll_timeouts = 0
+        self.poll_errors = 0
+        self.apply_timeouts: Dict[str, int] = {}
+        self.apply_skipped: Dict[str, int] = {}
+        self.last_reaction_time = None
+
+    def start(self):
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), name="control-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._loop and self._stop_event:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        # Применения идут в своём пуле: зависшее применение не отнимает потоки у опроса роутера.
+        # На источник приходится не больше одного применения, ещё один поток - для мозаики
+        self._apply_executor = ThreadPoolExecutor(
+            max_workers=len(self.restreamer.input_sources) + 1, thread_name_prefix="apply"
+        )
+        executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="control")
+        self._loop.set_default_executor(executor)
+        try:
+            while not self._stop_event.is_set():
+                await self._poll_once()
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._apply_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_blocking(self, fn, *args):
+        return await self._loop.run_in_executor(None, fn, *args)
+
+    async def _poll_once(self):
+        self.polls += 1
+        try:
+            signal = await asyncio.wait_for(self._run_blocking(self.restreamer.poll_signal), self.poll_timeout)
+        except asyncio.TimeoutError:
+            self.poll_timeouts += 1
+            logger.warning(f"[CONTROL] Опрос роутера не уложился в {self.poll_timeout} с")
+            return
+        except Exception as e:
+            self.poll_errors += 1
+            logger.error(f"[CONTROL] Ошибка опроса роутера: {e}")
+            return
+
+        signal_level = self.restreamer.decide_signal_level(signal)
+        try:
+            membership_changed = await self._run_blocking(self.restreamer.refresh_source_membership)
+        except Exception as e:
+            logger.error(f"[CONTROL] Ошибка проверки состава камер: {e}")
+            membership_changed = False
+        if signal_level != self.restreamer.current_signal_level or membership_changed:
+            logger.info(
+                f"[CONTROL] Изменение уровня сигнала с {self.restreamer.current_signal_level} на {signal_level}"
+            )
+            await self.apply_level(signal_level)
+            self.restreamer.current_signal_level = signal_level
+        else:
+            try:
+                await self._run_blocking(self.restreamer.check_encoder_speed, signal_level)
+            except Exception as e:
+                logger.error(f"[CONTROL] Ошибка проверки скорости кодировщиков: {e}")
+            await self._reapply_stalled(signal_level)
+
+    async def _reapply_stalled(self, signal_level: int):
+        """Заново применяет план к источникам, чьё применение было прервано и уже освободилось."""
+        ready = [source_id for source_id in self._stalled if not self._apply_running(source_id)]
+        mosaic = self.restreamer.mosaic
+        if not ready or (mosaic is not None and mosaic.active):
+            return
+        plan = self.restreamer.current_plan or self.restreamer._plan_quality_policy(signal_level)
+        logger.info(f"[CONTROL] Повторное применение профиля для {', '.join(sorted(ready))}")
+        results = await asyncio.gather(
+            *(self._apply_source(source_id, plan.get(source_id)) for source_id in ready), return_exceptions=True
+        )
+        for source_id, result in zip(ready, results):
+            if isinstance(result, Exception):
+                logger.error(f"[CONTROL] Ошибка повторного применения профиля для {source_id}: {result}")
+
+    async def apply_level(self, signal_level: int):
+        """Параллельно применяет профили уровня сигнала ко всем источникам."""
+        if not self.restreamer.policy_engines:
+            logger.error("[CONTROL] Нет доступных policy engines для применения!")
+            return
+        started = self._loop.time()
+        if await self._loop.run_in_executor(self._apply_executor, self.restreamer.update_mosaic, signal_level):
+            self.last_reaction_time = self._loop.time() - started
+            logger.info(f"[CONTROL] Уровень {signal_level} обслуживается мозаикой")
+            return
+        plan = self.restreamer._plan_quality_policy(signal_level)
+        results = await asyncio.gather(
+            *(self._apply_source(source_id, level) for source_id, level in plan.items()),
+            return_exceptions=True,
+        )
+        for source_id, result in zip(plan, results):
+            if isinstance(result, Exception):
+                logger.error(f"[CONTROL] Ошибка применения профиля для {source_id}: {result}")
+        self.last_reaction_time = self._loop.time() - started
+        logger.info(f"[CONTROL] Уровень {signal_level} применён за {self.last_reaction_time:.2f} с")
+
+    def _apply_running(self, source_id: str) -> bool:
+        future = self._inflight.get(source_id)
+        return future is not None and not future.done()
+
+    async def _apply_source(self, source_id: str, level: Optional[int]):
+        if self._apply_running(source_id):
+            # Прерванное применение ещё держит блокировку источника: новое встало бы за ним в очередь
+            self.apply_skipped[source_id] = self.apply_skipped.get(source_id, 0) + 1
+            self._stalled.add(source_id)
+            logger.warning(f"[CONTROL] Применение профиля для {source_id} ещё не завершилось, источник обновится позже")
+            return
+        future = self._loop.run_in_executor(self._apply_executor, self.restreamer._apply_source_level, source_id, level)
+        self._inflight[source_id] = future
+        # Ошибка применения, завершившегося уже после дедлайна, забирается здесь, чтобы asyncio её не ругал
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        try:
+            # shield: поток пула не отменить, поэтому дедлайн только прекращает ожидание
+            await asyncio.wait_for(asyncio.shield(future), self.apply_timeout)
+            self._stalled.discard(source_id)
+        except asyncio.TimeoutError:
+            self.apply_timeouts[source_id] = self.apply_timeouts.get(source_id, 0) + 1
+            self._stalled.add(source_id)
+            await self._run_blocking(self.restreamer._abort_source_update, source_id)
+
+    def get_status(self) -> dict:
+        return {
+            "polls": self.polls,
+            "poll_timeouts": self.poll_timeouts,
+            "poll_errors": self.poll_errors,
+            "apply_timeouts": dict(self.apply_timeouts),
+            "apply_skipped": dict(self.apply_skipped),
+            "pending_reapply": sorted(self._stalled),
+            "last_reaction_s": round(self.last_reaction_time, 3) if self.last_reaction_time is not None else None,
+        }
@@ -0,0 +1,104 @@
+from typing import Dict, Iterable, Optional
+
+from ..config import Config
+from ..pkg.logger import LogType
+from ..pkg.logger import get_logger
+
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+
+def bitrate_kbps(profile: dict) -> int:
+    return int(str(profile["bitrate"]).rstrip("kK"))
+
+
+class BandwidthAllocator:
+    """
+    Делит пропускную способность uplink между камерами.
+
+    Уровень сигнала переводится в общий бюджет битрейта. Сначала каждая камера в порядке
+    приоритета получает свой минимально допустимый профиль; камеры, которым не хватило
+    бюджета, отключаются. Остаток раздаётся по одному уровню качества той камере, у которой
+    меньше всего битрейта на единицу приоритета, пока следующий шаг помещается в бюджет.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.uplink_kbps = config.uplink_kbps
+        self.headroom = config.uplink_headroom
+        self.levels = config.degradation_steps + 1
+        self.budget = 0
+        self.allocated = 0
+        self.plan: Dict[str, Optional[int]] = {}
+
+    def budget_kbps(self, signal_level: int) -> int:
+        """Бюджет битрейта для уровня сигнала: уровень 0 - весь uplink с запасом headroom."""
+        signal_level = min(max(signal_level, 0), self.levels - 1)
+        return int(self.uplink_kbps * self.headroom * (self.levels - signal_level) / self.levels)
+
+    def _priority(self, source_id: str) -> int:
+        device = self.config.device_configs.get(source_id)
+        return max(1, device.priority) if device else 1
+
+    def _min_level(self, source_id: str, profiles: Dict[int, dict]) -> int:
+        worst = len(profiles) - 1
+        device = self.config.device_configs.get(source_id)
+        if device is None or device.min_profile is None:
+            return worst
+        return min(max(device.min_profile, 0), worst)
+
+    def allocate(self, budget: int, profiles: Dict[str, Dict[int, dict]]) -> Dict[str, Optional[int]]:
+        """Распределяет бюджет; возвращает source_id -> уровень профиля, None - камера отключается."""
+        plan: Dict[str, Optional[int]] = {source_id: None for source_id in profiles}
+        remaining = budget
+        order = sorted(profiles, key=self._priority, reverse=True)
+
+        for source_id in order:
+            level = self._min_level(source_id, profiles[source_id])
+            cost = bitrate_kbps(profiles[source_id][level])
+            if cost <= remaining:
+                plan[source_id] = level
+                remaining -= cost
+            else:
+                logger.warning(f"[BANDWIDTH] Для {source_id} не хватает бюджета на минимальный профиль ({cost}k)")
+
+        while True:
+            best = None
+            for source_id in order:
+                level = plan[source_id]
+                if level is None or level == 0:
+                    continue
+                current = bitrate_kbps(profiles[source_id][level])
+                step = bitrate_kbps(profiles[source_id][level - 1]) - current
+                if step > remaining:
+                    continue
+                share = current / self._priority(source_id)
+                if best is None or share < best[0]:
+                    best = (share, source_id, step)
+            if best is None:
+                break
+            _, source_id, step = best
+            plan[source_id] -= 1
+            remaining -= step
+
+        self.budget = budget
+        self.allocated = budget - remaining
+        self.plan = dict(plan)
+        return plan
+
+    def plan_for_level(
+        self, signal_level: int, profiles: Dict[str, Dict[int, dict]], excluded: Iterable[str] = ()
+    ) -> Dict[str, Optional[int]]:
+        """План для уровня сигнала; исключённые (выпавшие) камеры не получают долю бюджета."""
+        excluded = set(excluded)
+        plan = self.allocate(
+            self.budget_kbps(signal_level),
+            {source_id: p for source_id, p in profiles.items() if source_id not in excluded},
+        )
+        plan.update({source_id: None for source_id in excluded if source_id in profiles})
+        self.plan = dict(plan)
+        logger.info(f"[BANDWIDTH] Бюджет {self.budget}k, распределено {self.allocated}k: {plan}")
+        return plan
+
+    def get_stats(self) -> dict:
+        return {"budget_kbps": self.budget, "allocated_kbps": self.allocated, "plan": dict(self.plan)}
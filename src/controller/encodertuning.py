@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ..config import Config
+from ..pkg.logger import LogType
+from ..pkg.logger import get_logger
+from .signalpolicy import SignalPolicyEngine
+
+
+logger = get_logger(__name__, logType=LogType.BOTH)
+
+# От самого быстрого к самому качественному
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium"]
+
+
+def profile_key(profile: dict) -> str:
+    return f"{profile['resolution']}@{profile['fps']}@{profile['bitrate']}"
+
+
+class EncoderTuning:
+    """Сохранённая таблица лучших настроек libx264 (preset, threads) для каждого профиля."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.settings: Dict[str, dict] = {}
+
+    def load(self) -> "EncoderTuning":
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                self.settings = json.load(f)
+            logger.info(f"[TUNING] Загружены настройки энкодера для {len(self.settings)} профилей из {self.path}")
+        return self
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.settings, f, indent=2, ensure_ascii=False)
+        logger.info(f"[TUNING] Настройки энкодера сохранены в {self.path}")
+
+    def apply(self, profile: dict) -> dict:
+        """Возвращает профиль, дополненный откалиброванными preset и threads."""
+        tuned = self.settings.get(profile_key(profile))
+        if not tuned:
+            return profile
+        return {**profile, "preset": tuned["preset"], "threads": tuned["threads"]}
+
+
+class EncoderCalibrator:
+    """
+    Подбирает preset и число потоков libx264 для каждого профиля SignalPolicyEngine.
+
+    Для каждой комбинации одновременно запускается столько кодировщиков, сколько камер
+    работает в сервисе, и измеряется минимальная скорость (real-time factor) и суммарная
+    загрузка CPU. Выбирается самый качественный preset, при котором все кодировщики
+    остаются быстрее реального времени.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        concurrency: int = None,
+        duration: float = 5.0,
+        presets: List[str] = None,
+        thread_counts: List[int] = None,
+        target_speed: float = 1.0,
+        input_file: str = None,
+    ):
+        self.config = config
+        self.concurrency = concurrency or max(1, len(config.device_configs))
+        self.duration = duration
+        self.presets = presets or X264_PRESETS
+        cores = os.cpu_count() or 1
+        self.cores = cores
+        self.thread_counts = thread_counts or sorted({1, 2, max(1, cores // self.concurrency)})
+        self.target_speed = target_speed
+        self.input_file = input_file
+
+    def _input_args(self, profile: dict) -> List[str]:
+        width, height = profile["resolution"].split("x")
+        if self.input_file:
+            return [
+                "-stream_loop",
+                "-1",
+                "-i",
+                self.input_file,
+                "-vf",
+                f"scale={width}:{height},fps={profile['fps']}",
+            ]
+        return ["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={profile['fps']}"]
+
+    def _command(self, profile: dict, preset: str, threads: int) -> List[str]:
+        return [
+            "ffmpeg",
+            "-hide_banner",
+            "-nostats",
+            "-loglevel",
+            "error",
+            *self._input_args(profile),
+            "-t",
+            str(self.duration),
+            "-an",
+            "-pix_fmt",
+            "yuv420p",
+            "-c:v",
+            "libx264",
+            "-preset",
+            preset,
+            "-tune",
+            "zerolatency",
+            "-threads",
+            str(threads),
+            "-b:v",
+            profile["bitrate"],
+            "-x264-params",
+            "keyint=30:scenecut=0",
+            "-progress",
+            "pipe:1",
+            "-f",
+            "null",
+            "-",
+        ]
+
+    @staticmethod
+    def _read_speed(proc: subprocess.Popen, speeds: List[float]):
+        speed = 0.0
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "speed" and value.endswith("x"):
+                try:
+                    speed = float(value[:-1])
+                except ValueError:
+                    pass
+        proc.wait()
+        speeds.append(speed if proc.returncode == 0 else 0.0)
+
+    def run_trial(self, profile: dict, preset: str, threads: int) -> dict:
+        """Кодирует `concurrency` потоков одновременно и возвращает худшую скорость и загрузку CPU."""
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        started = time.monotonic()
+        speeds: List[float] = []
+        readers = []
+        for _ in range(self.concurrency):
+            proc = subprocess.Popen(
+                self._command(profile, preset, threads),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+            reader = threading.Thread(target=self._read_speed, args=(proc, speeds), daemon=True)
+            reader.start()
+            readers.append(reader)
+        for reader in readers:
+            reader.join()
+        wall = time.monotonic() - started
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        result = {
+            "preset": preset,
+            "threads": threads,
+            "speed": round(min(speeds) if speeds else 0.0, 3),
+            "cpu_cores": round(cpu_seconds / wall, 2) if wall else 0.0,
+        }
+        logger.info(f"[TUNING] {profile_key(profile)} {result}")
+        return result
+
+    def calibrate_profile(self, profile: dict) -> Optional[dict]:
+        best = None
+        fastest = None
+        for preset in self.presets:
+            passing = []
+            for threads in self.thread_counts:
+                result = self.run_trial(profile, preset, threads)
+                if fastest is None or result["speed"] > fastest["speed"]:
+                    fastest = result
+                if result["speed"] >= self.target_speed:
+                    passing.append(result)
+            if not passing:
+                # Более медленные пресеты тем более не уложатся в реальное время
+                break
+            best = min(passing, key=lambda r: r["cpu_cores"])
+        if best is None:
+            logger.warning(f"[TUNING] Профиль {profile_key(profile)} не достигает {self.target_speed}x, берём самый быстрый")
+            best = fastest
+        return best
+
+    def run(self, tuning_path: str) -> EncoderTuning:
+        tuning = EncoderTuning(tuning_path)
+        engine = SignalPolicyEngine(self.config)
+        for profile in engine.profiles.values():
+            best = self.calibrate_profile(profile)
+            if best:
+                tuning.settings[profile_key(profile)] = best
+        tuning.save()
+        return tuning
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Калибровка preset/threads libx264 для профилей качества")
+    parser.add_argument("config", nargs="?", default="main.conf")
+    parser.add_argument("--duration", type=float, default=5.0, help="Длительность одного замера, с")
+    parser.add_argument("--concurrency", type=int, default=None, help="Число одновременных кодировщиков")
+    parser.add_argument("--input", default=None, help="Записанный ролик вместо синтетического testsrc2")
+    parser.add_argument("--target-speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    calibrator = EncoderCalibrator(
+        config,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        target_speed=args.target_speed,
+        input_file=args.input,
+    )
+    calibrator.run(config.encoder_tuning_file)
+
+
+if __name__ == "__main__":
+    main()
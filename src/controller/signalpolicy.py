@@ -1,3 +1,5 @@
+import time
+
 from ..config import Config
 from ..pkg.logger import LogType
 from ..pkg.logger import get_logger
@@ -13,6 +15,106 @@ class SignalPolicyEngine:
         self.config = config
         self.create_degradation_profiles(config)
 
+        # Стадия принятия решения: сглаживание оценки и гистерезис между уровнями
+        self.alpha_down = config.policy_alpha_down
+        self.alpha_up = config.policy_alpha_up
+        self.downgrade_margin = config.policy_downgrade_margin
+        self.upgrade_margin = config.policy_upgrade_margin
+        self.downgrade_dwell = config.policy_downgrade_dwell
+        self.upgrade_dwell = config.policy_upgrade_dwell
+        # Вторая оценка по отчётам приёмников (RTCP RR): потери, джиттер и RTT
+        self.loss_bad = config.feedback_loss_bad
+        self.jitter_bad_ms = config.feedback_jitter_bad_ms
+        self.rtt_bad_ms = config.feedback_rtt_bad_ms
+        self.radio_score = None
+        self.feedback_score = None
+        self.smoothed_score = None
+        self.level = 0
+        self._level_since = None
+        self._last_raw_level = 0
+        self.switches = 0
+        self.switches_avoided = 0
+
+    def level_from_score(self, score: float) -> int:
+        """Уровень по оценке 0..100, та же шкала, что и у KeeneticRCIClient."""
+        levels = self.config.degradation_steps
+        step = 100 // levels
+        return int(min(levels, max(0, (100 - score) // step)))
+
+    def score_feedback(self, feedback: dict) -> float:
+        """Оценка 0..100 по фактической доставке: худшая из оценок по потерям, джиттеру и RTT."""
+
+        def penalty(value, bad):
+            if value is None or bad <= 0:
+                return 100.0
+            return 100.0 * (1.0 - min(1.0, value / bad))
+
+        return min(
+            penalty(feedback.get("loss_fraction"), self.loss_bad),
+            penalty(feedback.get("jitter_ms"), self.jitter_bad_ms),
+            penalty(feedback.get("rtt_ms"), self.rtt_bad_ms),
+        )
+
+    def decide(self, score: float, now: float = None, feedback: dict = None) -> int:
+        """
+        Возвращает уровень деградации с учётом сглаживания и гистерезиса.
+
+        Если есть свежая обратная связь от приёмников, используется худшая из оценок радиоканала
+        и доставки: хороший RSSI не спасает от перегруженной соты.
+
+        Оценка сглаживается EWMA, причём падение учитывается быстрее роста. Понижение качества
+        происходит сразу на нужный уровень, как только сглаженная оценка ушла за границу уровня
+        на downgrade_margin и текущий уровень держится не меньше downgrade_dwell. Повышение идёт
+        по одному уровню, требует запаса upgrade_margin и удержания upgrade_dwell.
+        """
+        now = time.monotonic() if now is None else now
+        self.radio_score = score
+        self.feedback_score = self.score_feedback(feedback) if feedback else None
+        if self.feedback_score is not None:
+            score = min(score, self.feedback_score)
+        if self._level_since is None:
+            self._level_since = now
+
+        if self.smoothed_score is None:
+            self.smoothed_score = float(score)
+        else:
+            alpha = self.alpha_down if score < self.smoothed_score else self.alpha_up
+            self.smoothed_score += alpha * (score - self.smoothed_score)
+
+        raw_level = self.level_from_score(score)
+        held = now - self._level_since
+        target = self.level
+        down_level = self.level_from_score(self.smoothed_score + self.downgrade_margin)
+        up_level = self.level_from_score(min(100.0, self.smoothed_score - self.upgrade_margin))
+        if down_level > self.level and held >= self.downgrade_dwell:
+            target = down_level
+        elif up_level < self.level and held >= self.upgrade_dwell:
+            target = self.level - 1
+
+        if target != self.level:
+            logger.info(
+                f"[POLICY] Уровень {self.level} -> {target} (оценка {score:.1f}, сглаженная {self.smoothed_score:.1f})"
+            )
+            self.level = target
+            self._level_since = now
+            self.switches += 1
+        elif raw_level != self._last_raw_level:
+            # Сырой уровень сменился, но переключения энкодеров не было
+            self.switches_avoided += 1
+        self._last_raw_level = raw_level
+        return self.level
+
+    def get_stats(self) -> dict:
+        return {
+            "level": self.level,
+            "smoothed_score": round(self.smoothed_score, 1) if self.smoothed_score is not None else None,
+            "radio_score": round(self.radio_score, 1) if self.radio_score is not None else None,
+            "feedback_score": round(self.feedback_score, 1) if self.feedback_score is not None else None,
+            "raw_level": self._last_raw_level,
+            "switches": self.switches,
+            "switches_avoided": self.switches_avoided,
+        }
+
     def create_degradation_profiles(self, config: Config):
         base_profile = {
             "base Profile": None,
@@ -0,0 +1,150 @@
+import io
+import threading
+import time
+from collections import deque
+
+from ..pkg.logger import LogType
+from ..pkg.logger import get_logger
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+# Keys of an ffmpeg `-progress` block we keep; the RTP muxer also prints its SDP to stdout
+PROGRESS_KEYS = ("frame", "fps", "bitrate", "total_size", "out_time_us", "dup_frames", "drop_frames", "speed")
+
+
+def parse_progress_value(key: str, value: str):
+    value = value.strip()
+    if value in ("", "N/A"):
+        return None
+    try:
+        if key == "speed":
+            return float(value.rstrip("x"))
+        if key == "bitrate":
+            return float(value.replace("kbits/s", ""))
+        if key == "fps":
+            return float(value)
+        return int(value)
+    except ValueError:
+        return None
+
+
+class EncoderTelemetry:
+    """Drains an ffmpeg encoder's stdout (`-progress pipe:1`) and stderr on background threads.
+
+    Without a reader the stderr pipe eventually fills and ffmpeg blocks on its next log
+    line, freezing the stream. Progress blocks are parsed into fps, speed, bitrate and
+    dropped/duplicated frame counters; stderr lines are logged and the last few kept.
+    The encoder is marked slow after `slow_reports` consecutive blocks below `min_speed`.
+    """
+
+    def __init__(self, proc, name: str = "ffmpeg", min_speed: float = 0.95, slow_reports: int = 6):
+        self.proc = proc
+        self.name = name
+        self.min_speed = min_speed
+        self.slow_reports = slow_reports
+
+        self.frame = 0
+        self.fps = None
+        self.bitrate_kbps = None
+        self.speed = None
+        self.total_size = 0
+        self.out_time = 0.0
+        self.dup_frames = 0
+        self.drop_frames = 0
+        self.reports = 0
+        self.updated_at = None
+        # Report times at which the muxer had written its first bytes and last grew its output
+        self.first_output_at = None
+        self.last_output_at = None
+        self.below_speed = 0
+        self.last_messages = deque(maxlen=10)
+
+        self._threads = []
+        if proc.stdout:
+            self._threads.append(threading.Thread(target=self._read_progress, name=f"{name}-progress", daemon=True))
+        if proc.stderr:
+            self._threads.append(threading.Thread(target=self._read_stderr, name=f"{name}-stderr", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def slow(self) -> bool:
+        return self.below_speed >= self.slow_reports
+
+    @property
+    def finished(self) -> bool:
+        """True once the process has exited and its final progress block has been read."""
+        return self.proc.poll() is not None and not any(thread.is_alive() for thread in self._threads)
+
+    @staticmethod
+    def _buffered(stream):
+        # The encoder is started with bufsize=0 for its stdin; readline() on the raw stdout/stderr
+        # pipes would then issue one read syscall per byte
+        return stream if isinstance(stream, io.BufferedIOBase) else io.BufferedReader(stream)
+
+    def _read_progress(self):
+        block = {}
+        try:
+            for raw in iter(self._buffered(self.proc.stdout).readline, b""):
+                key, sep, value = raw.decode("utf-8", "replace").strip().partition("=")
+                if not sep:
+                    continue
+                if key in PROGRESS_KEYS:
+                    block[key] = parse_progress_value(key, value)
+                elif key == "progress":
+                    self._apply_block(block)
+                    block = {}
+        except (OSError, ValueError):
+            pass
+
+    def _apply_block(self, block: dict):
+        if block.get("frame") is not None:
+            self.frame = block["frame"]
+        self.fps = block.get("fps", self.fps)
+        self.bitrate_kbps = block.get("bitrate", self.bitrate_kbps)
+        now = time.monotonic()
+        if block.get("total_size") is not None:
+            if block["total_size"] > self.total_size:
+                if self.first_output_at is None:
+                    self.first_output_at = now
+                self.last_output_at = now
+            self.total_size = block["total_size"]
+        if block.get("out_time_us") is not None:
+            self.out_time = block["out_time_us"] / 1e6
+        if block.get("dup_frames") is not None:
+            self.dup_frames = block["dup_frames"]
+        if block.get("drop_frames") is not None:
+            self.drop_frames = block["drop_frames"]
+        self.speed = block.get("speed", self.speed)
+        self.reports += 1
+        self.updated_at = now
+        # The first report covers process startup and is not representative
+        if self.reports > 1 and self.speed is not None and self.speed < self.min_speed:
+            self.below_speed += 1
+        else:
+            self.below_speed = 0
+
+    def _read_stderr(self):
+        try:
+            for raw in iter(self._buffered(self.proc.stderr).readline, b""):
+                line = raw.decode("utf-8", "replace").strip()
+                if line:
+                    self.last_messages.append(line)
+                    logger.warning(f"[FFMPEG] {self.name}: {line}")
+        except (OSError, ValueError):
+            pass
+
+    def get_stats(self) -> dict:
+        return {
+            "frame": self.frame,
+            "fps": self.fps,
+            "speed": self.speed,
+            "bitrate_kbps": self.bitrate_kbps,
+            "total_size": self.total_size,
+            "out_time_s": round(self.out_time, 2),
+            "dup_frames": self.dup_frames,
+            "drop_frames": self.drop_frames,
+            "slow": self.slow,
+            "age_s": round(time.monotonic() - self.updated_at, 1) if self.updated_at else None,
+            "last_messages": list(self.last_messages)[-3:],
+        }
@@ -1,29 +1,301 @@
 import threading
-from typing import List, Callable
+import time
+from collections import deque
+from enum import Enum
+from typing import List, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .framering import FrameRef, SharedFrameRing
 from ..abstract.interfacedef import AbstractFrameDistributor
 
 
+class OverflowPolicy(Enum):
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    LATEST = "latest"
+    BLOCK = "block"
+
+
+# Set on each ConsumerWorker thread while it runs its consumer
+_delivery = threading.local()
+
+
+def delivery_enqueued_at() -> Optional[float]:
+    """When the frame being delivered on this thread entered its consumer queue; None for synchronous delivery."""
+    return getattr(_delivery, "enqueued_at", None)
+
+
+def _retain(frame):
+    if isinstance(frame, FrameRef):
+        frame.retain()
+
+
+def _release(frame):
+    if isinstance(frame, FrameRef):
+        frame.release()
+
+
+class ConsumerWorker:
+    """Delivers frames to one consumer from its own thread through a bounded queue.
+
+    A slow consumer only overflows its own queue; the overflow policy decides which
+    frames it loses. Ring-backed frames stay pinned while they sit in the queue.
+    """
+
+    def __init__(
+        self,
+        consumer_fn: Callable,
+        max_queue: int = 4,
+        policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ):
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
+        self.consumer_fn = consumer_fn
+        self.max_queue = max_queue
+        self.policy = OverflowPolicy(policy)
+        self.name = getattr(consumer_fn, "__qualname__", repr(consumer_fn))
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+        self._latency_total = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=f"deliver-{self.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """Queue a frame for delivery, applying the overflow policy when full."""
+        _retain(frame)
+        with self._cond:
+            if not self._running:
+                _release(frame)
+                return
+            if self.policy == OverflowPolicy.LATEST:
+                self._drop_queued(len(self._queue))
+            elif len(self._queue) >= self.max_queue:
+                if self.policy == OverflowPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    _release(frame)
+                    return
+                if self.policy == OverflowPolicy.DROP_OLDEST:
+                    self._drop_queued(len(self._queue) - self.max_queue + 1)
+                else:
+                    while self._running and len(self._queue) >= self.max_queue:
+                        self._cond.wait()
+                    if not self._running:
+                        _release(frame)
+                        return
+            self._queue.append((frame, time.monotonic()))
+            self._cond.notify_all()
+
+    def _drop_queued(self, count: int):
+        for _ in range(count):
+            frame, _ = self._queue.popleft()
+            _release(frame)
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, enqueued_at = self._queue.popleft()
+                self._cond.notify_all()
+            _delivery.enqueued_at = enqueued_at
+            try:
+                self.consumer_fn(frame)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in frame consumer: {e}")
+            finally:
+                _release(frame)
+            latency = time.monotonic() - enqueued_at
+            self.delivered += 1
+            self.latency_last = latency
+            self._latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+
+    def stop(self, timeout: float = 2.0):
+        with self._cond:
+            self._running = False
+            self._drop_queued(len(self._queue))
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def get_stats(self) -> dict:
+        delivered = self.delivered
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "policy": self.policy.value,
+            "delivered": delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "latency_last_ms": round(self.latency_last * 1000, 2),
+            "latency_avg_ms": round(self._latency_total / delivered * 1000, 2) if delivered else 0.0,
+            "latency_max_ms": round(self.latency_max * 1000, 2),
+        }
+
+
 class FrameDistributor(AbstractFrameDistributor):
-    """Concrete implementation that manages multiple consumers of frame data."""
+    """Concrete implementation that manages multiple consumers of frame data.
+
+    With `queue_size` > 0 every consumer gets its own `ConsumerWorker`, so `distribute`
+    only enqueues and never waits on a consumer (unless the policy is `block`).
+    """
 
-    def __init__(self):
+    def __init__(self, queue_size: int = 0, overflow_policy: str = OverflowPolicy.DROP_OLDEST.value):
         self._consumers: List[Callable[[bytes], None]] = []
+        self._workers: Dict[Callable, ConsumerWorker] = {}
         self._lock = threading.Lock()
+        self.queue_size = queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self._seq = 0
 
     def add_consumer(self, consumer_fn):
         with self._lock:
             if consumer_fn not in self._consumers:
                 self._consumers.append(consumer_fn)
+                if self.queue_size > 0:
+                    self._workers[consumer_fn] = ConsumerWorker(consumer_fn, self.queue_size, self.overflow_policy)
 
     def remove_consumer(self, consumer_fn):
         with self._lock:
             if consumer_fn in self._consumers:
                 self._consumers.remove(consumer_fn)
+            worker = self._workers.pop(consumer_fn, None)
+        if worker:
+            worker.stop()
+
+    def publish(self, frame: np.ndarray, timestamp: float = None, copy: bool = True) -> FrameRef:
+        """Publish a decoded frame tagged with seq and capture time.
+
+        The frame is copied to bytes unless the source hands over a fresh array it never reuses.
+        """
+        self._seq += 1
+        frame_ref = FrameRef(
+            seq=self._seq,
+            data=frame.tobytes() if copy else frame,
+            timestamp=timestamp if timestamp is not None else time.monotonic(),
+        )
+        self.distribute(frame_ref)
+        return frame_ref
 
     def distribute(self, frame_bytes):
+        if isinstance(frame_bytes, FrameRef):
+            frame_bytes.distributed_at = time.monotonic()
+        if self.queue_size > 0:
+            with self._lock:
+                workers = list(self._workers.values())
+            for worker in workers:
+                worker.submit(frame_bytes)
+            return
         with self._lock:
             for consumer in self._consumers:
                 try:
                     consumer(frame_bytes)
                 except Exception as e:
                     print(f"Error in frame consumer: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            workers = list(self._workers.values())
+        return {
+            "mode": "copy",
+            "published": self._seq,
+            "consumers": len(self._consumers),
+            "delivery": {worker.name: worker.get_stats() for worker in workers},
+        }
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+class SharedRingFrameDistributor(FrameDistributor):
+    """Zero-copy distributor backed by a preallocated `SharedFrameRing`.
+
+    Consumers receive a `FrameRef` with a read-only view of the ring slot and a
+    sequence number instead of a `bytes` copy of the frame.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        slots: int = 8,
+        channels: int = 3,
+        queue_size: int = 0,
+        overflow_policy: str = OverflowPolicy.DROP_OLDEST.value,
+    ):
+        super().__init__(queue_size=queue_size, overflow_policy=overflow_policy)
+        self.ring = SharedFrameRing(width, height, channels=channels, slots=slots)
+
+    def acquire_slot(self) -> Optional[Tuple[int, np.ndarray]]:
+        """Reserve a slot for a source to decode into. Returns None on overrun."""
+        index = self.ring.acquire()
+        if index is None:
+            return None
+        return index, self.ring.slot(index)
+
+    def publish_slot(self, index: int, timestamp: float = None) -> FrameRef:
+        """Commit a slot filled by the source and hand it to consumers."""
+        frame_ref = self.ring.commit(index, timestamp)
+        self.distribute(frame_ref)
+        return frame_ref
+
+    def publish(self, frame: np.ndarray, timestamp: float = None, copy: bool = True) -> Optional[FrameRef]:
+        """Copy a frame the source could not decode in place and distribute it."""
+        frame_ref = self.ring.write(frame, timestamp)
+        if frame_ref is not None:
+            self.distribute(frame_ref)
+        return frame_ref
+
+    def distribute(self, frame_ref: FrameRef):
+        # The slot stays pinned while consumers read it so the source cannot reuse it
+        frame_ref.retain()
+        try:
+            super().distribute(frame_ref)
+        finally:
+            frame_ref.release()
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats.update(self.ring.get_stats())
+        stats["mode"] = "ring"
+        return stats
+
+    def close(self):
+        super().close()
+        self.ring.close()
+
+
+def create_frame_distributor(
+    width: int,
+    height: int,
+    ring_slots: int = 0,
+    queue_size: int = 0,
+    overflow_policy: str = OverflowPolicy.DROP_OLDEST.value,
+) -> FrameDistributor:
+    """Build the distributor variant selected by the source settings."""
+    if ring_slots:
+        # Queued frames keep their slots pinned, so the ring must outlast the queues
+        slots = max(ring_slots, queue_size + 2)
+        return SharedRingFrameDistributor(
+            width, height, slots=slots, queue_size=queue_size, overflow_policy=overflow_policy
+        )
+    return FrameDistributor(queue_size=queue_size, overflow_policy=overflow_policy)
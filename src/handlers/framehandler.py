@@ -1,29 +1,86 @@
-import threading
-from typing import List, Callable
-from ..abstract.interfacedef import AbstractFrameDistributor
-
-
-class FrameDistributor(AbstractFrameDistributor):
-    """Concrete implementation that manages multiple consumers of frame data."""
-
-    def __init__(self):
-        self._consumers: List[Callable[[bytes], None]] = []
-        self._lock = threading.Lock()
-
-    def add_consumer(self, consumer_fn):
-        with self._lock:
-            if consumer_fn not in self._consumers:
-                self._consumers.append(consumer_fn)
-
-    def remove_consumer(self, consumer_fn):
-        with self._lock:
-            if consumer_fn in self._consumers:
-                self._consumers.remove(consumer_fn)
-
-    def distribute(self, frame_bytes):
-        with self._lock:
-            for consumer in self._consumers:
-                try:
-                    consumer(frame_bytes)
-                except Exception as e:
-                    print(f"Error in frame consumer: {e}")
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from .framering import FrameRef, frame_buffer
+from ..abstract.interfacedef import AbstractFrameProcessor
+
+
+def frame_image(frame, width: int, height: int, channels: int = 3) -> np.ndarray:
+    """View any frame payload (bytes, ndarray or FrameRef) as an HxWxC uint8 array without copying."""
+    data = frame_buffer(frame)
+    if isinstance(data, np.ndarray):
+        return data
+    image = np.frombuffer(data, dtype=np.uint8)
+    if image.size != width * height * channels:
+        raise ValueError(f"Frame of {image.size} bytes does not match {width}x{height}x{channels}")
+    return image.reshape(height, width, channels)
+
+
+def frame_timestamp(frame) -> float:
+    if isinstance(frame, FrameRef):
+        return frame.timestamp
+    return time.monotonic()
+
+
+class ProfileFrameProcessor(AbstractFrameProcessor):
+    """Brings source frames down to the resolution and frame rate of an encoding profile.
+
+    Frames are decimated with a time-based credit counter so that the output rate tracks
+    the profile fps whatever the capture rate is, and downscaled with `cv2.resize` into a
+    small pool of preallocated buffers. Frames that already match pass through untouched.
+    """
+
+    def __init__(self, source_resolution: str, profile: dict, channels: int = 3, pool_size: int = 2):
+        self.source_width, self.source_height = map(int, source_resolution.split("x"))
+        self.channels = channels
+        self.pool_size = pool_size
+        self.frames_in = 0
+        self.frames_out = 0
+        self.frames_dropped = 0
+        self.apply_profile(profile)
+
+    def apply_profile(self, profile: dict):
+        self.width, self.height = map(int, profile["resolution"].split("x"))
+        self.fps = float(profile["fps"])
+        self._pool = [np.empty((self.height, self.width, self.channels), dtype=np.uint8) for _ in range(self.pool_size)]
+        self._pool_index = 0
+        self._credit = 1.0
+        self._last_timestamp = None
+
+    def _due(self, timestamp: float) -> bool:
+        if self._last_timestamp is not None and self.fps > 0:
+            self._credit += max(0.0, timestamp - self._last_timestamp) * self.fps
+        self._last_timestamp = timestamp
+        # Small epsilon so that exact integer ratios (30 -> 15 fps) are not lost to rounding
+        if self._credit >= 1.0 - 1e-6:
+            self._credit = min(self._credit - 1.0, 1.0)
+            return True
+        return False
+
+    def process_frame(self, frame_bytes) -> Optional[np.ndarray]:
+        self.frames_in += 1
+        if not self._due(frame_timestamp(frame_bytes)):
+            self.frames_dropped += 1
+            return None
+        image = frame_image(frame_bytes, self.source_width, self.source_height, self.channels)
+        self.frames_out += 1
+        if image.shape[0] == self.height and image.shape[1] == self.width:
+            return image
+        dst = self._pool[self._pool_index]
+        self._pool_index = (self._pool_index + 1) % self.pool_size
+        cv2.resize(image, (self.width, self.height), dst=dst, interpolation=cv2.INTER_AREA)
+        return dst
+
+    def get_stats(self) -> dict:
+        return {
+            "output": f"{self.width}x{self.height}@{self.fps:g}",
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "frames_dropped": self.frames_dropped,
+        }
+
+    def release(self):
+        self._pool = []
@@ -0,0 +1,165 @@
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, List, Optional
+
+import numpy as np
+
+from ..pkg.logger import get_logger
+from ..pkg.logger import LogType
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+
+@dataclass
+class FrameRef:
+    """Read-only handle to a frame published by a source.
+
+    `data` is anything exposing the buffer protocol (bytes or a read-only NumPy view
+    over a ring slot). `seq` increases monotonically per distributor. `timestamp` is the
+    capture time on the `time.monotonic()` clock and `distributed_at` is stamped when the
+    distributor starts handing the frame to consumers.
+    """
+
+    seq: int
+    data: Any
+    timestamp: float
+    ring: Optional["SharedFrameRing"] = None
+    index: Optional[int] = None
+    distributed_at: Optional[float] = None
+
+    @property
+    def valid(self) -> bool:
+        """False once the ring slot behind this frame has been recycled."""
+        if self.ring is None:
+            return True
+        return self.ring.slot_seq(self.index) == self.seq
+
+    def retain(self):
+        if self.ring is not None:
+            self.ring.pin(self.index)
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.unpin(self.index)
+
+
+def frame_buffer(frame):
+    """Return the raw buffer for a frame that may be wrapped in a FrameRef."""
+    if isinstance(frame, FrameRef):
+        return frame.data
+    return frame
+
+
+class SharedFrameRing:
+    """Preallocated ring of frame slots living in `multiprocessing.shared_memory`.
+
+    Sources write into a free slot and commit it; consumers get a read-only view of the
+    slot, so a frame is never copied into `bytes`. A slot is reused only when no consumer
+    pins it; if every slot is pinned the frame is dropped and counted as an overrun.
+    """
+
+    def __init__(self, width: int, height: int, channels: int = 3, slots: int = 8):
+        if slots < 2:
+            raise ValueError("Ring must have at least 2 slots")
+        self.shape = (int(height), int(width), int(channels))
+        self.slot_size = int(np.prod(self.shape))
+        self.slots = slots
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_size * slots)
+        self._buffers: List[np.ndarray] = []
+        self._views: List[np.ndarray] = []
+        for i in range(slots):
+            buf = np.ndarray(self.shape, dtype=np.uint8, buffer=self._shm.buf, offset=i * self.slot_size)
+            view = buf.view()
+            view.flags.writeable = False
+            self._buffers.append(buf)
+            self._views.append(view)
+
+        self._slot_seq = [0] * slots
+        self._pins = [0] * slots
+        self._cursor = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+        self.slot_reuse = 0
+        self.overruns = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def acquire(self) -> Optional[int]:
+        """Reserve the next unpinned slot for writing. Returns None on overrun."""
+        with self._lock:
+            for offset in range(self.slots):
+                index = (self._cursor + offset) % self.slots
+                if self._pins[index] == 0:
+                    self._cursor = (index + 1) % self.slots
+                    if self._slot_seq[index]:
+                        self.slot_reuse += 1
+                    # Invalidate outstanding refs before the slot gets overwritten
+                    self._slot_seq[index] = 0
+                    return index
+            self.overruns += 1
+            return None
+
+    def slot(self, index: int) -> np.ndarray:
+        """Writable array for a slot obtained from `acquire`."""
+        return self._buffers[index]
+
+    def commit(self, index: int, timestamp: float = None) -> FrameRef:
+        """Publish a written slot and return a read-only reference to it."""
+        with self._lock:
+            self._seq += 1
+            self._slot_seq[index] = self._seq
+            seq = self._seq
+        return FrameRef(
+            seq=seq,
+            data=self._views[index],
+            timestamp=timestamp if timestamp is not None else time.monotonic(),
+            ring=self,
+            index=index,
+        )
+
+    def write(self, frame: np.ndarray, timestamp: float = None) -> Optional[FrameRef]:
+        """Copy a frame into a free slot. Returns None if the ring overran."""
+        index = self.acquire()
+        if index is None:
+            return None
+        np.copyto(self._buffers[index], frame.reshape(self.shape))
+        return self.commit(index, timestamp)
+
+    def slot_seq(self, index: int) -> int:
+        return self._slot_seq[index]
+
+    def pin(self, index: int):
+        with self._lock:
+            self._pins[index] += 1
+
+    def unpin(self, index: int):
+        with self._lock:
+            if self._pins[index] > 0:
+                self._pins[index] -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "published": self._seq,
+            "slot_reuse": self.slot_reuse,
+            "overruns": self.overruns,
+        }
+
+    def close(self):
+        """Release the shared memory segment."""
+        self._buffers = []
+        self._views = []
+        try:
+            self._shm.close()
+            self._shm.unlink()
+        except BufferError:
+            logger.warning("[FRAME RING] Shared memory still referenced by a consumer, leaving it to GC")
+        except FileNotFoundError:
+            pass
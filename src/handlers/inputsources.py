@@ -1,14 +1,16 @@
 import threading
 import time
 import depthai as dai
-from .framedistributor import FrameDistributor
+from .framedistributor import SharedRingFrameDistributor, create_frame_distributor
 from ..abstract.interfacedef import AbstractInputSource
 import subprocess
 import cv2
+import numpy as np
 from typing import Optional
 
 from dataclasses import dataclass
-from ..config import DeviceConfig
+from ..config import DeviceConfig, StreamVariant
+from ..pkg.latency import PtsClock, first_frame_stats
 from ..pkg.logger import get_logger
 from ..pkg.logger import LogType
 
@@ -25,6 +27,9 @@ class DAICameraInput(AbstractInputSource):
         camera_socket: dai.CameraBoardSocket = dai.CameraBoardSocket.CAM_A,
         color_order: dai.ColorCameraProperties.ColorOrder = dai.ColorCameraProperties.ColorOrder.BGR,
         usb_speed: dai.UsbSpeed = dai.UsbSpeed.SUPER,
+        ring_slots: int = 0,
+        queue_size: int = 0,
+        overflow_policy: str = "drop_oldest",
     ):
         self.frame_width = frame_width
         self.frame_height = frame_height
@@ -33,10 +38,17 @@ class DAICameraInput(AbstractInputSource):
         self.camera_socket = camera_socket
         self.color_order = color_order
         self.usb_speed = usb_speed
+        self.running = False
+        self.worker_thread = None
+        self.device = None
+        self.started_at = None
+        self.first_frame_at = None
 
         self._setup_pipeline()
 
-        self.distributor = FrameDistributor()
+        self.distributor = create_frame_distributor(
+            frame_width, frame_height, ring_slots=ring_slots, queue_size=queue_size, overflow_policy=overflow_policy
+        )
 
     def _setup_pipeline(self):
         """Set up the DepthAI pipeline for the camera."""
@@ -56,6 +68,8 @@ class DAICameraInput(AbstractInputSource):
         return pipeline
 
     def start(self):
+        self.started_at = time.monotonic()
+        self.first_frame_at = None
         pipeline = self._setup_pipeline()
         self.device = dai.Device(pipeline)
         self.queue = self.device.getOutputQueue("video", maxSize=4, blocking=False)
@@ -68,8 +82,13 @@ class DAICameraInput(AbstractInputSource):
         while self.running:
             frame = self.queue.tryGet()
             if frame:
+                # Device timestamps are synced to the host monotonic clock
+                captured_at = frame.getTimestamp().total_seconds()
+                # getCvFrame() returns a new array owned by this loop, so it is handed over without a copy
                 cv_frame = frame.getCvFrame()
-                self.distributor.distribute(cv_frame.tobytes())
+                self.distributor.publish(cv_frame, captured_at, copy=False)
+                if self.first_frame_at is None:
+                    self.first_frame_at = time.monotonic()
             else:
                 time.sleep(0.001)
 
@@ -81,11 +100,28 @@ class DAICameraInput(AbstractInputSource):
             self.device.close()
             self.device = None
 
+    def abort(self):
+        """Stop in the background, so a caller stuck behind a pending open or read is not blocked."""
+        threading.Thread(target=self.stop, daemon=True).start()
+
     def release(self):
         self.stop()
+        self.distributor.close()
         self.queue = None
         self.device = None
 
+    def is_active(self) -> bool:
+        return self.running
+
+    def get_current_settings(self) -> dict:
+        return {
+            "active": self.is_active(),
+            "resolution": f"{self.frame_width}x{self.frame_height}",
+            "fps": self.fps,
+            **first_frame_stats(self.started_at, self.first_frame_at),
+            "distribution": self.distributor.get_stats(),
+        }
+
     def add_consumer(self, consumer_fn):
         self.distributor.add_consumer(consumer_fn)
 
@@ -93,22 +129,56 @@ class DAICameraInput(AbstractInputSource):
         self.distributor.remove_consumer(consumer_fn)
 
 
+def stream_url(device_config: DeviceConfig, stream: Optional[StreamVariant]) -> str:
+    path = stream.path if stream else device_config.stream_path
+    return f"{device_config.ip_address}{path or ''}"
+
+
+def stream_stats(stream: Optional[StreamVariant], switches: int) -> dict:
+    if stream is None:
+        return {}
+    return {"stream": f"{stream.path} ({stream.resolution}@{stream.fps})", "stream_switches": switches}
+
+
 class RTSPInputSource(AbstractInputSource):
-    def __init__(self, device_config: DeviceConfig):
+    def __init__(
+        self,
+        device_config: DeviceConfig,
+        ring_slots: int = 0,
+        queue_size: int = 0,
+        overflow_policy: str = "drop_oldest",
+        open_timeout: float = 0,
+    ):
 
-        self.rtsp_url = device_config.ip_address
+        self.device_config = device_config
+        # Native stream currently pulled from the camera, switched by apply_profile
+        self.stream = device_config.streams[0] if device_config.streams else None
+        self.stream_switches = 0
         self.cap = None
         self.running = False
         self.thread = None
+        # Bounds both opening the stream and each read, 0 keeps the OpenCV defaults
+        self.open_timeout = open_timeout
+        self.pts_clock = PtsClock()
+        self.started_at = None
+        self.first_frame_at = None
+        self.open_failures = 0
 
-        self.distributor = FrameDistributor()
+        width, height = map(int, device_config.resolution.split("x"))
+        self.distributor = create_frame_distributor(
+            width, height, ring_slots=ring_slots, queue_size=queue_size, overflow_policy=overflow_policy
+        )
 
     def start(self):
         if self.running:
             logger.warning("[RTSP Streamer] Stream already running")
             return
-        self.cap = cv2.VideoCapture(self.rtsp_url)
+        self.started_at = time.monotonic()
+        self.first_frame_at = None
+        self.pts_clock.reset()
+        self.cap = self._open_capture()
         if not self.cap.isOpened():
+            self.open_failures += 1
             logger.error("[RTSP Streamer] Cannot open RTSP stream")
             raise Exception("Cannot open RTSP stream")
         self.running = True
@@ -116,28 +186,91 @@ class RTSPInputSource(AbstractInputSource):
         self.thread.start()
         logger.info("[RTSP Streamer] RTSP stream started")
 
+    @property
+    def rtsp_url(self) -> str:
+        return stream_url(self.device_config, self.stream)
+
+    def apply_profile(self, profile: dict):
+        """Pull the native stream closest to the profile, reopening a running capture."""
+        # Ring slots keep the configured geometry, so a sub-stream would only be upscaled back into them
+        if isinstance(self.distributor, SharedRingFrameDistributor):
+            return
+        stream = self.device_config.stream_for(profile["resolution"], profile.get("fps"))
+        if stream is None or stream == self.stream:
+            return
+        logger.info(f"[RTSP Streamer] Switching to stream {stream.path} ({stream.resolution}@{stream.fps})")
+        self.stream = stream
+        self.stream_switches += 1
+        if self.running:
+            self.stop()
+            self.start()
+
+    def _open_capture(self):
+        if self.open_timeout > 0:
+            # Without timeouts VideoCapture can block for tens of seconds on an unreachable camera
+            timeout_ms = int(self.open_timeout * 1000)
+            return cv2.VideoCapture(
+                self.rtsp_url,
+                cv2.CAP_FFMPEG,
+                [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms],
+            )
+        return cv2.VideoCapture(self.rtsp_url)
+
     def _run(self):
         try:
             while self.running:
-                ret, frame = self.cap.read()
+                if isinstance(self.distributor, SharedRingFrameDistributor):
+                    if not self._read_into_ring():
+                        break
+                    continue
+                if not self.cap.grab():
+                    logger.warning("[RTSP Streamer] Failed to read frame")
+                    break
+                captured_at = self._captured_at()
+                ret, frame = self.cap.retrieve()
                 if not ret:
                     logger.warning("[RTSP Streamer] Failed to read frame")
                     break
-                for consumer in list(self.consumers):
-                    try:
-                        consumer(frame)
-                    except Exception as e:
-                        logger.exception(f"[RTSP Streamer] Consumer function raised an exception: {e}")
+                # cap.read() allocates a new array per frame, so it is handed over without a copy
+                self.distributor.publish(frame, captured_at, copy=False)
+                if self.first_frame_at is None:
+                    self.first_frame_at = time.monotonic()
         except Exception as e:
             logger.exception(f"[RTSP Streamer] Unhandled exception in _run: {e}")
         finally:
             self.stop()
 
+    def _read_into_ring(self) -> bool:
+        """Decode the next frame straight into a free ring slot."""
+        slot = self.distributor.acquire_slot()
+        if slot is None:
+            # Every slot is still held by a consumer: drop this frame at the source
+            return self.cap.grab()
+        index, buffer = slot
+        ret = self.cap.grab()
+        if ret:
+            captured_at = self._captured_at()
+            ret, frame = self.cap.retrieve(buffer)
+        if not ret:
+            logger.warning("[RTSP Streamer] Failed to read frame")
+            return False
+        if frame is not buffer:
+            # Stream geometry differs from the configured one, fit it into the slot
+            cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer)
+        self.distributor.publish_slot(index, captured_at)
+        if self.first_frame_at is None:
+            self.first_frame_at = time.monotonic()
+        return True
+
+    def _captured_at(self) -> float:
+        """Capture time of the frame just grabbed, from its stream timestamp rather than the moment the read returned."""
+        return self.pts_clock.captured_at(self.cap.get(cv2.CAP_PROP_POS_MSEC), time.monotonic())
+
     def stop(self):
         if not self.running:
             return
         self.running = False
-        if self.thread and self.thread.is_alive():
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
             self.thread.join()
         if self.cap:
             self.cap.release()
@@ -150,8 +283,284 @@ class RTSPInputSource(AbstractInputSource):
         logger.info(f"[RTSP Streamer] Подключен {consumer_fn} added")
 
     def remove_consumer(self, consumer_fn):
-        self.consumers.discard(consumer_fn)
+        self.distributor.remove_consumer(consumer_fn)
         logger.info(f"[RTSP Streamer] Consumer {consumer_fn} removed")
 
+    def abort(self):
+        """Stop in the background, so a caller stuck behind a pending open or read is not blocked."""
+        threading.Thread(target=self.stop, daemon=True).start()
+
     def release(self):
         self.stop()
+        self.distributor.close()
+
+    def is_active(self) -> bool:
+        return self.running
+
+    def get_current_settings(self) -> dict:
+        return {
+            "active": self.is_active(),
+            **stream_stats(self.stream, self.stream_switches),
+            **first_frame_stats(self.started_at, self.first_frame_at),
+            "open_failures": self.open_failures,
+            "distribution": self.distributor.get_stats(),
+        }
+
+
+class FFmpegRTSPInputSource(AbstractInputSource):
+    """RTSP source decoded by an ffmpeg subprocess into raw BGR frames on a pipe.
+
+    Unlike `cv2.VideoCapture.read()`, which allocates a new array per frame and always
+    decodes at full resolution, frames are read with `readinto` into a pool of reused
+    NumPy buffers (or straight into a ring slot), and ffmpeg scales them to the active
+    profile resolution while decoding with low-delay flags and threaded decode.
+    """
+
+    def __init__(
+        self,
+        device_config: DeviceConfig,
+        ring_slots: int = 0,
+        queue_size: int = 0,
+        overflow_policy: str = "drop_oldest",
+        open_timeout: float = 0,
+        rtsp_transport: str = "tcp",
+        decode_threads: int = 2,
+    ):
+        self.device_config = device_config
+        # Native stream currently pulled from the camera, switched by apply_profile
+        self.stream = device_config.streams[0] if device_config.streams else None
+        self.stream_switches = 0
+        self.open_timeout = open_timeout
+        self.rtsp_transport = rtsp_transport
+        self.decode_threads = decode_threads
+        self.native_resolution = device_config.resolution
+        # Resolution ffmpeg scales to while decoding, None keeps the configured one
+        self.output_resolution: Optional[str] = None
+        # Frames are handed to consumers without a copy, so a buffer may only be reused
+        # once every queued consumer is done with it
+        self.pool_size = max(4, queue_size + 3)
+        self.proc = None
+        self.running = False
+        self.thread = None
+        self.started_at = None
+        self.first_frame_at = None
+        self.open_failures = 0
+        self.restarts = 0
+        self.frames = 0
+
+        width, height = map(int, device_config.resolution.split("x"))
+        self.distributor = create_frame_distributor(
+            width, height, ring_slots=ring_slots, queue_size=queue_size, overflow_policy=overflow_policy
+        )
+
+    @property
+    def frame_resolution(self) -> str:
+        # Ring slots have a fixed size, so decoder-side scaling only applies to the copying distributor
+        if isinstance(self.distributor, SharedRingFrameDistributor):
+            return self.native_resolution
+        return self.output_resolution or self.native_resolution
+
+    def _ffmpeg_command(self, width: int, height: int) -> list:
+        return [
+            "ffmpeg",
+            "-hide_banner",
+            "-nostdin",
+            "-loglevel",
+            "warning",
+            "-rtsp_transport",
+            self.rtsp_transport,
+            *(["-timeout", str(int(self.open_timeout * 1_000_000))] if self.open_timeout > 0 else []),
+            "-fflags",
+            "nobuffer",
+            "-flags",
+            "low_delay",
+            "-threads",
+            str(self.decode_threads),
+            "-i",
+            self.rtsp_url,
+            "-an",
+            "-vf",
+            f"scale={width}:{height}",
+            "-pix_fmt",
+            "bgr24",
+            "-f",
+            "rawvideo",
+            "pipe:1",
+        ]
+
+    def start(self):
+        if self.running:
+            logger.warning("[FFMPEG DECODER] Stream already running")
+            return
+        width, height = map(int, self.frame_resolution.split("x"))
+        self.started_at = time.monotonic()
+        self.first_frame_at = None
+        try:
+            self.proc = subprocess.Popen(
+                self._ffmpeg_command(width, height),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+            )
+        except OSError as e:
+            self.open_failures += 1
+            raise Exception(f"Cannot start ffmpeg decoder: {e}")
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(self.proc, width, height), daemon=True)
+        self.thread.start()
+        threading.Thread(target=self._drain_stderr, args=(self.proc,), daemon=True).start()
+        logger.info(f"[FFMPEG DECODER] Decoding RTSP stream at {width}x{height}")
+
+    def _run(self, proc, width: int, height: int):
+        pool = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.pool_size)]
+        scratch = None
+        index = 0
+        try:
+            while self.running:
+                if isinstance(self.distributor, SharedRingFrameDistributor):
+                    slot = self.distributor.acquire_slot()
+                    if slot is None:
+                        # Every slot is still held by a consumer: read the frame off the pipe and drop it
+                        if scratch is None:
+                            scratch = np.empty((height, width, 3), dtype=np.uint8)
+                        if self._read_frame(proc, scratch) is None:
+                            break
+                        continue
+                    slot_index, buffer = slot
+                    captured_at = self._read_frame(proc, buffer)
+                    if captured_at is None:
+                        break
+                    self.distributor.publish_slot(slot_index, captured_at)
+                else:
+                    buffer = pool[index]
+                    index = (index + 1) % len(pool)
+                    captured_at = self._read_frame(proc, buffer)
+                    if captured_at is None:
+                        break
+                    self.distributor.publish(buffer, captured_at, copy=False)
+                self.frames += 1
+                if self.first_frame_at is None:
+                    self.first_frame_at = time.monotonic()
+        except Exception as e:
+            logger.exception(f"[FFMPEG DECODER] Unhandled exception in _run: {e}")
+        finally:
+            if self.running and self.proc is proc:
+                if self.first_frame_at is None:
+                    self.open_failures += 1
+                logger.warning("[FFMPEG DECODER] Decoder stopped delivering frames")
+                self.stop()
+
+    @staticmethod
+    def _read_frame(proc, buffer: np.ndarray) -> Optional[float]:
+        """Fill `buffer` with one frame from the pipe.
+
+        Returns the time the first bytes of the frame arrived, i.e. when ffmpeg had it decoded
+        (rawvideo carries no timestamps), or None on EOF.
+        """
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        arrived_at = None
+        while filled < len(view):
+            count = proc.stdout.readinto(view[filled:])
+            if not count:
+                return None
+            if arrived_at is None:
+                arrived_at = time.monotonic()
+            filled += count
+        return arrived_at
+
+    def _drain_stderr(self, proc):
+        try:
+            for raw in iter(proc.stderr.readline, b""):
+                line = raw.decode("utf-8", "replace").strip()
+                if line:
+                    logger.warning(f"[FFMPEG DECODER] {line}")
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def rtsp_url(self) -> str:
+        return stream_url(self.device_config, self.stream)
+
+    def apply_profile(self, profile: dict):
+        """Pull the native stream closest to the profile and decode it at the profile resolution."""
+        # Ring slots keep the configured geometry: neither a sub-stream nor decoder scaling would save anything
+        if isinstance(self.distributor, SharedRingFrameDistributor):
+            return
+        stream = self.device_config.stream_for(profile["resolution"], profile.get("fps")) or self.stream
+        changed = self._set_resolution(profile["resolution"])
+        if stream != self.stream:
+            logger.info(f"[FFMPEG DECODER] Switching to stream {stream.path} ({stream.resolution}@{stream.fps})")
+            self.stream = stream
+            self.stream_switches += 1
+            changed = True
+        # One restart covers both the new stream and the new scale
+        if changed:
+            self._restart()
+
+    def set_output_resolution(self, resolution: Optional[str]):
+        """Decode at `resolution` from now on (None = configured resolution), restarting a running decoder."""
+        if self._set_resolution(resolution):
+            self._restart()
+
+    def _set_resolution(self, resolution: Optional[str]) -> bool:
+        if isinstance(self.distributor, SharedRingFrameDistributor) or resolution == self.output_resolution:
+            return False
+        self.output_resolution = resolution
+        return True
+
+    def _restart(self):
+        if self.running:
+            self.stop()
+            self.restarts += 1
+            self.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        proc, self.proc = self.proc, None
+        if proc:
+            try:
+                proc.terminate()
+                proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            except Exception as e:
+                logger.error(f"[FFMPEG DECODER] Error stopping decoder: {e}")
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+        logger.info("[FFMPEG DECODER] RTSP stream stopped")
+
+    def add_consumer(self, consumer_fn):
+        if not callable(consumer_fn):
+            raise ValueError("Consumer must be callable")
+        self.distributor.add_consumer(consumer_fn)
+
+    def remove_consumer(self, consumer_fn):
+        self.distributor.remove_consumer(consumer_fn)
+
+    def abort(self):
+        """Stop in the background, so a caller stuck behind a pending open or read is not blocked."""
+        threading.Thread(target=self.stop, daemon=True).start()
+
+    def release(self):
+        self.stop()
+        self.distributor.close()
+
+    def is_active(self) -> bool:
+        return self.running
+
+    def get_current_settings(self) -> dict:
+        return {
+            "active": self.is_active(),
+            "backend": "ffmpeg",
+            "resolution": self.frame_resolution,
+            **stream_stats(self.stream, self.stream_switches),
+            **first_frame_stats(self.started_at, self.first_frame_at),
+            "frames": self.frames,
+            "open_failures": self.open_failures,
+            "restarts": self.restarts,
+            "distribution": self.distributor.get_stats(),
+        }
@@ -0,0 +1,187 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .framehandler import frame_image, frame_timestamp
+from ..pkg.logger import LogType
+from ..pkg.logger import get_logger
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+
+def mosaic_layout(count: int, canvas_width: int, canvas_height: int, source_width: int, source_height: int):
+    """Place `count` tiles on the canvas in a near-square grid, keeping the source aspect ratio.
+
+    Returns a list of (x, y, width, height) tiles, each centred in its grid cell.
+    """
+    cols = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / cols)
+    cell_w, cell_h = canvas_width // cols, canvas_height // rows
+    scale = min(cell_w / source_width, cell_h / source_height)
+    # Even sizes keep the tiles aligned with the chroma subsampling of the encoder
+    tile_w = max(2, int(source_width * scale) & ~1)
+    tile_h = max(2, int(source_height * scale) & ~1)
+    tiles = []
+    for index in range(count):
+        row, col = divmod(index, cols)
+        x = col * cell_w + (cell_w - tile_w) // 2
+        y = row * cell_h + (cell_h - tile_h) // 2
+        tiles.append((x, y, tile_w, tile_h))
+    return tiles
+
+
+class MosaicCompositor:
+    """Tiles downscaled frames of several sources into one canvas fed to a single encoder.
+
+    Each source gets a consumer that scales its frames with `cv2.resize` into a preallocated
+    tile buffer, at most at the mosaic frame rate, and copies the tile into the canvas. An
+    output thread snapshots the canvas into a second preallocated buffer at `fps` and writes
+    it to the streamer, so one low-bitrate stream carries every camera. Tiles of sources that
+    stop delivering are blanked after `stale_after` seconds.
+    """
+
+    def __init__(
+        self,
+        source_ids: List[str],
+        resolution: str,
+        fps: float,
+        source_resolution: str,
+        stale_after: float = 2.0,
+        labels: bool = True,
+    ):
+        self.source_ids = list(source_ids)
+        self.width, self.height = map(int, resolution.split("x"))
+        self.fps = float(fps)
+        self.source_width, self.source_height = map(int, source_resolution.split("x"))
+        self.stale_after = stale_after
+        self.labels = labels
+
+        self._canvas = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self._output = np.empty_like(self._canvas)
+        self._layout = dict(
+            zip(self.source_ids, mosaic_layout(len(self.source_ids), self.width, self.height, self.source_width, self.source_height))
+        )
+        self._tiles = {source_id: np.empty((h, w, 3), dtype=np.uint8) for source_id, (_, _, w, h) in self._layout.items()}
+        self._updated_at: Dict[str, float] = {}
+        self._blank = set(self.source_ids)
+        self._lock = threading.Lock()
+        self._consumers: Dict[str, Callable] = {}
+        self._sources = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self.streamer = None
+        self.frames_out = 0
+        self.tiles_in: Dict[str, int] = {source_id: 0 for source_id in self.source_ids}
+        self.activations = 0
+
+    @property
+    def active(self) -> bool:
+        return self.streamer is not None
+
+    def consumer(self, source_id: str) -> Callable:
+        """Frame consumer that renders one source into its tile."""
+        tile = self._tiles[source_id]
+        x, y, w, h = self._layout[source_id]
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+
+        def consume(frame):
+            timestamp = frame_timestamp(frame)
+            last = self._updated_at.get(source_id)
+            # Frames faster than the mosaic rate would be overwritten before the next snapshot
+            if last is not None and timestamp - last < interval * 0.9:
+                return
+            image = frame_image(frame, self.source_width, self.source_height)
+            cv2.resize(image, (w, h), dst=tile, interpolation=cv2.INTER_AREA)
+            if self.labels:
+                cv2.putText(tile, source_id, (6, 18), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            with self._lock:
+                self._canvas[y : y + h, x : x + w] = tile
+                self._blank.discard(source_id)
+            self._updated_at[source_id] = timestamp
+            self.tiles_in[source_id] += 1
+
+        return consume
+
+    def start(self, streamer, sources: dict):
+        """Attach to the sources and start feeding `streamer`."""
+        if self.active:
+            return
+        self.streamer = streamer
+        self._sources = sources
+        for source_id in self.source_ids:
+            if source_id not in sources:
+                continue
+            self._consumers[source_id] = self.consumer(source_id)
+            sources[source_id].add_consumer(self._consumers[source_id])
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._output_loop, name="mosaic-output", daemon=True)
+        self._thread.start()
+        self.activations += 1
+        logger.info(f"[MOSAIC] Compositing {len(self._consumers)} sources into {self.width}x{self.height}@{self.fps:g}")
+
+    def stop(self):
+        """Detach from the sources and return the streamer so the caller can shut it down."""
+        if not self.active:
+            return None
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        for source_id, consumer in self._consumers.items():
+            try:
+                self._sources[source_id].remove_consumer(consumer)
+            except Exception as e:
+                logger.error(f"[MOSAIC] Failed to detach {source_id}: {e}")
+        self._consumers = {}
+        self._updated_at.clear()
+        with self._lock:
+            self._canvas.fill(0)
+            self._blank = set(self.source_ids)
+        streamer, self.streamer = self.streamer, None
+        logger.info("[MOSAIC] Compositing stopped")
+        return streamer
+
+    def _blank_stale(self, now: float):
+        for source_id, updated_at in list(self._updated_at.items()):
+            if source_id in self._blank or now - updated_at < self.stale_after:
+                continue
+            x, y, w, h = self._layout[source_id]
+            self._canvas[y : y + h, x : x + w] = 0
+            self._blank.add(source_id)
+
+    def _output_loop(self):
+        interval = 1.0 / self.fps if self.fps > 0 else 0.1
+        next_at = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            with self._lock:
+                self._blank_stale(now)
+                np.copyto(self._output, self._canvas)
+            streamer = self.streamer
+            if streamer is not None:
+                try:
+                    streamer.consume_frame(self._output)
+                    self.frames_out += 1
+                except Exception as e:
+                    logger.error(f"[MOSAIC] Failed to write the composite frame: {e}")
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                # Fell behind (slow encoder pipe): skip the missed ticks instead of bursting
+                next_at = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def get_stats(self) -> dict:
+        return {
+            "active": self.active,
+            "output": f"{self.width}x{self.height}@{self.fps:g}",
+            "frames_out": self.frames_out,
+            "activations": self.activations,
+            "tiles_in": dict(self.tiles_in),
+            "blank": sorted(self._blank),
+        }
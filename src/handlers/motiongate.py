@@ -0,0 +1,172 @@
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from .framehandler import frame_image, frame_timestamp
+from ..pkg.logger import LogType
+from ..pkg.logger import get_logger
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+
+def _bitrate_kbps(bitrate: str) -> int:
+    return int(str(bitrate).lower().rstrip("k"))
+
+
+class MotionGate:
+    """Activity detector between a source's distributor and its streamer.
+
+    Every `1 / detect_fps` seconds the frame is shrunk with `cv2.resize` into a tiny
+    preallocated buffer and compared with the previous sample using NumPy differencing
+    into a reusable buffer. Once nothing has moved for `static_after` seconds the streamer
+    is switched to a keep-alive variant of its profile (`keepalive_fps`, `min_bitrate`)
+    and only keep-alive frames are passed on; the first sample with motion switches the
+    profile back. Frames and raw pipe bytes held back while static are counted as saved.
+    """
+
+    def __init__(
+        self,
+        streamer,
+        source_id: str,
+        source_resolution: str,
+        static_after: float = 30.0,
+        keepalive_fps: float = 2.0,
+        min_bitrate: str = "200k",
+        threshold: float = 0.01,
+        pixel_threshold: int = 25,
+        detect_fps: float = 5.0,
+        sample_size: tuple = (64, 36),
+    ):
+        self.streamer = streamer
+        self.source_id = source_id
+        self.source_width, self.source_height = map(int, source_resolution.split("x"))
+        self.static_after = static_after
+        self.keepalive_fps = keepalive_fps
+        self.min_bitrate = min_bitrate
+        # Share of sample pixels that must change by more than pixel_threshold to count as motion
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.detect_interval = 1.0 / detect_fps if detect_fps > 0 else 0.0
+
+        width, height = sample_size
+        self._samples = [np.zeros((height, width, 3), dtype=np.uint8) for _ in range(2)]
+        self._diff = np.zeros((height, width, 3), dtype=np.int16)
+        self._have_sample = False
+        self._sampled_at = None
+        self._last_motion_at = None
+        self._last_forward_at = None
+
+        self._lock = threading.Lock()
+        self.profile: Optional[dict] = None
+        self.static = False
+        self.static_since = None
+        self.activity = 0.0
+        self.transitions = 0
+        self.frames_in = 0
+        self.frames_saved = 0
+        self.bytes_saved = 0
+        self.static_seconds = 0.0
+        self.uplink_bytes_saved = 0.0
+
+    def process_frame(self, frame):
+        self.frames_in += 1
+        timestamp = frame_timestamp(frame)
+        if self._sampled_at is None or timestamp - self._sampled_at >= self.detect_interval:
+            self._sampled_at = timestamp
+            self._detect(frame, timestamp)
+        if self.static and not self._keepalive_due(timestamp):
+            self.frames_saved += 1
+            self.bytes_saved += frame_image(frame, self.source_width, self.source_height).nbytes
+            return
+        self._last_forward_at = timestamp
+        self.streamer.process_frame(frame)
+
+    def _keepalive_due(self, timestamp: float) -> bool:
+        if self.keepalive_fps <= 0:
+            return False
+        return self._last_forward_at is None or timestamp - self._last_forward_at >= 1.0 / self.keepalive_fps * 0.95
+
+    def _detect(self, frame, timestamp: float):
+        image = frame_image(frame, self.source_width, self.source_height)
+        current, previous = self._samples
+        height, width = current.shape[:2]
+        cv2.resize(image, (width, height), dst=current, interpolation=cv2.INTER_AREA)
+        self._samples.reverse()
+        if not self._have_sample:
+            self._have_sample = True
+            self._last_motion_at = timestamp
+            return
+        np.subtract(current, previous, out=self._diff, dtype=np.int16)
+        np.abs(self._diff, out=self._diff)
+        self.activity = float(np.count_nonzero(self._diff > self.pixel_threshold)) / self._diff.size
+        if self.activity >= self.threshold:
+            self._last_motion_at = timestamp
+            if self.static:
+                self._set_static(False, timestamp)
+        elif not self.static and timestamp - self._last_motion_at >= self.static_after:
+            self._set_static(True, timestamp)
+
+    def _set_static(self, static: bool, timestamp: float):
+        if static:
+            self.static_since = timestamp
+            logger.info(f"[MOTION] {self.source_id}: static for {self.static_after:g}s, switching to keep-alive")
+        else:
+            self._account_static(timestamp)
+            self.static_since = None
+            logger.info(f"[MOTION] {self.source_id}: motion detected, restoring the profile")
+        self.static = static
+        self.transitions += 1
+        # Starting an encoder must not stall frame delivery of this source
+        threading.Thread(target=self._apply, daemon=True).start()
+
+    def _account_static(self, timestamp: float):
+        seconds, uplink = self._static_savings(timestamp)
+        self.static_seconds += seconds
+        self.uplink_bytes_saved += uplink
+
+    def _static_savings(self, timestamp: float):
+        """Seconds and estimated encoded bytes saved by the current static period."""
+        if self.static_since is None or timestamp is None:
+            return 0.0, 0.0
+        seconds = max(0.0, timestamp - self.static_since)
+        if not self.profile:
+            return seconds, 0.0
+        saved_kbps = max(0, _bitrate_kbps(self.profile["bitrate"]) - _bitrate_kbps(self.min_bitrate))
+        return seconds, saved_kbps * 1000 / 8 * seconds
+
+    def keepalive_profile(self, profile: dict) -> dict:
+        fps = min(float(profile["fps"]), self.keepalive_fps)
+        bitrate = min(_bitrate_kbps(profile["bitrate"]), _bitrate_kbps(self.min_bitrate))
+        return {**profile, "fps": f"{fps:g}", "bitrate": f"{bitrate}k"}
+
+    def _apply(self):
+        with self._lock:
+            profile = self.profile
+            # A closed streamer (mosaic, passthrough, source switched off) is left alone
+            if profile is None or getattr(self.streamer, "proc", True) is None:
+                return
+            self.streamer.apply_profile(self.keepalive_profile(profile) if self.static else profile)
+
+    def apply_profile(self, profile: dict):
+        """Profile requested by the quality policy; the keep-alive variant is applied while static."""
+        with self._lock:
+            self.profile = profile
+            self.streamer.apply_profile(self.keepalive_profile(profile) if self.static else profile)
+
+    def update_profile(self, profile: dict):
+        self.apply_profile(profile)
+
+    def get_stats(self) -> dict:
+        seconds, uplink = self._static_savings(self._sampled_at) if self.static else (0.0, 0.0)
+        return {
+            "static": self.static,
+            "activity": round(self.activity, 4),
+            "transitions": self.transitions,
+            "frames_in": self.frames_in,
+            "frames_saved": self.frames_saved,
+            "bytes_saved": self.bytes_saved,
+            "static_seconds": round(self.static_seconds + seconds, 1),
+            "uplink_bytes_saved": int(self.uplink_bytes_saved + uplink),
+        }
@@ -0,0 +1,131 @@
+import fcntl
+import os
+import select
+import time
+
+from ..pkg.logger import get_logger
+from ..pkg.logger import LogType
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+# Linux-only fcntl commands, exposed by the fcntl module since Python 3.10
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", 1032)
+PIPE_MAX_SIZE_PATH = "/proc/sys/fs/pipe-max-size"
+
+
+def _pipe_max_size() -> int:
+    try:
+        with open(PIPE_MAX_SIZE_PATH) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+class PipeStalledError(IOError):
+    """The reader stopped draining the pipe in the middle of a frame."""
+
+
+class PipeWriter:
+    """Writes whole frames straight to a pipe fd, bypassing Python file buffering.
+
+    The pipe is enlarged with `F_SETPIPE_SZ` so a frame needs few wakeups, and the fd is
+    switched to non-blocking mode. A frame is dropped only if the pipe has no room when
+    it starts; once the first byte is written the frame is completed unless the reader
+    makes no progress for `stall_timeout`, because a truncated frame breaks the alignment
+    of the rawvideo stream on the other side. In that case the writer is marked stalled
+    and `PipeStalledError` is raised, so the owner has to replace the encoder. Time spent
+    waiting for the reader is accounted as write stall.
+    """
+
+    def __init__(self, fd: int, pipe_size: int = 0, write_timeout: float = 0.5, stall_timeout: float = None):
+        self.fd = fd
+        self.write_timeout = write_timeout
+        # Bound on waiting for a reader that stopped mid-frame, a few times the drop timeout by default
+        self.stall_timeout = stall_timeout if stall_timeout is not None else write_timeout * 4
+        self.stalled = False
+        self.pipe_size = self._resize_pipe(pipe_size)
+        os.set_blocking(fd, False)
+        self._poll = select.poll()
+        self._poll.register(fd, select.POLLOUT)
+
+        self.frames = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.partial_writes = 0
+        self.stall_last = 0.0
+        self.stall_max = 0.0
+        self.stall_total = 0.0
+
+    def _resize_pipe(self, requested: int) -> int:
+        if requested > 0:
+            max_size = _pipe_max_size()
+            size = min(requested, max_size) if max_size else requested
+            try:
+                fcntl.fcntl(self.fd, F_SETPIPE_SZ, size)
+            except OSError as e:
+                logger.warning(f"[PIPE WRITER] Cannot resize pipe to {size} bytes: {e}")
+        try:
+            return fcntl.fcntl(self.fd, F_GETPIPE_SZ)
+        except OSError:
+            return 0
+
+    def _wait_writable(self, timeout: float = None) -> bool:
+        timeout_ms = None if timeout is None else max(0, int(timeout * 1000))
+        events = self._poll.poll(timeout_ms)
+        for _, event in events:
+            if event & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                raise BrokenPipeError("Pipe reader has gone away")
+        return bool(events)
+
+    def write(self, buffer) -> bool:
+        """Write one frame. Returns False if it was dropped because the pipe stayed full."""
+        if self.stalled:
+            raise PipeStalledError("Pipe is misaligned after an aborted frame")
+        view = memoryview(buffer).cast("B")
+        total = len(view)
+        offset = 0
+        stall = 0.0
+        while offset < total:
+            try:
+                offset += os.write(self.fd, view[offset:])
+            except BlockingIOError:
+                started = time.monotonic()
+                if offset == 0:
+                    writable = self._wait_writable(self.write_timeout)
+                else:
+                    self.partial_writes += 1
+                    writable = self._wait_writable(self.stall_timeout)
+                stall += time.monotonic() - started
+                if not writable and offset > 0:
+                    self.stalled = True
+                    self._record_stall(stall)
+                    raise PipeStalledError(f"Reader made no progress for {self.stall_timeout:g}s mid-frame")
+                if not writable:
+                    self.skipped += 1
+                    self._record_stall(stall)
+                    return False
+        self.frames += 1
+        self.bytes += total
+        self._record_stall(stall)
+        return True
+
+    def _record_stall(self, stall: float):
+        self.stall_last = stall
+        self.stall_total += stall
+        if stall > self.stall_max:
+            self.stall_max = stall
+
+    def get_stats(self) -> dict:
+        frames = self.frames
+        return {
+            "pipe_size": self.pipe_size,
+            "frames": frames,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+            "partial_writes": self.partial_writes,
+            "stalled": self.stalled,
+            "stall_last_ms": round(self.stall_last * 1000, 2),
+            "stall_avg_ms": round(self.stall_total / frames * 1000, 2) if frames else 0.0,
+            "stall_max_ms": round(self.stall_max * 1000, 2),
+        }
@@ -1,14 +1,72 @@
 import subprocess
 import threading
+import time
+from typing import Optional
+from .encodertelemetry import EncoderTelemetry
+from .framehandler import ProfileFrameProcessor
+from .framedistributor import delivery_enqueued_at
+from .framering import FrameRef, frame_buffer
+from .pipewriter import PipeStalledError, PipeWriter
 from ..abstract.interfacedef import AbstractRTPStreamer
+from ..network.rtcpfeedback import alternate_ssrc
+from ..network.rtpfanout import RTPFanout
+from ..pkg.latency import LatencyTracer
 from ..pkg.logger import LogType
 from ..pkg.logger import get_logger
 
 logger = get_logger(__name__, logType=LogType.BOTH)
 
 
+def rtp_target(output_url: str) -> str:
+    """Normalize an output address to an rtp:// URL for ffmpeg."""
+    if output_url.startswith("rtp://"):
+        return output_url
+    return f"rtp://{output_url}"
+
+
+class _EncoderProcess:
+    """One running ffmpeg encoder together with its stdin writer, frame stage, telemetry and RTP SSRC."""
+
+    def __init__(
+        self,
+        proc: subprocess.Popen,
+        writer: PipeWriter,
+        profile: dict,
+        processor: Optional[ProfileFrameProcessor] = None,
+        telemetry: Optional[EncoderTelemetry] = None,
+        ssrc: Optional[int] = None,
+    ):
+        self.proc = proc
+        self.writer = writer
+        self.profile = profile
+        self.processor = processor
+        self.telemetry = telemetry
+        self.ssrc = ssrc
+        self.started_at = time.monotonic()
+        self.frames = 0
+
+    def write(self, frame) -> bool:
+        """Returns True once the frame is fully written to the encoder pipe."""
+        if self.processor:
+            frame = self.processor.process_frame(frame)
+            if frame is None:
+                return False
+        if self.writer.write(frame_buffer(frame)):
+            self.frames += 1
+            return True
+        return False
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+
 class FFmpegRTPStreamer(AbstractRTPStreamer):
-    """Handles sending raw frames to FFmpeg process for RTP streaming, supports dynamic profile switching."""
+    """Handles sending raw frames to FFmpeg process for RTP streaming, supports dynamic profile switching.
+
+    In `handover` switch mode a new profile is started in a second ffmpeg which is fed in
+    parallel with the current one for a short overlap, then swapped in atomically while the
+    old process is retired in the background, so the RTP output never goes dark.
+    """
 
     def __init__(self, streamer_config: dict):
 
@@ -16,22 +74,82 @@ class FFmpegRTPStreamer(AbstractRTPStreamer):
         self.height = streamer_config.get("resolution", {}).split("x")[1]
         self.fps = streamer_config.get("fps")
         self.output_url = streamer_config.get("output_url")
+        # Resolution of the frames the source delivers; the frame stage scales them to the profile
+        self.source_resolution = streamer_config.get("source_resolution", streamer_config.get("resolution"))
+        self.frame_scaling = bool(streamer_config.get("frame_scaling", True))
+        # Used when the profile carries no calibrated preset
+        self.preset = streamer_config.get("preset", "ultrafast")
+        # 0 sizes the stdin pipe to hold one full frame of the current profile
+        self.pipe_size = int(streamer_config.get("pipe_size", 0))
+        self.write_timeout = float(streamer_config.get("write_timeout", 0.5))
+        # restart | handover
+        self.switch_mode = streamer_config.get("switch_mode", "restart")
+        self.handover_frames = int(streamer_config.get("handover_frames", 5))
+        self.handover_timeout = float(streamer_config.get("handover_timeout", 2.0))
+        self.source_id = streamer_config.get("source_id", "ffmpeg")
+        # The encoder is reported as overloaded after slow_reports progress reports below min_speed
+        self.min_speed = float(streamer_config.get("min_speed", 0.95))
+        self.slow_reports = int(streamer_config.get("slow_reports", 6))
+        self._skipped_at_check = 0
+        # RTP SSRC used by receiver reports to identify this stream, None lets ffmpeg pick one.
+        # An encoder started while another one runs takes the other SSRC of the pair (alternate_ssrc),
+        # so the two ffmpeg processes overlapping during a handover never send under the same SSRC
+        self.ssrc = streamer_config.get("ssrc")
+        # With a fan-out the encoder sends to a local relay that copies packets to output_url and
+        # every extra destination, so receivers can be added or removed without touching ffmpeg
+        destinations = list(streamer_config.get("destinations") or [])
+        self.fanout: Optional[RTPFanout] = None
+        if streamer_config.get("fanout") or destinations:
+            self.fanout = RTPFanout(self.source_id, listen_host=streamer_config.get("fanout_host", "0.0.0.0"))
+            for url in [self.output_url, *destinations]:
+                self.fanout.add_destination(rtp_target(url))
+        self.writer = None
         self.profile = {
             "resolution": f"{self.width}x{self.height}",
             "bitrate": "4500k",  # Default bitrate
             "fps": str(self.fps),
         }
-        self.proc = self._start_ffmpeg_process(self.profile)
 
-    def _start_ffmpeg_process(self, profile):
+        self._lock = threading.Lock()
+        self._encoder: Optional[_EncoderProcess] = None
+        self._pending: Optional[_EncoderProcess] = None
+        self._switch_requested_at = None
+        # (previous, next) encoders of the last switch whose output gap is still being measured
+        self._gap_pair = None
+        self.switches = 0
+        # Encoders replaced because they stopped reading their pipe in the middle of a frame
+        self.stall_restarts = 0
+        # Time between the last output of the previous encoder and the first output of the next
+        # one, from their -progress reports; an overlap means both were sending at once
+        self.last_switch_gap = None
+        self.last_switch_overlap = None
+        self.last_switch_duration = None
+        # capture: capture time -> distributor, fanout: distributor -> this consumer's queue (or the consumer
+        # itself with synchronous delivery), queue: wait in the consumer queue, encoder_pipe: frame stage and
+        # pipe write, total: capture -> last byte in the encoder pipe
+        self.latency = LatencyTracer(("capture", "fanout", "queue", "encoder_pipe", "total"))
+        # Writer counters of encoders that have already been closed, so totals survive restarts
+        self._retired_totals = {"frames": 0, "bytes": 0, "skipped": 0}
+
+        # ffmpeg is spawned by the first apply_profile/start_streaming, not here: the caller
+        # applies its own profile right away and an encoder started now would be thrown away
+        self._set_encoder(None)
+
+    def _start_ffmpeg_process(self, profile, ssrc: Optional[int] = None):
         resolution = profile["resolution"]
         bitrate = profile["bitrate"]
         fps = profile["fps"]
-        logger.info(f"[FFMPEG] Starting process with {resolution} {bitrate} {fps}")
+        preset = profile.get("preset", self.preset)
+        threads = profile.get("threads")
+        logger.info(f"[FFMPEG] Starting process with {resolution} {bitrate} {fps} {preset}")
 
         return subprocess.Popen(
             [
                 "ffmpeg",
+                "-hide_banner",
+                "-nostats",
+                "-loglevel",
+                "warning",
                 "-f",
                 "rawvideo",
                 "-pix_fmt",
@@ -46,28 +164,72 @@ class FFmpegRTPStreamer(AbstractRTPStreamer):
                 "-c:v",
                 "libx264",
                 "-preset",
-                "ultrafast",
+                preset,
                 "-tune",
                 "zerolatency",
+                *(["-threads", str(threads)] if threads else []),
                 "-b:v",
                 bitrate,
                 "-x264-params",
                 "keyint=30:scenecut=0:insert-vui=1",
                 "-bsf:v",
                 "h264_mp4toannexb",
+                "-progress",
+                "pipe:1",
+                *(["-ssrc", str(ssrc)] if ssrc else []),
                 "-f",
                 "rtp",
-                f"rtp://{self.output_url}",
+                self.rtp_output_url,
             ],
             stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
+            bufsize=0,
         )
 
+    @property
+    def rtp_output_url(self) -> str:
+        """Address ffmpeg sends RTP to: the fan-out relay if there is one, otherwise output_url."""
+        return self.fanout.local_url if self.fanout else rtp_target(self.output_url)
+
+    def add_destination(self, url: str) -> bool:
+        """Start copying the encoded stream to another RTP receiver; the encoder keeps running."""
+        if not self.fanout:
+            logger.error(f"[FFMPEG] {self.source_id}: destinations can only be added with rtp_fanout enabled")
+            return False
+        self.fanout.add_destination(rtp_target(url))
+        return True
+
+    def remove_destination(self, url: str) -> bool:
+        if not self.fanout:
+            return False
+        return self.fanout.remove_destination(rtp_target(url))
+
+    def _start_encoder(self, profile: dict) -> _EncoderProcess:
+        current = self._encoder
+        ssrc = alternate_ssrc(current.ssrc) if current and current.ssrc else self.ssrc
+        proc = self._start_ffmpeg_process(profile, ssrc)
+        width, height = map(int, profile["resolution"].split("x"))
+        writer = PipeWriter(
+            proc.stdin.fileno(),
+            pipe_size=self.pipe_size or width * height * 3,
+            write_timeout=self.write_timeout,
+        )
+        processor = ProfileFrameProcessor(self.source_resolution, profile) if self.frame_scaling else None
+        telemetry = EncoderTelemetry(proc, self.source_id, self.min_speed, self.slow_reports)
+        return _EncoderProcess(proc, writer, profile, processor, telemetry, ssrc)
+
+    def _set_encoder(self, encoder: Optional[_EncoderProcess]):
+        self._encoder = encoder
+        self.proc = encoder.proc if encoder else None
+        self.writer = encoder.writer if encoder else None
+        self._skipped_at_check = 0
+
     def start_streaming(self):
         """Start the FFmpeg process for streaming."""
         if not self.proc:
-            logger.error("[FFMPEG] Process not started.")
-            return
+            with self._lock:
+                self._set_encoder(self._start_encoder(self.profile))
 
         logger.info(f"[FFMPEG] Streaming to {self.output_url} with profile: {self.profile}")
 
@@ -77,18 +239,113 @@ class FFmpegRTPStreamer(AbstractRTPStreamer):
             logger.info("[FFMPEG] Stopping streaming.")
             self.close()
         else:
-            logger.error("[FFMPEG] Process not started or already closed.")
+            logger.info("[FFMPEG] Process not started or already closed.")
 
     def process_frame(self, frame_bytes: bytes):
         """Process a single frame and send it to FFmpeg."""
         self.consume_frame(frame_bytes)
 
     def consume_frame(self, frame_bytes: bytes):
+        received_at = time.monotonic()
+        enqueued_at = delivery_enqueued_at()
+        with self._lock:
+            encoder = self._encoder
+            pending = self._pending
         try:
-            if self.proc and self.proc.stdin:
-                self.proc.stdin.write(frame_bytes)
+            if encoder:
+                if encoder.write(frame_bytes) and isinstance(frame_bytes, FrameRef):
+                    self._record_latency(frame_bytes, enqueued_at, received_at, time.monotonic())
+                self._record_gap()
+        except PipeStalledError as e:
+            logger.error(f"[FFMPEG] {self.source_id}: encoder stalled, restarting it: {e}")
+            self._replace_stalled(encoder)
         except (BrokenPipeError, IOError) as e:
             logger.error(f"[FFMPEG] Pipe closed while sending frame: {str(e)}")
+        if pending:
+            self._feed_pending(pending, frame_bytes)
+
+    def _record_latency(self, frame: FrameRef, enqueued_at: Optional[float], received_at: float, written_at: float):
+        distributed_at = frame.distributed_at if frame.distributed_at is not None else received_at
+        self.latency.record("capture", distributed_at - frame.timestamp)
+        if enqueued_at is None:
+            self.latency.record("fanout", received_at - distributed_at)
+        else:
+            self.latency.record("fanout", enqueued_at - distributed_at)
+            self.latency.record("queue", received_at - enqueued_at)
+        self.latency.record("encoder_pipe", written_at - received_at)
+        self.latency.record("total", written_at - frame.timestamp)
+        self.latency.last_seq = frame.seq
+
+    def _feed_pending(self, pending: _EncoderProcess, frame):
+        """Feed the warming-up encoder and swap it in once it has produced its first IDR."""
+        try:
+            pending.write(frame)
+        except (BrokenPipeError, IOError) as e:
+            logger.error(f"[FFMPEG] Handover encoder pipe closed: {str(e)}")
+            self._abort_handover(pending)
+            return
+        # x264 with zerolatency and no lookahead emits the IDR for the first frame right
+        # away, so a few overlapping frames cover the new process's startup latency
+        timed_out = time.monotonic() - pending.started_at > self.handover_timeout
+        if pending.frames >= self.handover_frames or timed_out:
+            if timed_out:
+                logger.warning("[FFMPEG] Handover timed out, swapping encoders anyway")
+            self._complete_handover(pending)
+
+    def _complete_handover(self, pending: _EncoderProcess):
+        with self._lock:
+            if self._pending is not pending:
+                return
+            old = self._encoder
+            self._pending = None
+            self._set_encoder(pending)
+            self._gap_pair = (old, pending) if old else None
+            self.switches += 1
+            if self._switch_requested_at is not None:
+                self.last_switch_duration = time.monotonic() - self._switch_requested_at
+        logger.info(f"[FFMPEG] Handover complete after {pending.frames} overlapping frames")
+        if old:
+            self._retire_async(old)
+
+    def _abort_handover(self, pending: _EncoderProcess):
+        with self._lock:
+            if self._pending is pending:
+                self._pending = None
+        self._retire_async(pending)
+
+    def _record_gap(self):
+        """Measure the output gap of the last switch once the old encoder has exited and the new one has sent data.
+
+        The timestamps come from -progress reports, so the result is accurate to the report interval.
+        """
+        pair = self._gap_pair
+        if pair is None:
+            return
+        old, new = pair
+        if not old.telemetry or not new.telemetry:
+            self._gap_pair = None
+            return
+        if not old.telemetry.finished or new.telemetry.first_output_at is None:
+            return
+        self._gap_pair = None
+        if old.telemetry.last_output_at is None:
+            return
+        gap = new.telemetry.first_output_at - old.telemetry.last_output_at
+        self.last_switch_gap = max(0.0, gap)
+        self.last_switch_overlap = max(0.0, -gap)
+
+    def _replace_stalled(self, encoder: _EncoderProcess):
+        """Swap a stalled encoder for a fresh one with the same profile; the old one is killed in the background."""
+        with self._lock:
+            if self._encoder is not encoder:
+                return
+            self._set_encoder(self._start_encoder(self.profile))
+            self.stall_restarts += 1
+        encoder.proc.kill()
+        self._retire_async(encoder)
+
+    def _retire_async(self, encoder: _EncoderProcess):
+        threading.Thread(target=self._close_encoder, args=(encoder,), daemon=True).start()
 
     def apply_profile(self, profile: dict):
         """Dynamically apply a new encoding profile (resolution, bitrate, fps)."""
@@ -96,25 +353,211 @@ class FFmpegRTPStreamer(AbstractRTPStreamer):
             logger.error("[FFMPEG] No profile provided to apply.")
             return
 
+        if profile == self.profile and self._encoder and self._encoder.alive() and self._pending is None:
+            # Re-planning often hands back the current profile; respawning ffmpeg for it only costs a gap
+            return
+
         logger.info(f"[FFMPEG] Applying new profile: {profile}")
 
         # Save profile
         self.profile = profile
+        self._switch_requested_at = time.monotonic()
+
+        if self.switch_mode == "handover" and self._encoder and self._encoder.alive():
+            pending = self._start_encoder(self.profile)
+            with self._lock:
+                previous, self._pending = self._pending, pending
+            if previous:
+                self._retire_async(previous)
+            return
 
         # Restart FFmpeg process
+        old = self._encoder
         self.close()
-        self.proc = self._start_ffmpeg_process(self.profile)
+        with self._lock:
+            self._set_encoder(self._start_encoder(self.profile))
+            self._gap_pair = (old, self._encoder) if old else None
+            if old:
+                self.switches += 1
+            self.last_switch_duration = time.monotonic() - self._switch_requested_at
 
-    def close(self):
-        if self.proc:
+    def update_profile(self, profile: dict):
+        """Alias for apply_profile used by the quality policy."""
+        self.apply_profile(profile)
+
+    def _close_encoder(self, encoder: _EncoderProcess):
+        stats = encoder.writer.get_stats()
+        # Retire threads of successive switches may finish at the same time
+        with self._lock:
+            for key in self._retired_totals:
+                self._retired_totals[key] += stats[key]
+        proc = encoder.proc
+        try:
+            if proc.stdin:
+                proc.stdin.close()
             try:
-                if self.proc.stdin:
-                    self.proc.stdin.close()
-                self.proc.wait(timeout=0.5)
-                if self.proc.poll() is None:
-                    self.proc.terminate()
-                    self.proc.wait(timeout=1)
-                logger.info("[FFMPEG] Process closed successfully.")
-            except Exception as e:
-                logger.error(f"[FFMPEG] Error closing FFmpeg process: {str(e)}")
-            self.proc = None
+                proc.wait(timeout=0.5)
+            except subprocess.TimeoutExpired:
+                proc.terminate()
+                proc.wait(timeout=1)
+            logger.info("[FFMPEG] Process closed successfully.")
+        except Exception as e:
+            logger.error(f"[FFMPEG] Error closing FFmpeg process: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            encoder, pending = self._encoder, self._pending
+            self._pending = None
+            self._set_encoder(None)
+        if pending:
+            self._close_encoder(pending)
+        if encoder:
+            self._close_encoder(encoder)
+
+    def abort(self):
+        """Kill the encoders without waiting, unblocking a profile switch stuck on them.
+
+        The next apply_profile/start_streaming sees the dead encoder and starts a new one.
+        """
+        for encoder in (self._encoder, self._pending):
+            if encoder and encoder.alive():
+                encoder.proc.kill()
+
+    def shutdown(self):
+        """Close the encoders and the fan-out relay; close() alone keeps the relay for restarts and passthrough."""
+        self.close()
+        if self.fanout:
+            self.fanout.stop()
+            self.fanout = None
+
+    def encoder_overloaded(self) -> bool:
+        """True if the encoder runs below real time and the pipe has been pushing back since the last check."""
+        encoder = self._encoder
+        if not encoder or not encoder.telemetry:
+            return False
+        skipped = encoder.writer.skipped
+        backpressure = skipped > self._skipped_at_check
+        self._skipped_at_check = skipped
+        # Speed below 1.0x alone may only mean the source delivers fewer frames than the profile fps
+        return encoder.telemetry.slow and backpressure
+
+    def _totals(self) -> dict:
+        with self._lock:
+            totals = dict(self._retired_totals)
+        writer = self.writer
+        if writer:
+            totals["frames"] += writer.frames
+            totals["bytes"] += writer.bytes
+            totals["skipped"] += writer.skipped
+        return totals
+
+    def get_status(self) -> dict:
+        self._record_gap()
+        return {
+            "active": self.proc is not None and self.proc.poll() is None,
+            "profile": self.profile,
+            "output_url": self.output_url,
+            "fanout": self.fanout.get_stats() if self.fanout else None,
+            "writer": self.writer.get_stats() if self.writer else {},
+            "frame_stage": self._encoder.processor.get_stats() if self._encoder and self._encoder.processor else {},
+            "latency": self.latency.get_stats(),
+            "totals": self._totals(),
+            "encoder": self._encoder.telemetry.get_stats() if self._encoder and self._encoder.telemetry else {},
+            "stall_restarts": self.stall_restarts,
+            "switch": {
+                "mode": self.switch_mode,
+                "switches": self.switches,
+                "in_progress": self._pending is not None,
+                "last_gap_ms": round(self.last_switch_gap * 1000, 1) if self.last_switch_gap is not None else None,
+                "last_overlap_ms": (
+                    round(self.last_switch_overlap * 1000, 1) if self.last_switch_overlap is not None else None
+                ),
+                "last_duration_ms": (
+                    round(self.last_switch_duration * 1000, 1) if self.last_switch_duration is not None else None
+                ),
+            },
+        }
+
+
+class FFmpegRTSPPassthrough:
+    """Remuxes a camera's RTSP H.264 stream straight to RTP with `-c copy`.
+
+    No frames pass through Python and nothing is decoded or re-encoded, so this is used
+    instead of the RTSP source + FFmpegRTPStreamer pair whenever the active profile is the
+    camera's native one.
+    """
+
+    def __init__(self, rtsp_url: str, output_url: str, rtsp_transport: str = "tcp"):
+        self.rtsp_url = rtsp_url
+        self.output_url = output_url
+        self.rtsp_transport = rtsp_transport
+        self.proc = None
+        self.started_at = None
+        self.restarts = 0
+
+    def _start_ffmpeg_process(self):
+        logger.info(f"[FFMPEG PASSTHROUGH] Remuxing {self.output_url} without transcoding")
+        return subprocess.Popen(
+            [
+                "ffmpeg",
+                "-rtsp_transport",
+                self.rtsp_transport,
+                "-fflags",
+                "nobuffer",
+                "-i",
+                self.rtsp_url,
+                "-an",
+                "-c:v",
+                "copy",
+                "-bsf:v",
+                "h264_mp4toannexb",
+                "-f",
+                "rtp",
+                rtp_target(self.output_url),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def start(self):
+        if self.is_active():
+            return
+        if self.proc is not None:
+            self.restarts += 1
+        self.proc = self._start_ffmpeg_process()
+        self.started_at = time.monotonic()
+
+    def stop(self):
+        if not self.proc:
+            return
+        try:
+            if self.proc.poll() is None:
+                self.proc.terminate()
+                self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        except Exception as e:
+            logger.error(f"[FFMPEG PASSTHROUGH] Error stopping process: {str(e)}")
+        self.proc = None
+        logger.info("[FFMPEG PASSTHROUGH] Process stopped.")
+
+    def close(self):
+        self.stop()
+
+    def is_active(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    @property
+    def exited(self) -> bool:
+        """True if ffmpeg ended on its own (camera reboot, network drop) rather than through stop()."""
+        return self.proc is not None and self.proc.poll() is not None
+
+    def get_status(self) -> dict:
+        return {
+            "active": self.is_active(),
+            "mode": "passthrough",
+            "output_url": self.output_url,
+            "restarts": self.restarts,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.is_active() else 0,
+        }
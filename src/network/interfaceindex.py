@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+
+@dataclass
+class InterfaceEntry:
+    id: str
+    type: str
+    priority: int
+    connected: bool
+    data: dict
+
+
+def is_connected(node: dict) -> bool:
+    return node.get("connected", "") == "yes" or node.get("status", "") == "connected"
+
+
+class InterfaceIndex:
+    """
+    Плоский индекс интерфейсов роутера по id.
+
+    Строится один раз из ответа `rci/show/interface` и далее обновляется точечно.
+    Рассматриваются только интерфейсы верхнего уровня, поэтому вложенные записи
+    (VLAN, Wi-Fi клиенты, пиры) с полем connected не выдаются за активный WAN.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, InterfaceEntry] = {}
+        self._active: Optional[str] = None
+
+    @classmethod
+    def from_dump(cls, data) -> "InterfaceIndex":
+        index = cls()
+        index.rebuild(data)
+        return index
+
+    @staticmethod
+    def _iter_interfaces(data) -> Iterable[Tuple[str, dict]]:
+        if isinstance(data, dict):
+            for key, node in data.items():
+                if isinstance(node, dict):
+                    yield node.get("id", key), node
+        elif isinstance(data, list):
+            for node in data:
+                if isinstance(node, dict) and "id" in node:
+                    yield node["id"], node
+
+    def rebuild(self, data):
+        """Полностью перестраивает индекс по дампу интерфейсов."""
+        self._entries = {}
+        for interface_id, node in self._iter_interfaces(data):
+            self._entries[interface_id] = self._entry(interface_id, node)
+        self._recompute_active()
+
+    @staticmethod
+    def _entry(interface_id: str, node: dict) -> InterfaceEntry:
+        try:
+            priority = int(node.get("priority", 0))
+        except (TypeError, ValueError):
+            priority = 0
+        return InterfaceEntry(
+            id=interface_id,
+            type=node.get("type", ""),
+            priority=priority,
+            connected=is_connected(node),
+            data=node,
+        )
+
+    def _recompute_active(self):
+        best = None
+        for entry in self._entries.values():
+            if entry.connected and (best is None or entry.priority > best.priority):
+                best = entry
+        self._active = best.id if best else None
+
+    def update(self, interface_id: str, node: dict):
+        """Обновляет одну запись; полный пересчёт нужен только если отключился активный интерфейс."""
+        entry = self._entry(interface_id, node)
+        self._entries[interface_id] = entry
+        active = self._entries.get(self._active) if self._active else None
+        if interface_id == self._active and not entry.connected:
+            self._recompute_active()
+        elif entry.connected and (active is None or entry.priority > active.priority):
+            self._active = interface_id
+
+    def remove(self, interface_id: str):
+        if self._entries.pop(interface_id, None) and interface_id == self._active:
+            self._recompute_active()
+
+    def get(self, interface_id: str) -> Optional[InterfaceEntry]:
+        return self._entries.get(interface_id)
+
+    def active_wan(self) -> Optional[InterfaceEntry]:
+        return self._entries.get(self._active) if self._active else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, interface_id):
+        return interface_id in self._entries
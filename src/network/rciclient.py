@@ -1,6 +1,7 @@
 import requests
 import hashlib
 from ..config import Config
+from .interfaceindex import InterfaceIndex
 
 
 from ..pkg.logger import get_logger
@@ -18,14 +19,42 @@ class KeeneticRCIClient:
         self.password = config.password
         self.timeout = config.timeout
         self.degradation_steps = config.degradation_steps
+        self._authenticated = False
+        # Идентификатор активного WAN-интерфейса, опрашивается точечно без полного дампа
+        self.active_interface = None
+        self.index = InterfaceIndex()
+        # Раз в N опросов берём полный дамп, чтобы заметить подключение более приоритетного интерфейса
+        self.full_refresh_polls = 12
+        self._polls_since_refresh = 0
         logger_text.info("[Keenetic] Конфигурация загружена успешно.")
         logger_text.info("[Keenetic] Инициализация сессии...")
 
-    def _request(self, path, post=None):
+    def _request(self, path, post=None, params=None):
         url = f"http://{self.ip}/{path}"
-        return self.session.post(url, json=post) if post else self.session.get(url)
+        timeout = float(self.timeout)
+        if post:
+            return self.session.post(url, json=post, timeout=timeout)
+        return self.session.get(url, params=params, timeout=timeout)
+
+    def _rci(self, path, params=None):
+        """Запрос к RCI в рамках сохранённой сессии; повторная аутентификация только по 401."""
+        r = self._request(path, params=params)
+        if r.status_code == 401:
+            self._authenticated = False
+            if not self.authenticate():
+                r.raise_for_status()
+            r = self._request(path, params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def authenticate(self, force: bool = False) -> bool:
+        """Аутентифицирует сессию. Пока сессия действительна, запросы к роутеру не выполняются."""
+        if self._authenticated and not force:
+            return True
+        self._authenticated = self._authenticate()
+        return self._authenticated
 
-    def authenticate(self) -> bool:
+    def _authenticate(self) -> bool:
         r = self._request("auth")
         if r.status_code == 401:
             realm = r.headers.get("X-NDM-Realm", "")
@@ -48,31 +77,46 @@ class KeeneticRCIClient:
 
     @staticmethod
     def find_used_connection(data) -> str:
-        active = ""
-        priority = 0
-
-        def recurse(node):
-            nonlocal active, priority
-            if isinstance(node, dict):
-                if node.get("connected", "") == "yes" or node.get("status", "") == "connected":
-                    if node.get("priority", 0) > priority:
-                        active = node.get("id")
-                        priority = node.get("priority", 0)
-                for v in node.values():
-                    recurse(v)
-            elif isinstance(node, list):
-                for item in node:
-                    recurse(item)
-
-        recurse(data)
-        return active
+        """Возвращает id подключённого интерфейса верхнего уровня с наибольшим приоритетом."""
+        active = InterfaceIndex.from_dump(data).active_wan()
+        return active.id if active else ""
+
+    def _fetch_active_interface(self):
+        """Запрашивает только запомненный интерфейс. None - если он пропал или отключился."""
+        data: dict = self._rci("rci/show/interface", params={"name": self.active_interface})
+        # Роутер может вернуть как сам интерфейс, так и словарь с одним ключом
+        interface = data.get(self.active_interface, data)
+        if not isinstance(interface, dict):
+            self.index.remove(self.active_interface)
+            return None
+        self.index.update(self.active_interface, interface)
+        active = self.index.active_wan()
+        if active is None or active.id != self.active_interface:
+            return None
+        return active.data
+
+    def _discover_active_interface(self):
+        """Полный дамп интерфейсов: нужен только при старте и при смене активного подключения."""
+        self.index.rebuild(self._rci("rci/show/interface"))
+        active = self.index.active_wan()
+        if active is None:
+            raise RuntimeError("Не найдено активное подключение")
+        if active.id != self.active_interface:
+            logger_text.info(f"[Keenetic] Активное подключение: {active.id}")
+        self.active_interface = active.id
+        return active.data
 
     def get_connection_info(self):
-        data: dict = self._request("rci/show/interface").json()
-        connection = self.find_used_connection(data)
-        if "WifiStation" == data.get(connection).get("type"):
-            return self._calculate_wifi_quality(data.get(connection))
-        return self._calculate_4g_signal_quality(data.get(connection))
+        interface = None
+        self._polls_since_refresh += 1
+        if self.active_interface and self._polls_since_refresh < self.full_refresh_polls:
+            interface = self._fetch_active_interface()
+        if interface is None:
+            interface = self._discover_active_interface()
+            self._polls_since_refresh = 0
+        if "WifiStation" == interface.get("type"):
+            return self._calculate_wifi_quality(interface)
+        return self._calculate_4g_signal_quality(interface)
 
     @staticmethod
     def _level_from_score(score, max_score=100, levels=5):
@@ -0,0 +1,387 @@
+"""
+Обратная связь о доставке RTP-потоков по отчётам RTCP Receiver Report (RFC 3550).
+
+RTCPFeedbackCollector принимает RR от приёмников на отдельном UDP-порту и хранит для
+каждого потока (по SSRC) долю потерь, джиттер и RTT. RTPReceiverStandIn - локальная
+замена приёмника для проверки: принимает RTP и SR от ffmpeg, считает потери и джиттер
+и отправляет RR в коллектор.
+
+    python -m src.network.rtcpfeedback --rtp-port 5004 --feedback 127.0.0.1:6000 --drop 0.05
+"""
+
+import argparse
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from ..pkg.logger import get_logger
+from ..pkg.logger import LogType
+
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+RTCP_SR = 200
+RTCP_RR = 201
+# Частота RTP-часов для видео
+VIDEO_CLOCK_RATE = 90000
+NTP_EPOCH_OFFSET = 2208988800
+
+
+def stream_ssrc(source_id: str) -> int:
+    """Детерминированный SSRC потока, чтобы сопоставлять отчёты приёмников с источниками."""
+    return zlib.crc32(source_id.encode("utf-8")) & 0x7FFFFFFF or 1
+
+
+def alternate_ssrc(ssrc: int) -> int:
+    """
+    Второй SSRC того же потока. Кодировщики источника по очереди берут stream_ssrc() и этот SSRC,
+    поэтому при перекрытии во время handover у двух ffmpeg разные SSRC со своими номерами пакетов.
+    """
+    return ssrc ^ 0x80000000
+
+
+def ntp_compact(now: float = None) -> int:
+    """Средние 32 бита NTP-времени (формат LSR/DLSR, единица 1/65536 с)."""
+    ntp = (time.time() if now is None else now) + NTP_EPOCH_OFFSET
+    return int(ntp * 65536) & 0xFFFFFFFF
+
+
+@dataclass
+class StreamFeedback:
+    ssrc: int
+    loss_fraction: float = 0.0
+    cumulative_lost: int = 0
+    jitter_ms: float = 0.0
+    rtt_ms: Optional[float] = None
+    reports: int = 0
+    updated_at: float = 0.0
+    reporter: str = ""
+
+    def as_dict(self) -> dict:
+        return {
+            "loss_fraction": round(self.loss_fraction, 4),
+            "cumulative_lost": self.cumulative_lost,
+            "jitter_ms": round(self.jitter_ms, 2),
+            "rtt_ms": round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+            "reports": self.reports,
+            "age_s": round(time.monotonic() - self.updated_at, 1) if self.updated_at else None,
+            "reporter": self.reporter,
+        }
+
+
+def parse_report_blocks(packet: bytes):
+    """Разбирает составной RTCP-пакет и возвращает блоки отчётов из RR и SR."""
+    blocks = []
+    offset = 0
+    while offset + 8 <= len(packet):
+        first, packet_type, length = struct.unpack_from("!BBH", packet, offset)
+        end = offset + (length + 1) * 4
+        if first >> 6 != 2 or end > len(packet):
+            break
+        count = first & 0x1F
+        # В SR блоки отчётов идут после 20 байт информации отправителя
+        start = offset + 8 + (20 if packet_type == RTCP_SR else 0)
+        if packet_type in (RTCP_RR, RTCP_SR):
+            for i in range(count):
+                block = start + i * 24
+                if block + 24 > end:
+                    break
+                ssrc, lost_word, _, jitter, lsr, dlsr = struct.unpack_from("!IIIIII", packet, block)
+                cumulative = lost_word & 0xFFFFFF
+                if cumulative & 0x800000:
+                    cumulative -= 0x1000000
+                blocks.append((ssrc, (lost_word >> 24) / 256.0, cumulative, jitter, lsr, dlsr))
+        offset = end
+    return blocks
+
+
+class RTCPFeedbackCollector:
+    """
+    Принимает RTCP Receiver Report от приёмников и хранит последнюю обратную связь по потокам.
+
+    ffmpeg не обрабатывает входящие RTCP, поэтому приёмники (или RTPReceiverStandIn)
+    отправляют RR на отдельный порт коллектора. Потоки сопоставляются по SSRC, который
+    стример задаёт через stream_ssrc().
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 6000, clock_rate: int = VIDEO_CLOCK_RATE):
+        self.host = host
+        self.port = port
+        self.clock_rate = clock_rate
+        self.streams: Dict[int, StreamFeedback] = {}
+        self.names: Dict[int, str] = {}
+        self.packets = 0
+        self.malformed = 0
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+        self._running = False
+
+    def register_stream(self, source_id: str, ssrc: int = None):
+        ssrc = ssrc if ssrc is not None else stream_ssrc(source_id)
+        self.names[ssrc] = source_id
+        self.names[alternate_ssrc(ssrc)] = source_id
+
+    def start(self):
+        if self._running:
+            return
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((self.host, self.port))
+        self._sock.settimeout(0.5)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="rtcp-feedback", daemon=True)
+        self._thread.start()
+        logger.info(f"[RTCP] Приём отчётов RTCP на {self.host}:{self.port}")
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    def _run(self):
+        while self._running:
+            try:
+                packet, address = self._sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.handle_packet(packet, f"{address[0]}:{address[1]}")
+
+    def handle_packet(self, packet: bytes, reporter: str = "", now: float = None):
+        blocks = parse_report_blocks(packet)
+        if not blocks:
+            self.malformed += 1
+            return
+        self.packets += 1
+        arrival = ntp_compact(now)
+        with self._lock:
+            for ssrc, fraction, cumulative, jitter, lsr, dlsr in blocks:
+                feedback = self.streams.get(ssrc)
+                if feedback is None:
+                    feedback = self.streams[ssrc] = StreamFeedback(ssrc)
+                feedback.loss_fraction = fraction
+                feedback.cumulative_lost = cumulative
+                feedback.jitter_ms = jitter / self.clock_rate * 1000.0
+                if lsr:
+                    rtt = ((arrival - lsr - dlsr) & 0xFFFFFFFF) / 65536.0
+                    # Отрицательное значение по модулю 2^32 даёт огромный RTT - это рассинхрон часов
+                    feedback.rtt_ms = rtt * 1000.0 if rtt < 60 else feedback.rtt_ms
+                feedback.reports += 1
+                feedback.updated_at = time.monotonic()
+                feedback.reporter = reporter
+
+    def last_report_at(self, source_id: str) -> Optional[float]:
+        """Время (time.monotonic) последнего отчёта о любом из двух SSRC потока или None."""
+        with self._lock:
+            reports = [f.updated_at for ssrc, f in self.streams.items() if f.updated_at and self.names.get(ssrc) == source_id]
+        return max(reports) if reports else None
+
+    def link_feedback(self, max_age: float = 10.0) -> Optional[dict]:
+        """Худшие значения по всем потокам со свежими отчётами или None, если отчётов нет."""
+        now = time.monotonic()
+        with self._lock:
+            fresh = [f for f in self.streams.values() if f.updated_at and now - f.updated_at <= max_age]
+        if not fresh:
+            return None
+        rtts = [f.rtt_ms for f in fresh if f.rtt_ms is not None]
+        return {
+            "loss_fraction": max(f.loss_fraction for f in fresh),
+            "jitter_ms": max(f.jitter_ms for f in fresh),
+            "rtt_ms": max(rtts) if rtts else None,
+            "streams": len(fresh),
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            # Оба SSRC источника отображаются под одним именем, показывается более свежий
+            ordered = sorted(self.streams.items(), key=lambda item: item[1].updated_at or 0)
+            streams = {self.names.get(ssrc, str(ssrc)): f.as_dict() for ssrc, f in ordered}
+        return {"packets": self.packets, "malformed": self.malformed, "streams": streams}
+
+
+class _ReceiverState:
+    """Счётчики приёмника одного SSRC по RFC 3550, приложение A.3 и A.8."""
+
+    def __init__(self, seq: int):
+        self.base_seq = seq
+        self.max_seq = seq
+        self.cycles = 0
+        self.received = 0
+        self.expected_prior = 0
+        self.received_prior = 0
+        self.transit = None
+        self.jitter = 0.0
+        self.lsr = 0
+        self.sr_arrival = None
+
+    def update(self, seq: int, rtp_timestamp: int, arrival_units: int):
+        # Пакет впереди max_seq (с учётом перехода через 0); опоздавшие и дубли max_seq не двигают
+        if 0 < (seq - self.max_seq) & 0xFFFF < 3000:
+            if seq < self.max_seq:
+                self.cycles += 0x10000
+            self.max_seq = seq
+        self.received += 1
+        transit = arrival_units - rtp_timestamp
+        if self.transit is not None:
+            d = abs(transit - self.transit)
+            self.jitter += (d - self.jitter) / 16.0
+        self.transit = transit
+
+    def report_block(self, ssrc: int) -> bytes:
+        extended_max = self.cycles + self.max_seq
+        expected = extended_max - self.base_seq + 1
+        lost = max(0, expected - self.received)
+        expected_interval = expected - self.expected_prior
+        received_interval = self.received - self.received_prior
+        self.expected_prior = expected
+        self.received_prior = self.received
+        lost_interval = expected_interval - received_interval
+        fraction = (lost_interval << 8) // expected_interval if expected_interval > 0 and lost_interval > 0 else 0
+        dlsr = int((time.time() - self.sr_arrival) * 65536) if self.sr_arrival else 0
+        return struct.pack(
+            "!IIIIII",
+            ssrc,
+            (min(fraction, 255) << 24) | (min(lost, 0x7FFFFF) & 0xFFFFFF),
+            extended_max & 0xFFFFFFFF,
+            int(self.jitter) & 0xFFFFFFFF,
+            self.lsr,
+            dlsr & 0xFFFFFFFF,
+        )
+
+
+class RTPReceiverStandIn:
+    """
+    Локальная замена приёмника RTP для тестов обратной связи.
+
+    Слушает RTP на rtp_port и RTCP SR от ffmpeg на rtp_port + 1, считает потери и джиттер
+    по каждому SSRC и раз в interval секунд отправляет RR в коллектор. Параметр drop
+    отбрасывает долю пакетов и имитирует перегруженный канал.
+    """
+
+    def __init__(
+        self,
+        rtp_port: int,
+        feedback_address: Tuple[str, int],
+        host: str = "0.0.0.0",
+        interval: float = 1.0,
+        drop: float = 0.0,
+        clock_rate: int = VIDEO_CLOCK_RATE,
+    ):
+        self.rtp_port = rtp_port
+        self.feedback_address = feedback_address
+        self.host = host
+        self.interval = interval
+        self.drop = drop
+        self.clock_rate = clock_rate
+        self.ssrc = random.getrandbits(32)
+        self.states: Dict[int, _ReceiverState] = {}
+        self.packets = 0
+        self.dropped = 0
+        self._running = False
+        self._threads = []
+        self._sockets = []
+
+    def start(self):
+        rtp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rtp.bind((self.host, self.rtp_port))
+        rtcp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rtcp.bind((self.host, self.rtp_port + 1))
+        for sock in (rtp, rtcp):
+            sock.settimeout(0.5)
+        self._sockets = [rtp, rtcp]
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._receive_rtp, args=(rtp,), daemon=True),
+            threading.Thread(target=self._receive_rtcp, args=(rtcp,), daemon=True),
+            threading.Thread(target=self._send_reports, args=(rtcp,), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for sock in self._sockets:
+            sock.close()
+
+    def _receive_rtp(self, sock: socket.socket):
+        while self._running:
+            try:
+                packet = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if len(packet) < 12 or packet[0] >> 6 != 2:
+                continue
+            if self.drop and random.random() < self.drop:
+                self.dropped += 1
+                continue
+            seq, rtp_timestamp, ssrc = struct.unpack_from("!HII", packet, 2)
+            arrival_units = int(time.monotonic() * self.clock_rate) & 0xFFFFFFFF
+            state = self.states.get(ssrc)
+            if state is None:
+                state = self.states[ssrc] = _ReceiverState(seq)
+            state.update(seq, rtp_timestamp, arrival_units)
+            self.packets += 1
+
+    def _receive_rtcp(self, sock: socket.socket):
+        while self._running:
+            try:
+                packet = sock.recv(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if len(packet) >= 16 and packet[1] == RTCP_SR:
+                ssrc, msw, lsw = struct.unpack_from("!III", packet, 4)
+                state = self.states.get(ssrc)
+                if state:
+                    state.lsr = ((msw & 0xFFFF) << 16) | (lsw >> 16)
+                    state.sr_arrival = time.time()
+
+    def _send_reports(self, sock: socket.socket):
+        while self._running:
+            time.sleep(self.interval)
+            states = list(self.states.items())[:31]
+            if not states:
+                continue
+            blocks = b"".join(state.report_block(ssrc) for ssrc, state in states)
+            header = struct.pack("!BBHI", 0x80 | len(states), RTCP_RR, (8 + len(blocks)) // 4 - 1, self.ssrc)
+            try:
+                sock.sendto(header + blocks, self.feedback_address)
+            except OSError as e:
+                logger.warning(f"[RTCP] Не удалось отправить RR: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный приёмник RTP, отправляющий RTCP RR в коллектор")
+    parser.add_argument("--rtp-port", type=int, default=5004)
+    parser.add_argument("--feedback", default="127.0.0.1:6000", help="Адрес RTCPFeedbackCollector")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--drop", type=float, default=0.0, help="Доля отбрасываемых пакетов")
+    args = parser.parse_args()
+
+    host, port = args.feedback.rsplit(":", 1)
+    receiver = RTPReceiverStandIn(args.rtp_port, (host, int(port)), interval=args.interval, drop=args.drop)
+    receiver.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"packets={receiver.packets} dropped={receiver.dropped} streams={len(receiver.states)}")
+    except KeyboardInterrupt:
+        receiver.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import select
+import socket
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from ..pkg.logger import get_logger
+from ..pkg.logger import LogType
+
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+
+def parse_rtp_address(url: str) -> Tuple[str, int]:
+    """'rtp://host:port', 'host:port' -> (host, port); путь после порта игнорируется, как и в ffmpeg."""
+    address = url.split("://", 1)[-1].split("/", 1)[0].split("?", 1)[0]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Адрес RTP должен быть в виде host:port: {url}")
+    return host, int(port)
+
+
+class RTPFanout:
+    """
+    Размножает RTP-поток одного кодировщика на несколько получателей.
+
+    ffmpeg отправляет RTP на локальный порт (и RTCP на порт + 1), а каждый пакет пересылается
+    всем получателям без повторного кодирования. Получателей можно добавлять и удалять на ходу,
+    кодировщик при этом не перезапускается. Получателям пересылается только RTCP самого
+    кодировщика (ffmpeg шлёт его с порта, соседнего с портом отправки RTP); любые другие пакеты
+    на RTCP-порт считаются отчётами получателей и передаются в on_rtcp (например,
+    в RTCPFeedbackCollector.handle_packet) или отбрасываются.
+
+    Сокеты занимаются на listen_host (по умолчанию на всех интерфейсах): сокет, привязанный
+    к 127.0.0.1, не может отправлять на внешние адреса, а отчёты удалённых приёмников до него
+    не доходят. ffmpeg же отправляет на encoder_host, и RTP принимается только оттуда.
+    """
+
+    # Сколько секунд адрес отправителя RTP считается кодировщиком после последнего пакета:
+    # во время передачи кодирования их два, затем старый замолкает
+    SENDER_TTL = 10.0
+
+    def __init__(self, name: str, listen_host: str = "0.0.0.0", on_rtcp: Callable = None, encoder_host: str = "127.0.0.1"):
+        self.name = name
+        self.listen_host = listen_host
+        self.encoder_host = encoder_host
+        self.on_rtcp = on_rtcp
+        self._rtp, self._rtcp = self._bind_pair(listen_host)
+        self.port = self._rtp.getsockname()[1]
+        self._destinations: Dict[Tuple[str, int], dict] = {}
+        self._lock = threading.Lock()
+        self.packets = 0
+        self.bytes = 0
+        self.rtcp_in = 0
+        self.rtcp_dropped = 0
+        self.rtp_dropped = 0
+        # Когда получатель последний раз присылал RTCP: по этому сигналу поток считается нужным
+        self.receiver_rtcp_at = None
+        self._senders: Dict[Tuple[str, int], float] = {}
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"rtp-fanout-{name}", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _bind_pair(host: str, attempts: int = 20):
+        """Занимает пару соседних портов RTP/RTCP, как того ждёт ffmpeg."""
+        for _ in range(attempts):
+            rtp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            rtp.bind((host, 0))
+            port = rtp.getsockname()[1]
+            if port % 2 == 0 and port < 65535:
+                rtcp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                try:
+                    rtcp.bind((host, port + 1))
+                    return rtp, rtcp
+                except OSError:
+                    rtcp.close()
+            rtp.close()
+        raise OSError("Не удалось занять пару портов RTP/RTCP")
+
+    @property
+    def local_url(self) -> str:
+        return f"rtp://{self.encoder_host}:{self.port}"
+
+    def add_destination(self, url: str):
+        address = parse_rtp_address(url)
+        with self._lock:
+            if address not in self._destinations:
+                self._destinations[address] = {"url": url, "packets": 0, "errors": 0}
+        logger.info(f"[RTP FANOUT] {self.name}: добавлен получатель {url}")
+
+    def remove_destination(self, url: str) -> bool:
+        address = parse_rtp_address(url)
+        with self._lock:
+            removed = self._destinations.pop(address, None) is not None
+        if removed:
+            logger.info(f"[RTP FANOUT] {self.name}: удалён получатель {url}")
+        return removed
+
+    def destinations(self):
+        with self._lock:
+            return [entry["url"] for entry in self._destinations.values()]
+
+    def _run(self):
+        sockets = [self._rtp, self._rtcp]
+        while self._running:
+            try:
+                readable, _, _ = select.select(sockets, [], [], 0.5)
+            except (OSError, ValueError):
+                break
+            for sock in readable:
+                try:
+                    packet, sender = sock.recvfrom(65536)
+                except OSError:
+                    continue
+                if sock is self._rtp:
+                    if sender[0] != self.encoder_host:
+                        # На всех интерфейсах RTP может прислать кто угодно, пересылается только кодировщик
+                        self.rtp_dropped += 1
+                        continue
+                    self._remember_sender(sender)
+                    self._forward(self._rtp, packet, 0)
+                elif self._from_encoder(sender):
+                    self._forward(self._rtcp, packet, 1)
+                else:
+                    self._receiver_rtcp(packet, sender)
+
+    def _receiver_rtcp(self, packet: bytes, sender):
+        # Порт открыт на всех интерфейсах, поэтому спрос на поток засчитывается только за пакеты RTCP
+        # (версия 2, типы SR..APP), а не за любую датаграмму
+        if len(packet) < 8 or packet[0] >> 6 != 2 or not 200 <= packet[1] <= 204:
+            self.rtcp_dropped += 1
+            return
+        self.receiver_rtcp_at = time.monotonic()
+        if not self.on_rtcp:
+            self.rtcp_dropped += 1
+            return
+        self.rtcp_in += 1
+        try:
+            self.on_rtcp(packet, f"{sender[0]}:{sender[1]}")
+        except Exception as e:
+            logger.error(f"[RTP FANOUT] {self.name}: ошибка обработки RTCP: {e}")
+
+    def _remember_sender(self, sender):
+        now = time.monotonic()
+        if sender not in self._senders:
+            self._senders = {address: seen for address, seen in self._senders.items() if now - seen < self.SENDER_TTL}
+        self._senders[sender] = now
+
+    def _from_encoder(self, sender) -> bool:
+        """RTCP кодировщика приходит с порта RTP + 1 (или с того же порта) того же хоста."""
+        host, port = sender
+        return (host, port - 1) in self._senders or (host, port) in self._senders
+
+    def _forward(self, sock: socket.socket, packet: bytes, port_offset: int):
+        with self._lock:
+            destinations = list(self._destinations.items())
+        for (host, port), entry in destinations:
+            try:
+                sock.sendto(packet, (host, port + port_offset))
+                entry["packets"] += 1
+            except OSError:
+                entry["errors"] += 1
+        if port_offset == 0:
+            self.packets += 1
+            self.bytes += len(packet)
+
+    def stop(self):
+        self._running = False
+        self._thread.join(timeout=2)
+        self._rtp.close()
+        self._rtcp.close()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            destinations = {entry["url"]: {"packets": entry["packets"], "errors": entry["errors"]} for entry in self._destinations.values()}
+        return {
+            "local_url": self.local_url,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "rtcp_in": self.rtcp_in,
+            "rtcp_dropped": self.rtcp_dropped,
+            "rtp_dropped": self.rtp_dropped,
+            "destinations": destinations,
+        }
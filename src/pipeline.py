@@ -0,0 +1,268 @@
+import multiprocessing
+import threading
+from typing import Any, Dict
+
+from .abstract.interfacedef import AbstractInputSource, AbstractSourceControl, AbstractStreamerControl
+from .config import Config
+from .handlers.inputsources import FFmpegRTSPInputSource, RTSPInputSource, DAICameraInput
+from .handlers.streamerFFmpegRTPS import FFmpegRTPStreamer
+from .network.rtcpfeedback import stream_ssrc
+from .pkg.logger import get_logger, LogType
+
+
+logger = get_logger(__name__, logType=LogType.BOTH)
+
+
+def build_input_source(config: Config, device_name: str) -> AbstractInputSource:
+    """Создаёт источник видео для устройства из конфигурации."""
+    device_config = config.device_configs[device_name]
+    if device_name == "oakd":
+        width, height = map(int, device_config.resolution.split("x"))
+        return DAICameraInput(
+            frame_height=height,
+            frame_width=width,
+            device_name=device_config.ip_address.split("@")[1],
+            ring_slots=config.frame_ring_slots,
+            queue_size=config.consumer_queue_size,
+            overflow_policy=config.consumer_overflow_policy,
+        )
+    if config.input_backend == "ffmpeg":
+        return FFmpegRTSPInputSource(
+            device_config,
+            ring_slots=config.frame_ring_slots,
+            queue_size=config.consumer_queue_size,
+            overflow_policy=config.consumer_overflow_policy,
+            open_timeout=config.source_open_timeout,
+            rtsp_transport=config.rtsp_transport,
+            decode_threads=config.decode_threads,
+        )
+    return RTSPInputSource(
+        device_config,
+        ring_slots=config.frame_ring_slots,
+        queue_size=config.consumer_queue_size,
+        overflow_policy=config.consumer_overflow_policy,
+        open_timeout=config.source_open_timeout,
+    )
+
+
+def build_streamer_config(config: Config, source_id: str) -> Dict[str, Any]:
+    """Собирает настройки FFmpegRTPStreamer для источника."""
+    return {
+        "source_id": source_id,
+        "output_url": f"rtp://{config.camera_output}/{source_id}",
+        "resolution": config.standard_resolution,
+        "bitrate": config.standard_bitrate,
+        "fps": config.standard_fps,
+        "pipe_size": config.ffmpeg_pipe_size,
+        "write_timeout": config.ffmpeg_write_timeout,
+        "switch_mode": config.profile_switch_mode,
+        "handover_frames": config.handover_frames,
+        "handover_timeout": config.handover_timeout,
+        "source_resolution": config.device_configs[source_id].resolution,
+        "frame_scaling": config.frame_scaling,
+        "preset": config.encoder_preset,
+        "min_speed": config.encoder_min_speed,
+        "slow_reports": config.encoder_slow_reports,
+        # Fixed SSRC so receiver reports can be matched to the stream
+        "ssrc": stream_ssrc(source_id),
+        "fanout": config.rtp_fanout,
+        "fanout_host": config.rtp_fanout_host,
+        "destinations": list(config.device_configs[source_id].destinations),
+    }
+
+
+def build_mosaic_streamer_config(config: Config) -> Dict[str, Any]:
+    """Собирает настройки FFmpegRTPStreamer для мозаики из всех камер."""
+    return {
+        "source_id": "mosaic",
+        "output_url": f"rtp://{config.mosaic_output}/mosaic",
+        "resolution": config.mosaic_resolution,
+        "bitrate": config.mosaic_bitrate,
+        "fps": config.mosaic_fps,
+        "pipe_size": config.ffmpeg_pipe_size,
+        "write_timeout": config.ffmpeg_write_timeout,
+        "source_resolution": config.mosaic_resolution,
+        # Кадры мозаики уже собираются в разрешении и с частотой профиля
+        "frame_scaling": False,
+        "preset": config.encoder_preset,
+        "min_speed": config.encoder_min_speed,
+        "slow_reports": config.encoder_slow_reports,
+        "ssrc": stream_ssrc("mosaic"),
+        "fanout": config.rtp_fanout,
+        "fanout_host": config.rtp_fanout_host,
+    }
+
+
+def _pipeline_worker(conn, config: Config, source_id: str):
+    """
+    Точка входа рабочего процесса: собирает конвейер источник -> распределитель -> стример
+    и выполняет команды супервизора, пока тот не пришлёт shutdown.
+    """
+    source = build_input_source(config, source_id)
+    streamer = FFmpegRTPStreamer(build_streamer_config(config, source_id))
+    source.add_consumer(streamer.process_frame)
+    targets = {"source": source, "streamer": streamer}
+
+    try:
+        while True:
+            try:
+                target, method, args = conn.recv()
+            except EOFError:
+                break
+            if method == "shutdown":
+                conn.send(("ok", None))
+                break
+            try:
+                conn.send(("ok", getattr(targets[target], method)(*args)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        source.stop()
+        streamer.shutdown()
+
+
+class PipelineProcess:
+    """
+    Супервизор конвейера одной камеры, работающего в отдельном процессе.
+
+    Кадры не покидают рабочий процесс: по каналу управления (multiprocessing.Pipe)
+    передаются только команды start/stop/apply_profile и словари статуса.
+    """
+
+    def __init__(self, config: Config, source_id: str, call_timeout: float = 10.0):
+        self.config = config
+        self.source_id = source_id
+        self.call_timeout = call_timeout
+        self.process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        # Ответы на вызовы, которые не дождались таймаута и ещё лежат в канале
+        self._stale_replies = 0
+        self.restarts = 0
+        self.source = RemoteInputSource(self)
+        self.streamer = RemoteRTPStreamer(self)
+
+    def start(self):
+        if self.is_alive():
+            return
+        if self.process is not None:
+            self.restarts += 1
+        # spawn: рабочий процесс не наследует потоки и устройства родителя
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._stale_replies = 0
+        self.process = context.Process(
+            target=_pipeline_worker,
+            args=(child_conn, self.config, self.source_id),
+            name=f"pipeline-{self.source_id}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        logger.info(f"[PIPELINE] Запущен процесс конвейера {self.source_id} (pid {self.process.pid})")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def call(self, target: str, method: str, *args, timeout: float = None):
+        """Выполняет метод объекта в рабочем процессе и возвращает результат."""
+        if not self.is_alive():
+            self.start()
+        timeout = timeout or self.call_timeout
+        with self._lock:
+            while self._stale_replies:
+                if not self._conn.poll(timeout):
+                    raise TimeoutError(f"Конвейер {self.source_id} всё ещё занят предыдущей командой")
+                self._conn.recv()
+                self._stale_replies -= 1
+            self._conn.send((target, method, args))
+            if not self._conn.poll(timeout):
+                self._stale_replies += 1
+                raise TimeoutError(f"Конвейер {self.source_id} не ответил на {target}.{method}")
+            status, result = self._conn.recv()
+        if status == "error":
+            raise RuntimeError(f"[{self.source_id}] {target}.{method}: {result}")
+        return result
+
+    def shutdown(self, timeout: float = 5.0):
+        if not self.is_alive():
+            return
+        try:
+            self.call("pipeline", "shutdown", timeout=timeout)
+        except Exception as e:
+            logger.error(f"[PIPELINE] Ошибка при остановке конвейера {self.source_id}: {e}")
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        logger.info(f"[PIPELINE] Процесс конвейера {self.source_id} остановлен")
+
+
+class RemoteInputSource(AbstractSourceControl):
+    """Представитель источника, работающего в процессе конвейера; кадры процесс не покидают."""
+
+    def __init__(self, pipeline: PipelineProcess):
+        self.pipeline = pipeline
+
+    def start(self):
+        self.pipeline.call("source", "start")
+
+    def stop(self):
+        if self.pipeline.is_alive():
+            self.pipeline.call("source", "stop")
+
+    def release(self):
+        self.stop()
+
+    def is_active(self) -> bool:
+        return self.pipeline.is_alive() and self.pipeline.call("source", "is_active")
+
+    def apply_profile(self, profile: dict):
+        self.pipeline.call("source", "apply_profile", profile)
+
+    def get_current_settings(self) -> dict:
+        if not self.pipeline.is_alive():
+            return {"active": False, "pid": None}
+        settings = self.pipeline.call("source", "get_current_settings")
+        settings["pid"] = self.pipeline.process.pid
+        return settings
+
+
+class RemoteRTPStreamer(AbstractStreamerControl):
+    """Представитель стримера, работающего в процессе конвейера; кадры ему не передаются."""
+
+    def __init__(self, pipeline: PipelineProcess):
+        self.pipeline = pipeline
+
+    def close(self):
+        if self.pipeline.is_alive():
+            self.pipeline.call("streamer", "close")
+
+    def apply_profile(self, profile: dict):
+        self.pipeline.call("streamer", "apply_profile", profile)
+
+    def update_profile(self, profile: dict):
+        self.apply_profile(profile)
+
+    def start_streaming(self):
+        self.pipeline.call("streamer", "start_streaming")
+
+    def add_destination(self, url: str) -> bool:
+        return self.pipeline.call("streamer", "add_destination", url)
+
+    def remove_destination(self, url: str) -> bool:
+        return self.pipeline.is_alive() and self.pipeline.call("streamer", "remove_destination", url)
+
+    def encoder_overloaded(self) -> bool:
+        return self.pipeline.is_alive() and self.pipeline.call("streamer", "encoder_overloaded")
+
+    def stop_streaming(self):
+        if self.pipeline.is_alive():
+            self.pipeline.call("streamer", "stop_streaming")
+
+    def get_status(self) -> dict:
+        if not self.pipeline.is_alive():
+            return {"active": False, "process_alive": False, "restarts": self.pipeline.restarts}
+        status = self.pipeline.call("streamer", "get_status")
+        status.update({"process_alive": True, "pid": self.pipeline.process.pid, "restarts": self.pipeline.restarts})
+        return status
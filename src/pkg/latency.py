@@ -0,0 +1,116 @@
+import bisect
+import math
+import threading
+from array import array
+from typing import Dict, Iterable, Optional
+
+
+def first_frame_stats(started_at: Optional[float], first_frame_at: Optional[float]) -> dict:
+    """Readiness of a source: ready once the first frame after start() has been published."""
+    ready = started_at is not None and first_frame_at is not None
+    return {
+        "ready": ready,
+        "time_to_first_frame_s": round(first_frame_at - started_at, 3) if ready else None,
+    }
+
+
+class PtsClock:
+    """Maps stream timestamps (ms) onto the `time.monotonic()` clock.
+
+    The offset between the two clocks is the smallest host-minus-stream difference seen so
+    far, i.e. that of the frame that got through fastest. Capture times derived from it show
+    how much later than that a frame was decoded (network jitter, decoder buffering), which
+    a stamp taken when the read returns cannot. A jump of more than `reset_after` seconds
+    (reconnect, timestamp wrap) re-anchors the clock.
+    """
+
+    def __init__(self, reset_after: float = 5.0):
+        self.reset_after = reset_after
+        self.offset = None
+
+    def reset(self):
+        self.offset = None
+
+    def captured_at(self, pts_ms: float, decoded_at: float) -> float:
+        if not pts_ms or pts_ms < 0:
+            return decoded_at
+        offset = decoded_at - pts_ms / 1000.0
+        if self.offset is None or offset < self.offset or offset - self.offset > self.reset_after:
+            self.offset = offset
+        return self.offset + pts_ms / 1000.0
+
+
+class LatencyHistogram:
+    """Fixed-size histogram of latencies with logarithmic buckets.
+
+    Buckets span `min_ms`..`max_ms` with `buckets_per_decade` buckets per power of ten,
+    so memory and recording cost stay constant however many frames are recorded.
+    Percentiles are reported as the upper edge of the bucket they fall into.
+    """
+
+    def __init__(self, min_ms: float = 0.01, max_ms: float = 10000.0, buckets_per_decade: int = 20):
+        decades = math.log10(max_ms / min_ms)
+        count = int(math.ceil(decades * buckets_per_decade))
+        self._edges = [min_ms * 10 ** (i / buckets_per_decade) for i in range(count + 1)]
+        # One extra bucket on each side for values outside the range
+        self._counts = array("Q", [0] * (count + 2))
+        self.count = 0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000.0
+        self._counts[bisect.bisect_left(self._edges, ms)] += 1
+        self.count += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for index, bucket in enumerate(self._counts):
+            seen += bucket
+            if seen >= target:
+                if index >= len(self._edges):
+                    return self.max_ms
+                return min(self._edges[index], self.max_ms)
+        return self.max_ms
+
+    def reset(self):
+        for index in range(len(self._counts)):
+            self._counts[index] = 0
+        self.count = 0
+        self.max_ms = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(50), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class LatencyTracer:
+    """Set of latency histograms for the stages of one stream."""
+
+    def __init__(self, stages: Iterable[str]):
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in stages}
+        self.last_seq = None
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.histograms[stage].record(max(0.0, seconds))
+
+    def reset(self):
+        with self._lock:
+            for histogram in self.histograms.values():
+                histogram.reset()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = {stage: histogram.snapshot() for stage, histogram in self.histograms.items()}
+        stats["last_seq"] = self.last_seq
+        return stats
@@ -0,0 +1,311 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from .logger import LogType
+from .logger import get_logger
+
+
+logger = get_logger(__name__, logType=LogType.SYSLOG)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _bitrate_kbps(bitrate) -> Optional[float]:
+    """ffmpeg-style bitrate ("4500k", "1M", "800000") in kbit/s, None if it cannot be parsed."""
+    text = str(bitrate).strip().lower()
+    scale = {"k": 1.0, "m": 1000.0}.get(text[-1:], 0.001)
+    try:
+        return float(text.rstrip("km")) * scale
+    except ValueError:
+        return None
+
+
+class _Exposition:
+    """Collects samples in the Prometheus text format, emitting HELP/TYPE once per metric."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def add(self, name: str, kind: str, help_text: str, value, labels: Optional[dict] = None):
+        if value is None:
+            return
+        if name not in self._metrics:
+            self._metrics[name] = (kind, help_text, [])
+        label_text = ""
+        if labels:
+            label_text = "{" + ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items()) + "}"
+        value = float(value)
+        # Counters are printed in full, %g would round large byte counts
+        value_text = str(int(value)) if value.is_integer() else repr(round(value, 4))
+        self._metrics[name][2].append(f"{name}{label_text} {value_text}")
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, samples) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving Restreamer status as Prometheus metrics.
+
+    A sampler thread calls `get_status()` every `sample_interval` seconds and renders the
+    text once; scrapes only return the cached text, so they never reach the sources,
+    distributors or encoder pipes. Frame rates are derived from counter deltas between samples.
+    """
+
+    def __init__(self, restreamer, host: str = "127.0.0.1", port: int = 9108, sample_interval: float = 5.0):
+        self.restreamer = restreamer
+        self.host = host
+        self.port = port
+        self.sample_interval = sample_interval
+        self.text = ""
+        self._previous: Dict[tuple, Tuple[float, float]] = {}
+        # Last raw value and accumulated total of counters that restart from zero
+        self._counters: Dict[tuple, Tuple[float, float]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.metrics = self
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True),
+            threading.Thread(target=self._sample_loop, name="metrics-sampler", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"[METRICS] Metrics available at http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    def _sample_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"[METRICS] Failed to sample status: {e}")
+            self._stop_event.wait(self.sample_interval)
+
+    def sample(self):
+        self.text = self.render(self.restreamer.get_status(), time.monotonic())
+
+    def _rate(self, key: tuple, value: float, now: float) -> float:
+        previous = self._previous.get(key)
+        self._previous[key] = (now, value)
+        if previous is None or now <= previous[0] or value < previous[1]:
+            return 0.0
+        return (value - previous[1]) / (now - previous[0])
+
+    def _cumulative(self, key: tuple, value: float) -> float:
+        """Keeps a counter monotonic when its source resets (rebuilt encoder, restarted pipeline)."""
+        last, total = self._counters.get(key, (0.0, 0.0))
+        total += value - last if value >= last else value
+        self._counters[key] = (value, total)
+        return total
+
+    def render(self, status: dict, now: float) -> str:
+        out = _Exposition()
+        out.add("restreamer_adaptive_running", "gauge", "Adaptive quality control is running", int(bool(status.get("running"))))
+        self._render_signal(out, status)
+        mosaic = status.get("mosaic")
+        if mosaic:
+            out.add("restreamer_mosaic_active", "gauge", "All cameras are tiled into one stream", int(mosaic["active"]))
+        for source_id, demand in (status.get("demand") or {}).items():
+            labels = {"source": source_id}
+            out.add("restreamer_source_subscribers", "gauge", "Subscribers of the stream", demand["subscribers"], labels)
+            out.add("restreamer_source_demanded", "gauge", "Stream is wanted under lazy startup", int(demand["demanded"]), labels)
+        out.add("restreamer_idle_teardowns_total", "counter", "Pipelines torn down for lack of subscribers", status.get("idle_teardowns"))
+        for source_id, motion in (status.get("motion") or {}).items():
+            labels = {"source": source_id}
+            out.add("restreamer_motion_static", "gauge", "Source is static and streamed at the keep-alive rate", int(motion["static"]), labels)
+            out.add("restreamer_motion_activity", "gauge", "Share of changed pixels in the last motion sample", motion["activity"], labels)
+            out.add("restreamer_motion_frames_saved_total", "counter", "Frames held back while static", motion["frames_saved"], labels)
+            out.add("restreamer_motion_bytes_saved_total", "counter", "Raw frame bytes held back while static", motion["bytes_saved"], labels)
+            out.add(
+                "restreamer_motion_uplink_bytes_saved_total",
+                "counter",
+                "Estimated encoded bytes saved by the keep-alive bitrate",
+                motion["uplink_bytes_saved"],
+                labels,
+            )
+        for source_id, bring_up in (status.get("bring_up") or {}).items():
+            out.add("restreamer_source_start_attempts_total", "counter", "Bring-up attempts of the source", bring_up["attempts"], {"source": source_id})
+        for source_id, source in status.get("sources", {}).items():
+            self._render_source(out, source_id, source, now)
+        for stream_id, streamer in status.get("streamers", {}).items():
+            self._render_streamer(out, stream_id, streamer, now)
+        return out.render()
+
+    def _render_signal(self, out: _Exposition, status: dict):
+        out.add("restreamer_signal_level", "gauge", "Applied signal degradation level", status.get("signal_level"))
+        history = status.get("signal_history") or []
+        if history:
+            last = history[-1]
+            out.add("restreamer_signal_score", "gauge", "Last signal score (0-100)", last["score"])
+            out.add("restreamer_signal_raw_level", "gauge", "Level of the last raw score", last["raw_level"])
+            scores = [entry["score"] for entry in history]
+            help_text = "Signal score over the kept poll history"
+            out.add("restreamer_signal_score_window", "gauge", help_text, min(scores), {"stat": "min"})
+            out.add("restreamer_signal_score_window", "gauge", help_text, sum(scores) / len(scores), {"stat": "avg"})
+            out.add("restreamer_signal_score_window", "gauge", help_text, max(scores), {"stat": "max"})
+            out.add("restreamer_signal_history_polls", "gauge", "Polls kept in the signal history", len(history))
+        policy = status.get("policy", {})
+        out.add("restreamer_signal_switches_total", "counter", "Applied level switches", policy.get("switches"))
+        out.add(
+            "restreamer_signal_switches_avoided_total",
+            "counter",
+            "Raw level flips suppressed by hysteresis",
+            policy.get("switches_avoided"),
+        )
+        out.add("restreamer_signal_radio_score", "gauge", "Score from the router radio metrics", policy.get("radio_score"))
+        out.add("restreamer_signal_feedback_score", "gauge", "Score from receiver reports", policy.get("feedback_score"))
+        for stream_id, feedback in (status.get("feedback") or {}).get("streams", {}).items():
+            labels = {"stream": stream_id}
+            out.add("restreamer_rtcp_loss_fraction", "gauge", "Loss fraction from the last receiver report", feedback["loss_fraction"], labels)
+            out.add("restreamer_rtcp_jitter_ms", "gauge", "Interarrival jitter from the last receiver report", feedback["jitter_ms"], labels)
+            out.add("restreamer_rtcp_rtt_ms", "gauge", "Round trip time from the last receiver report", feedback["rtt_ms"], labels)
+        bandwidth = status.get("bandwidth")
+        if bandwidth:
+            out.add("restreamer_uplink_budget_kbps", "gauge", "Uplink bitrate budget", bandwidth["budget_kbps"])
+            out.add("restreamer_uplink_allocated_kbps", "gauge", "Allocated uplink bitrate", bandwidth["allocated_kbps"])
+
+    def _render_source(self, out: _Exposition, source_id: str, source: dict, now: float):
+        labels = {"source": source_id}
+        active = source.get("active")
+        out.add("restreamer_source_active", "gauge", "Source is capturing", 1 if active is True else 0, labels)
+        out.add("restreamer_source_ready", "gauge", "Source has delivered its first frame since start", int(bool(source.get("ready"))), labels)
+        out.add(
+            "restreamer_source_time_to_first_frame_seconds",
+            "gauge",
+            "Time from start to the first published frame",
+            source.get("time_to_first_frame_s"),
+            labels,
+        )
+        out.add("restreamer_source_open_failures_total", "counter", "Failed attempts to open the stream", source.get("open_failures"), labels)
+        distribution = source.get("distribution")
+        if not distribution:
+            return
+        published = distribution.get("published", 0)
+        dropped = distribution.get("overruns", 0) + sum(
+            stats.get("dropped", 0) for stats in distribution.get("delivery", {}).values()
+        )
+        out.add("restreamer_source_frames_total", "counter", "Frames published by the source", published, labels)
+        out.add(
+            "restreamer_source_fps", "gauge", "Frames per second in", self._rate(("source", source_id), published, now), labels
+        )
+        out.add("restreamer_source_frames_dropped_total", "counter", "Frames dropped in fan-out", dropped, labels)
+
+    def _render_streamer(self, out: _Exposition, stream_id: str, streamer: dict, now: float):
+        labels = {"stream": stream_id}
+        passthrough = streamer.get("mode") == "passthrough"
+        active = streamer.get("active") is True
+        out.add("restreamer_streamer_active", "gauge", "Encoder or passthrough process is running", 1 if active else 0, labels)
+        out.add("restreamer_streamer_passthrough", "gauge", "Stream is remuxed without re-encoding", int(passthrough), labels)
+        alive = streamer.get("process_alive", active)
+        out.add("restreamer_streamer_process_alive", "gauge", "Pipeline or ffmpeg process is alive", int(bool(alive)), labels)
+
+        # Passthrough and encoder report their own counters, which also reset when rebuilt,
+        # so each one is accumulated separately
+        mode = "passthrough" if passthrough else "encoder"
+        for name, value in (
+            ("restarts", streamer.get("restarts", 0)),
+            ("switches", streamer.get("switch", {}).get("switches", 0)),
+            ("stall_restarts", streamer.get("stall_restarts", 0)),
+        ):
+            self._cumulative(("restarts", stream_id, mode, name), value)
+        restarts = sum(total for key, (_, total) in self._counters.items() if key[:2] == ("restarts", stream_id))
+        out.add("restreamer_streamer_restarts_total", "counter", "Encoder restarts, handovers and process restarts", restarts, labels)
+
+        totals = streamer.get("totals")
+        if totals:
+            out.add("restreamer_streamer_frames_total", "counter", "Frames written to the encoder", totals["frames"], labels)
+            out.add(
+                "restreamer_streamer_fps",
+                "gauge",
+                "Frames per second out",
+                self._rate(("streamer", stream_id), totals["frames"], now),
+                labels,
+            )
+            out.add("restreamer_streamer_bytes_written_total", "counter", "Bytes written to the encoder pipe", totals["bytes"], labels)
+            out.add(
+                "restreamer_streamer_frames_dropped_total",
+                "counter",
+                "Frames dropped because the encoder pipe stayed full",
+                totals["skipped"],
+                labels,
+            )
+
+        fanout = streamer.get("fanout")
+        if fanout:
+            out.add("restreamer_fanout_packets_total", "counter", "RTP packets received from the encoder by the fan-out", fanout["packets"], labels)
+            for url, stats in fanout["destinations"].items():
+                destination = {**labels, "destination": url}
+                out.add("restreamer_fanout_sent_total", "counter", "RTP and RTCP packets sent to a destination", stats["packets"], destination)
+                out.add("restreamer_fanout_errors_total", "counter", "Failed sends to a destination", stats["errors"], destination)
+
+        encoder = streamer.get("encoder") or {}
+        if encoder.get("speed") is not None:
+            out.add("restreamer_encoder_speed", "gauge", "ffmpeg encode speed relative to real time", encoder["speed"], labels)
+            out.add("restreamer_encoder_fps", "gauge", "ffmpeg encode fps", encoder.get("fps"), labels)
+            out.add("restreamer_encoder_bitrate_kbps", "gauge", "ffmpeg output bitrate", encoder.get("bitrate_kbps"), labels)
+            out.add("restreamer_encoder_dup_frames", "gauge", "Frames duplicated by the current encoder", encoder["dup_frames"], labels)
+            out.add("restreamer_encoder_drop_frames", "gauge", "Frames dropped by the current encoder", encoder["drop_frames"], labels)
+            out.add("restreamer_encoder_slow", "gauge", "Encoder is below the minimum speed", int(encoder["slow"]), labels)
+
+        profile = streamer.get("profile")
+        if profile and not passthrough:
+            info = {**labels, "resolution": profile.get("resolution"), "bitrate": profile.get("bitrate"), "fps": profile.get("fps")}
+            out.add("restreamer_streamer_profile_info", "gauge", "Current encoding profile", 1, info)
+            out.add(
+                "restreamer_streamer_bitrate_kbps",
+                "gauge",
+                "Target bitrate of the current profile",
+                _bitrate_kbps(profile.get("bitrate", "0")),
+                labels,
+            )
+
+        for stage, stats in (streamer.get("latency") or {}).items():
+            if not isinstance(stats, dict) or not stats.get("count"):
+                continue
+            for quantile, key in (("0.5", "p50_ms"), ("0.99", "p99_ms"), ("1", "max_ms")):
+                out.add(
+                    "restreamer_streamer_latency_ms",
+                    "gauge",
+                    "Frame latency by stage",
+                    stats[key],
+                    {**labels, "stage": stage, "quantile": quantile},
+                )
@@ -1,14 +1,21 @@
 import threading
 import time
-from typing import Dict, Any
-
-from .abstract.interfacedef import AbstractInputSource, AbstractRTPStreamer
-from .config import Config, DeviceConfig
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional
+
+from .abstract.interfacedef import AbstractSourceControl, AbstractStreamerControl
+from .config import Config
+from .controller.asynccontrol import AsyncControlLoop
+from .controller.bandwidth import BandwidthAllocator
+from .controller.encodertuning import EncoderTuning
 from .controller.signalpolicy import SignalPolicyEngine
-from .handlers.inputsources import RTSPInputSource, DAICameraInput
-from .handlers.streamerFFmpegRTPS import FFmpegRTPStreamer
+from .handlers.mosaic import MosaicCompositor
+from .handlers.motiongate import MotionGate
+from .handlers.streamerFFmpegRTPS import FFmpegRTPStreamer, FFmpegRTSPPassthrough
 from .network.rciclient import KeeneticRCIClient
 from .network.connection_checker import ConnectionChecker
+from .network.rtcpfeedback import RTCPFeedbackCollector
+from .pipeline import PipelineProcess, build_input_source, build_mosaic_streamer_config, build_streamer_config
 from .pkg.logger import get_logger, LogType
 
 
@@ -35,34 +42,69 @@ class Restreamer:
         self.config = config
         self.signal_checker = KeeneticRCIClient(config)
         self.connection_validator = ConnectionChecker(config)
-        self.input_sources: Dict[str, AbstractInputSource] = {}
-        self.output_streamers: Dict[str, AbstractRTPStreamer] = {}
+        # В режиме process здесь лежат представители конвейеров, поэтому кадры к ним подключаются
+        # только в режиме thread (детектор движения, мозаика)
+        self.input_sources: Dict[str, AbstractSourceControl] = {}
+        self.output_streamers: Dict[str, AbstractStreamerControl] = {}
         self.policy_engines: Dict[str, SignalPolicyEngine] = {}
+        # Общая стадия решения: сглаживает оценку сигнала и гасит дребезг уровней
+        self.signal_policy = SignalPolicyEngine(config)
+        # Делит uplink между камерами по приоритетам; без него все камеры получают один уровень
+        self.bandwidth = BandwidthAllocator(config) if config.bandwidth_allocator else None
+        self.dropped_sources = set()
+        self.current_plan: Dict[str, Optional[int]] = {}
+        # Отчёты приёмников о доставке RTP - вторая оценка качества канала
+        self.rtcp_feedback = (
+            RTCPFeedbackCollector(config.feedback_host, config.feedback_port) if config.feedback_enabled else None
+        )
+        # Дополнительное понижение профиля для источников, чей кодировщик не успевает за реальным временем
+        self.encoder_penalty: Dict[str, int] = defaultdict(int)
+        # Проверки подряд, на которых кодировщик с понижением успевал; после recover_checks понижение снимается
+        self.encoder_healthy: Dict[str, int] = defaultdict(int)
+        # История опросов сигнала: (время, оценка, сырой уровень, принятый уровень)
+        self.signal_history = deque(maxlen=config.signal_history_size)
+        self.passthroughs: Dict[str, FFmpegRTSPPassthrough] = {}
+        # Детекторы движения между распределителем и стримером для статичных камер
+        self.motion_gates: Dict[str, MotionGate] = {}
+        # Подписчики потоков для ленивого запуска: конвейер работает, пока у потока есть подписчик
+        # или от его приёмников приходят отчёты RTCP
+        self.subscribers: Dict[str, int] = defaultdict(int)
+        self.idle_since: Dict[str, float] = {}
+        # Потоки, нужные на прошлом опросе; появившиеся в спросе поднимаются циклом управления
+        self._demanded: set = set()
+        self.idle_teardowns = 0
+        # Параллельный запуск источников: состояние и фоновые потоки повторных попыток
+        self.bring_up: Dict[str, Dict[str, Any]] = {}
+        self._bring_up_threads: Dict[str, threading.Thread] = {}
+        self._stopping = threading.Event()
+        self.pipelines: Dict[str, PipelineProcess] = {}
         self.monitoring_thread = None
+        self.control_loop = None
+        self._source_locks = defaultdict(threading.Lock)
         self.running = False
         self.current_signal_level = 0  # 0 - высокое качество, увеличивается при деградации
+        # Откалиброванные preset/threads libx264 для каждого профиля (python -m src.controller.encodertuning)
+        self.encoder_tuning = EncoderTuning(config.encoder_tuning_file).load()
 
         # Настройка входных источников и выходных стримеров
         self._setup_sources()
         self._setup_streamers()
+        self.mosaic = self._setup_mosaic()
 
     def _setup_sources(self):
         """Настраивает входные источники видео на основе конфигурации."""
         for device_name, device_config in self.config.device_configs.items():
-            # Пропускаем DAI камеру, которая настраивается отдельно
-            if device_name == "oakd":
-                dai_config: DeviceConfig = self.config.device_configs["oakd"]
-                wight, height = map(int, dai_config.resolution.split("x"))
-                ip_address = dai_config.ip_address.split("@")[1]
-                self.input_sources["oakd"] = DAICameraInput(
-                    frame_height=height, frame_width=wight, device_name=ip_address
-                )
-                logger.info(f"[RESTREAMER] Настроена DAI камера: {dai_config.device_name}")
+            if self.config.execution_mode == "process":
+                # Источник, распределитель и стример работают в отдельном процессе, здесь только представители
+                pipeline = PipelineProcess(self.config, device_name)
+                self.pipelines[device_name] = pipeline
+                self.input_sources[device_name] = pipeline.source
+                self.output_streamers[device_name] = pipeline.streamer
+                logger.info(f"[RESTREAMER] Настроен процесс конвейера для {device_name}")
+                continue
 
-            # Создаем экземпляр RTSPInputSource для RTSP-камеры с аутентификацией.
             logger.info(f"[RESTREAMER] Настраиваем источник для {device_name}: {device_config.ip_address}{device_config.stream_path}")
-            self.input_sources[device_name] = RTSPInputSource(device_config)
-
+            self.input_sources[device_name] = build_input_source(self.config, device_name)
             logger.info(
                 f"[RESTREAMER] Настроен источник для {device_name}: {device_config.ip_address}{device_config.stream_path}"
             )
@@ -74,23 +116,371 @@ class Restreamer:
             # Создаем и настраиваем политику качества для стримера
             policy = SignalPolicyEngine(self.config)
             policy.create_degradation_profiles(self.config)
-            self.policy_engines[source_id] = policy.profiles
+            policy.profiles = {level: self.encoder_tuning.apply(profile) for level, profile in policy.profiles.items()}
+            self.policy_engines[source_id] = policy
             logger.info(f"[RESTREAMER] Настроена политика качества для {source_id}: {policy.profiles}")
 
             # Создаем стример - используем конфигурацию из Config
-            streamer_config = {
-                "source_id": source_id,
-                "output_url": f"rtp://{self.config.camera_output}/{source_id}",
-                "resolution": self.config.standard_resolution,
-                "bitrate": self.config.standard_bitrate,
-                "fps": self.config.standard_fps,
-            }
-            self.output_streamers[source_id] = FFmpegRTPStreamer(streamer_config)
-
-            # Подключаем источник к стримеру
-            source.add_consumer(self.output_streamers[source_id].process_frame)
+            streamer_config = build_streamer_config(self.config, source_id)
+            if source_id not in self.pipelines:
+                self.output_streamers[source_id] = FFmpegRTPStreamer(streamer_config)
+                consumer = self.output_streamers[source_id].process_frame
+                if source_id in self.config.motion_devices:
+                    gate = MotionGate(
+                        self.output_streamers[source_id],
+                        source_id,
+                        self.config.device_configs[source_id].resolution,
+                        static_after=self.config.motion_static_after,
+                        keepalive_fps=self.config.motion_keepalive_fps,
+                        min_bitrate=self.config.motion_min_bitrate,
+                        threshold=self.config.motion_threshold,
+                    )
+                    self.motion_gates[source_id] = gate
+                    consumer = gate.process_frame
+                # Отчёты RR, которые приёмники шлют обратно на порт ретранслятора, тоже идут в коллектор
+                fanout = self.output_streamers[source_id].fanout
+                if fanout and self.rtcp_feedback:
+                    fanout.on_rtcp = self.rtcp_feedback.handle_packet
+
+                # Подключаем источник к стримеру (через детектор движения, если он настроен)
+                source.add_consumer(consumer)
+            elif source_id in self.config.motion_devices:
+                logger.warning(f"[RESTREAMER] Детектор движения для {source_id} недоступен в режиме execution_mode = process")
             logger.info(f"[RESTREAMER] Настроен стример для {source_id} с выводом на {streamer_config['output_url']}")
 
+            # Для IP-камер готовим режим ретрансляции без перекодирования. Камерам с детектором
+            # движения она не положена: при ретрансляции кадры не декодируются, детектор их не видит
+            # и не может перевести статичную камеру на облегчённый профиль
+            if self.config.rtsp_passthrough and source_id in self.motion_gates:
+                logger.info(f"[RESTREAMER] Ретрансляция без перекодирования для {source_id} отключена: камера под детектором движения")
+            elif self.config.rtsp_passthrough and source_id != "oakd":
+                device_config = self.config.device_configs[source_id]
+                self.passthroughs[source_id] = FFmpegRTSPPassthrough(
+                    f"{device_config.ip_address}{device_config.stream_path or ''}",
+                    streamer_config["output_url"],
+                    self.config.rtsp_transport,
+                )
+
+    def _setup_mosaic(self) -> Optional[MosaicCompositor]:
+        """Готовит мозаику, которая на худшем уровне сигнала заменяет отдельные потоки камер."""
+        if not self.config.mosaic_enabled:
+            return None
+        if self.config.execution_mode == "process":
+            # Кадры не покидают процессы конвейеров, собрать их в одно полотно здесь нельзя
+            logger.warning("[RESTREAMER] Мозаика недоступна в режиме execution_mode = process")
+            return None
+        logger.info(f"[RESTREAMER] Настроена мозаика {self.config.mosaic_resolution} для {list(self.input_sources)}")
+        return MosaicCompositor(
+            list(self.input_sources),
+            self.config.mosaic_resolution,
+            float(self.config.mosaic_fps),
+            self.config.standard_resolution,
+        )
+
+    def update_mosaic(self, signal_level: int) -> bool:
+        """
+        Включает мозаику на худшем уровне сигнала и выключает её при улучшении.
+
+        Returns:
+            True, если уровень обслуживается мозаикой и поисточниковый план применять не нужно
+        """
+        if self.mosaic is None:
+            return False
+        worst = len(next(iter(self.policy_engines.values())).profiles) - 1
+        if signal_level >= worst:
+            self._enable_mosaic()
+            return True
+        self._disable_mosaic()
+        return False
+
+    def _enable_mosaic(self):
+        """Останавливает кодировщики камер и отправляет все камеры одним потоком мозаики."""
+        if self.mosaic.active:
+            return
+        streamer = FFmpegRTPStreamer(build_mosaic_streamer_config(self.config))
+        if streamer.fanout and self.rtcp_feedback:
+            streamer.fanout.on_rtcp = self.rtcp_feedback.handle_packet
+        streamer.apply_profile(
+            {"resolution": self.config.mosaic_resolution, "bitrate": self.config.mosaic_bitrate, "fps": self.config.mosaic_fps}
+        )
+        stopped = []
+        for source_id, source in self.input_sources.items():
+            try:
+                with self._source_locks[source_id]:
+                    self._disable_passthrough(source_id)
+                    self.output_streamers[source_id].close()
+                    if not source.is_active() and self.is_demanded(source_id):
+                        stopped.append(source_id)
+            except Exception as e:
+                logger.error(f"[RESTREAMER] Не удалось подключить {source_id} к мозаике: {e}")
+        self.mosaic.start(streamer, self.input_sources)
+        # Остановленные камеры поднимаются параллельно в фоне, как и при старте: открытие недоступной
+        # камеры не задерживает применение уровня, а мозаика до первого кадра держит её плитку пустой
+        self._bring_up_sources(stopped, self._start_planned_source)
+        logger.info("[RESTREAMER] Все камеры переведены в мозаику")
+
+    def _disable_mosaic(self):
+        """Отключает мозаику; кодировщики камер затем запускаются по обычному плану."""
+        if self.mosaic is None or not self.mosaic.active:
+            return
+        streamer = self.mosaic.stop()
+        if streamer:
+            streamer.shutdown()
+        logger.info("[RESTREAMER] Мозаика отключена, камеры возвращаются к отдельным потокам")
+
+    def _passthrough_allowed(self, source_id: str, signal_level: int) -> bool:
+        """Ретрансляция без перекодирования возможна только на верхнем (родном для камеры) профиле."""
+        if source_id not in self.passthroughs:
+            return False
+        profiles = self.policy_engines[source_id].profiles
+        return profiles[min(signal_level, len(profiles) - 1)] == profiles[0]
+
+    def _enable_passthrough(self, source_id: str):
+        """Переводит источник в режим ретрансляции: Python и libx264 исключаются из потока данных."""
+        passthrough = self.passthroughs[source_id]
+        if passthrough.is_active():
+            return
+        self.input_sources[source_id].stop()
+        streamer = self.output_streamers[source_id]
+        streamer.close()
+        # Ретранслятор RTP переживает остановку кодировщика, поэтому поток без перекодирования
+        # отправляется в него и доходит до тех же получателей
+        fanout = streamer.get_status().get("fanout")
+        if fanout:
+            passthrough.output_url = fanout["local_url"]
+        passthrough.start()
+        logger.info(f"[RESTREAMER] Источник {source_id} переведён в режим ретрансляции без перекодирования")
+
+    def _disable_passthrough(self, source_id: str):
+        """Останавливает ретрансляцию, дальше источник работает через декодирование и перекодирование."""
+        passthrough = self.passthroughs.get(source_id)
+        if passthrough and passthrough.is_active():
+            passthrough.stop()
+            logger.info(f"[RESTREAMER] Источник {source_id} переведён в режим перекодирования")
+
+    def _revive_passthroughs(self):
+        """Перезапускает ретрансляции, чей ffmpeg завершился сам, например после перезагрузки камеры."""
+        for source_id, passthrough in self.passthroughs.items():
+            if not passthrough.exited:
+                continue
+            with self._source_locks[source_id]:
+                if not passthrough.exited:
+                    continue
+                logger.warning(f"[RESTREAMER] Ретрансляция {source_id} завершилась, перезапускаем")
+                try:
+                    passthrough.start()
+                except Exception as e:
+                    logger.error(f"[RESTREAMER] Не удалось перезапустить ретрансляцию {source_id}: {e}")
+
+    def is_demanded(self, source_id: str) -> bool:
+        """
+        Нужен ли поток: без lazy_start нужны все, иначе только потоки с подписчиками
+        или с приёмниками, которые присылали отчёты RTCP не раньше idle_timeout секунд назад.
+        """
+        if not self.config.lazy_start or source_id in self.config.always_on:
+            return True
+        if self.subscribers[source_id] > 0 or self.config.device_configs[source_id].destinations:
+            return True
+        now = time.monotonic()
+        reported_at = self._last_receiver_report(source_id)
+        if reported_at is not None and now - reported_at < self.config.idle_timeout:
+            return True
+        # Последний подписчик ушёл недавно - конвейер ещё не разбирается
+        idle_since = self.idle_since.get(source_id)
+        return idle_since is not None and now - idle_since < self.config.idle_timeout
+
+    def _last_receiver_report(self, source_id: str) -> Optional[float]:
+        """
+        Время последнего отчёта приёмника о потоке: RR с его SSRC на порт [feedback] или любой
+        RTCP от получателя на порт ретранслятора. Ретранслятор живёт и при остановленном
+        кодировщике, поэтому приёмник может запросить поток, просто начав слать на него отчёты.
+        """
+        reports = []
+        if self.rtcp_feedback:
+            reports.append(self.rtcp_feedback.last_report_at(source_id))
+        fanout = getattr(self.output_streamers.get(source_id), "fanout", None)
+        if fanout is not None:
+            reports.append(fanout.receiver_rtcp_at)
+        reports = [reported_at for reported_at in reports if reported_at]
+        return max(reports) if reports else None
+
+    def subscribe(self, source_id: str):
+        """Регистрирует подписчика потока; конвейер поднимает цикл управления на ближайшем опросе."""
+        self.subscribers[source_id] += 1
+        self.idle_since.pop(source_id, None)
+
+    def unsubscribe(self, source_id: str):
+        """Снимает подписчика; без подписчиков конвейер разбирается через idle_timeout."""
+        if self.subscribers[source_id] <= 0:
+            return
+        self.subscribers[source_id] -= 1
+        if self.subscribers[source_id] == 0:
+            self.idle_since[source_id] = time.monotonic()
+
+    def _reap_idle_sources(self) -> bool:
+        """Останавливает источники и кодировщики потоков без подписчиков."""
+        reaped = False
+        for source_id in self.input_sources:
+            if self.is_demanded(source_id) or not self._source_running(source_id):
+                continue
+            logger.info(f"[RESTREAMER] У потока {source_id} нет подписчиков {self.config.idle_timeout:g} с, конвейер остановлен")
+            with self._source_locks[source_id]:
+                self._disable_passthrough(source_id)
+                self.input_sources[source_id].stop()
+                self.output_streamers[source_id].close()
+            if source_id in self.pipelines:
+                self.pipelines[source_id].shutdown()
+            self.idle_teardowns += 1
+            reaped = True
+        return reaped
+
+    def _wake_demanded_sources(self) -> bool:
+        """
+        Поднимает потоки, у которых с прошлого опроса появился спрос (подписчик или отчёты приёмника).
+
+        Returns:
+            True, если план нужно пересчитать: новая камера получает долю бюджета uplink
+        """
+        demanded = {source_id for source_id in self.input_sources if self.is_demanded(source_id)}
+        woken = [
+            source_id
+            for source_id in self.input_sources
+            if source_id in demanded and source_id not in self._demanded
+            and not self._source_running(source_id) and not self._bringing_up(source_id)
+        ]
+        self._demanded = demanded
+        if not woken:
+            return False
+        logger.info(f"[RESTREAMER] У потоков {', '.join(woken)} появились подписчики, запускаем конвейеры")
+        if self.bandwidth is not None and not (self.mosaic is not None and self.mosaic.active):
+            return True
+        self._bring_up_sources(woken, self._start_planned_source)
+        return False
+
+    def add_destination(self, source_id: str, url: str) -> bool:
+        """Добавляет получателя RTP для источника без перезапуска кодировщика."""
+        if source_id not in self.output_streamers:
+            logger.error(f"[RESTREAMER] Неизвестный источник {source_id}")
+            return False
+        added = self.output_streamers[source_id].add_destination(url)
+        if added:
+            logger.info(f"[RESTREAMER] Поток {source_id} дополнительно отправляется на {url}")
+            self.subscribe(source_id)
+        return added
+
+    def remove_destination(self, source_id: str, url: str) -> bool:
+        """Убирает получателя RTP для источника, остальные получатели продолжают принимать поток."""
+        if source_id not in self.output_streamers:
+            return False
+        removed = self.output_streamers[source_id].remove_destination(url)
+        if removed:
+            logger.info(f"[RESTREAMER] Поток {source_id} больше не отправляется на {url}")
+            self.unsubscribe(source_id)
+        return removed
+
+    def _bring_up_sources(self, source_ids, start_fn):
+        """
+        Запускает источники параллельно, каждый в своём потоке.
+
+        Недоступная камера не задерживает остальные: открытие и ожидание первого кадра
+        ограничены source_open_timeout, а неудачные попытки повторяются в фоне с нарастающей паузой.
+        """
+        for source_id in source_ids:
+            if self._bringing_up(source_id):
+                continue
+            self.bring_up[source_id] = {
+                "state": "starting",
+                "attempts": 0,
+                "requested_at": time.monotonic(),
+                "ready_after_s": None,
+                "error": None,
+            }
+            thread = threading.Thread(
+                target=self._bring_up_source, args=(source_id, start_fn), name=f"bring-up-{source_id}", daemon=True
+            )
+            self._bring_up_threads[source_id] = thread
+            thread.start()
+
+    def _bring_up_source(self, source_id: str, start_fn):
+        state = self.bring_up[source_id]
+        delay = self.config.source_retry_interval
+        while not self._stopping.is_set():
+            state["attempts"] += 1
+            try:
+                if not start_fn(source_id):
+                    state["state"] = "idle"
+                    return
+                if self._wait_first_frame(source_id):
+                    state["state"] = "ready"
+                    state["ready_after_s"] = round(time.monotonic() - state["requested_at"], 3)
+                    state["error"] = None
+                    logger.info(f"[RESTREAMER] Поток {source_id} готов: первый кадр через {state['ready_after_s']} с")
+                    return
+                raise TimeoutError(f"нет кадров за {self.config.source_open_timeout:g} с")
+            except Exception as e:
+                state["state"] = "retrying"
+                state["error"] = str(e)
+                logger.warning(f"[RESTREAMER] Источник {source_id} не запустился ({e}), повтор через {delay:g} с")
+                try:
+                    with self._source_locks[source_id]:
+                        self.input_sources[source_id].stop()
+                except Exception:
+                    pass
+            if self._stopping.wait(delay):
+                return
+            delay = min(delay * 2, 60.0)
+
+    def _bringing_up(self, source_id: str) -> bool:
+        thread = self._bring_up_threads.get(source_id)
+        return thread is not None and thread.is_alive()
+
+    def _source_ready(self, source_id: str) -> bool:
+        passthrough = self.passthroughs.get(source_id)
+        if passthrough is not None and passthrough.is_active():
+            # Ретрансляция идёт мимо Python, кадров источника не будет
+            return True
+        source = self.input_sources[source_id]
+        if not hasattr(source, "get_current_settings"):
+            return source.is_active()
+        return bool(source.get_current_settings().get("ready"))
+
+    def _wait_first_frame(self, source_id: str) -> bool:
+        deadline = time.monotonic() + self.config.source_open_timeout
+        while not self._stopping.is_set():
+            if self._source_ready(source_id):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return False
+
+    def _start_planned_source(self, source_id: str) -> bool:
+        """Запускает источник на уровне из текущего плана; False - по плану источник не нужен."""
+        if self.mosaic is not None and self.mosaic.active:
+            with self._source_locks[source_id]:
+                if not self.input_sources[source_id].is_active():
+                    self.input_sources[source_id].start()
+            return True
+        level = (self.current_plan or self._plan_quality_policy(self.current_signal_level)).get(source_id)
+        if level is None:
+            return False
+        self._apply_source_level(source_id, level)
+        return True
+
+    def _start_pipeline(self, source_id: str, profile: dict, signal_level: int = 0):
+        """Запускает источник и стример либо ретрансляцию, если она допустима для профиля."""
+        if self._passthrough_allowed(source_id, signal_level):
+            self._enable_passthrough(source_id)
+            return
+        self._disable_passthrough(source_id)
+        self._apply_source_profile(source_id, profile)
+        source = self.input_sources[source_id]
+        if not source.is_active():
+            source.start()
+        streamer = self.output_streamers[source_id]
+        self._profile_target(source_id).apply_profile(profile)
+        streamer.start_streaming()
+
     def start_all_quality_mode(self):
         """
         Запускает все источники с одинаковыми профилями высокого качества.
@@ -102,18 +492,21 @@ class Restreamer:
             "fps": self.config.standard_fps,
         }
 
-        # Запускаем все источники с одинаковым профилем
-        for source_id, source in self.input_sources.items():
-            source.start()
-            logger.info(f"[RESTREAMER] Запущен источник {source_id} в режиме стандартного качества")
+        def start_standard(source_id: str) -> bool:
+            with self._source_locks[source_id]:
+                self._start_pipeline(source_id, standard_profile)
+            return True
 
-        # Запускаем все выходные стримеры
-        for streamer_id, streamer in self.output_streamers.items():
-            streamer.apply_profile(standard_profile)
-            streamer.start_streaming()
-            logger.info(f"[RESTREAMER] Запущен стример {streamer_id} в режиме стандартного качества")
+        # Запускаем все источники и стримеры с одинаковым профилем
+        demanded = []
+        for source_id in self.input_sources:
+            if not self.is_demanded(source_id):
+                logger.info(f"[RESTREAMER] Источник {source_id} запустится при появлении подписчика")
+                continue
+            demanded.append(source_id)
+        self._bring_up_sources(demanded, start_standard)
 
-        logger.info("[RESTREAMER] Все источники и стримеры запущены в режиме фиксированного качества")
+        logger.info("[RESTREAMER] Источники и стримеры запускаются в режиме фиксированного качества")
 
     def start_adaptive_mode(self):
         """
@@ -122,8 +515,25 @@ class Restreamer:
         """
         # Запускаем мониторинг соединения
         self.running = True
-        self.monitoring_thread = threading.Thread(target=self._monitor_connection, daemon=True)
-        self.monitoring_thread.start()
+        # Потоки, нужные на старте, поднимаются ниже; цикл управления будит только появившиеся позже
+        self._demanded = {source_id for source_id in self.input_sources if self.is_demanded(source_id)}
+        if self.rtcp_feedback:
+            for source_id in self.input_sources:
+                self.rtcp_feedback.register_stream(source_id)
+            if self.mosaic is not None:
+                self.rtcp_feedback.register_stream("mosaic")
+            self.rtcp_feedback.start()
+        if self.config.control_loop == "async":
+            self.control_loop = AsyncControlLoop(
+                self,
+                poll_interval=int(self.config.timeout) or 5,
+                poll_timeout=self.config.poll_timeout,
+                apply_timeout=self.config.apply_timeout,
+            )
+            self.control_loop.start()
+        else:
+            self.monitoring_thread = threading.Thread(target=self._monitor_connection, daemon=True)
+            self.monitoring_thread.start()
 
         # Получаем профиль высшего качества из первого доступного policy engine
         policy_engine_keys = list(self.policy_engines.keys())
@@ -131,22 +541,27 @@ class Restreamer:
             logger.error("[RESTREAMER] Не найдены policy engines! Невозможно запустить адаптивный режим")
             return
 
-        high_quality_profile = self.policy_engines[policy_engine_keys[0]][0]
+        # Камеры стартуют параллельно на уровнях плана: с распределителем uplink - с долями бюджета,
+        # без него - все на профиле текущего уровня сигнала (на старте - максимальном)
+        plan = self._plan_quality_policy(self.current_signal_level)
+        for source_id, level in plan.items():
+            if level is None and self._source_running(source_id):
+                self._apply_source_level(source_id, None)
+        self._bring_up_sources([source_id for source_id, level in plan.items() if level is not None], self._start_planned_source)
 
-        # Запускаем все источники с максимальным качеством
-        for source_id, source in self.input_sources.items():
-            source.start()
-            logger.info(
-                f"[RESTREAMER] Запущен источник {source_id} в адаптивном режиме с профилем: {high_quality_profile}"
-            )
+        logger.info("[RESTREAMER] Источники и стримеры запускаются в адаптивном режиме")
 
-        # Запускаем выходные стримеры
-        for streamer_id, streamer in self.output_streamers.items():
-            streamer.apply_profile(high_quality_profile)
-            streamer.start_streaming()
-            logger.info(f"[RESTREAMER] Запущен стример {streamer_id} в адаптивном режиме")
+    def poll_signal(self) -> Dict[str, Any]:
+        """Опрашивает роутер и возвращает оценку качества сигнала ({"score", "level"})."""
+        self.signal_checker.authenticate()
+        return self.signal_checker.get_connection_info()
 
-        logger.info("[RESTREAMER] Все источники и стримеры запущены в адаптивном режиме")
+    def decide_signal_level(self, signal: Dict[str, Any]) -> int:
+        """Переводит оценку сигнала в уровень с учётом гистерезиса SignalPolicyEngine."""
+        feedback = self.rtcp_feedback.link_feedback(self.config.feedback_max_age) if self.rtcp_feedback else None
+        level = self.signal_policy.decide(signal["score"], feedback=feedback)
+        self.signal_history.append((time.time(), signal["score"], signal["level"], level))
+        return level
 
     def _monitor_connection(self):
         """
@@ -160,38 +575,135 @@ class Restreamer:
                     self.signal_checker.authenticate()
                 except Exception as e:
                     logger.error(f"[RESTREAMER] Ошибка аутентификации: {e}")
-                    time.sleep(self.config.timeout + 5)
+                    time.sleep(int(self.config.timeout) + 5)
                     continue
                 # Получаем уровень сигнала
-                self.signal_checker.get_connection_info()
-                signal_level = self.signal_checker.get_connection_info()
+                signal_level = self.decide_signal_level(self.signal_checker.get_connection_info())
+                membership_changed = self.refresh_source_membership()
 
-                if signal_level != self.current_signal_level:
+                if signal_level != self.current_signal_level or membership_changed:
                     logger.info(
                         f"[RESTREAMER] Изменение уровня сигнала с {self.current_signal_level} на {signal_level}"
                     )
                     self._apply_quality_policy(signal_level)
                     self.current_signal_level = signal_level
+                else:
+                    self.check_encoder_speed(signal_level)
 
                 check_interval = int(self.config.timeout) or 5  # По умолчанию 5 секунд
                 time.sleep(check_interval)
             except Exception as e:
                 logger.error(f"[RESTREAMER] Ошибка при мониторинге соединения: {e}")
-                time.sleep(self.config.timeout + 5)  # При ошибке увеличиваем интервал проверки
+                time.sleep(int(self.config.timeout) + 5)  # При ошибке увеличиваем интервал проверки
 
-    def _apply_quality_policy(self, signal_level: int):
+    def _source_running(self, source_id: str) -> bool:
+        passthrough = self.passthroughs.get(source_id)
+        return (passthrough is not None and passthrough.is_active()) or self.input_sources[source_id].is_active()
+
+    def refresh_source_membership(self) -> bool:
         """
-        Применяет политику управления качеством на основе уровня сигнала.
+        Отслеживает выпавшие и вернувшиеся камеры, чтобы перераспределить бюджет uplink.
 
-        Args:
-            signal_level: Уровень сигнала (0 - высокий, > 0 - деградация)
+        Камера считается выпавшей, если по текущему плану она должна работать, но источник
+        остановился. Выпавшие камеры пробуем запустить заново на каждом опросе.
+
+        Returns:
+            True, если состав работающих камер изменился и план нужно пересчитать
         """
-        logger.info(f"[RESTREAMER] Обновление политики качества, уровень сигнала: {signal_level}")
+        self._revive_passthroughs()
+        # Разобранные простаивающие конвейеры освобождают свою долю бюджета
+        changed = self._reap_idle_sources()
+        changed = self._wake_demanded_sources() or changed
+        if self.bandwidth is None:
+            return changed
+        for source_id, level in self.current_plan.items():
+            # Камеры, которые ещё поднимаются в фоне, выпавшими не считаются
+            if not self.is_demanded(source_id) or self._bringing_up(source_id):
+                continue
+            if level is not None and source_id not in self.dropped_sources and not self._source_running(source_id):
+                self.dropped_sources.add(source_id)
+                logger.warning(f"[RESTREAMER] Камера {source_id} выпала, её доля бюджета перераспределяется")
+                changed = True
+        for source_id in list(self.dropped_sources):
+            if not self.is_demanded(source_id):
+                self.dropped_sources.discard(source_id)
+                continue
+            try:
+                with self._source_locks[source_id]:
+                    if not self.input_sources[source_id].is_active():
+                        self.input_sources[source_id].start()
+            except Exception as e:
+                logger.debug(f"[RESTREAMER] Камера {source_id} всё ещё недоступна: {e}")
+                continue
+            self.dropped_sources.discard(source_id)
+            logger.info(f"[RESTREAMER] Камера {source_id} вернулась, бюджет будет перераспределён")
+            changed = True
+        return changed
+
+    def check_encoder_speed(self, signal_level: int) -> Dict[str, int]:
+        """
+        Понижает профиль источникам, чей кодировщик работает медленнее реального времени,
+        и снимает понижение по одному уровню, когда кодировщик успевает recover_checks проверок подряд.
 
-        if not self.policy_engines:
-            logger.error("[RESTREAMER] Нет доступных policy engines для применения!")
-            return
+        Returns:
+            Словарь source_id -> уровень, на который источник был переведён
+        """
+        downgraded = {}
+        if self.mosaic is not None and self.mosaic.active:
+            return downgraded
+        plan = self.current_plan or self._plan_quality_policy(signal_level)
+        for source_id, streamer in self.output_streamers.items():
+            level = plan.get(source_id)
+            if level is None or not hasattr(streamer, "encoder_overloaded"):
+                continue
+            try:
+                overloaded = streamer.encoder_overloaded()
+            except Exception as e:
+                logger.error(f"[RESTREAMER] Не удалось проверить скорость кодировщика {source_id}: {e}")
+                continue
+            if not overloaded:
+                if self._recover_encoder(source_id, level):
+                    downgraded[source_id] = level + self.encoder_penalty[source_id]
+                continue
+            self.encoder_healthy[source_id] = 0
+            worst = len(self.policy_engines[source_id].profiles) - 1
+            if level + self.encoder_penalty[source_id] >= worst:
+                continue
+            self.encoder_penalty[source_id] += 1
+            logger.warning(
+                f"[RESTREAMER] Кодировщик {source_id} не успевает за реальным временем, "
+                f"профиль понижен на {self.encoder_penalty[source_id]} уровень"
+            )
+            self._apply_source_level(source_id, level)
+            downgraded[source_id] = min(level + self.encoder_penalty[source_id], worst)
+        return downgraded
+
+    def _recover_encoder(self, source_id: str, level: int) -> bool:
+        """Снимает один уровень понижения, если кодировщик достаточно долго успевает за реальным временем."""
+        if self.encoder_penalty[source_id] == 0:
+            return False
+        self.encoder_healthy[source_id] += 1
+        if self.encoder_healthy[source_id] < self.config.encoder_recover_checks:
+            return False
+        self.encoder_healthy[source_id] = 0
+        self.encoder_penalty[source_id] -= 1
+        logger.info(
+            f"[RESTREAMER] Кодировщик {source_id} успевает за реальным временем, "
+            f"понижение профиля уменьшено до {self.encoder_penalty[source_id]}"
+        )
+        self._apply_source_level(source_id, level)
+        return True
+
+    def _plan_quality_policy(self, signal_level: int) -> Dict[str, Optional[int]]:
+        """
+        Определяет уровень профиля для каждого источника.
 
+        Args:
+            signal_level: Уровень сигнала (0 - высокий, > 0 - деградация)
+
+        Returns:
+            Словарь source_id -> уровень профиля, None - источник нужно отключить
+        """
         policy_engine_keys = list(self.policy_engines.keys())
         first_engine = self.policy_engines[policy_engine_keys[0]]
 
@@ -200,69 +712,127 @@ class Restreamer:
             signal_level = len(first_engine.profiles) - 1
             logger.warning(f"[RESTREAMER] Уровень сигнала превышает количество профилей. Установлен на {signal_level}")
 
+        if self.bandwidth is not None:
+            profiles = {source_id: engine.profiles for source_id, engine in self.policy_engines.items()}
+            idle = {source_id for source_id in self.input_sources if not self.is_demanded(source_id)}
+            self.current_plan = self.bandwidth.plan_for_level(signal_level, profiles, self.dropped_sources | idle)
+            return self.current_plan
+
         # При очень низком качестве оставляем только DAI камеру ("oakd")
         if signal_level >= len(first_engine.profiles) - 1:
-            # Отключаем все RTSP-камеры
-            for source_id, source in self.input_sources.items():
-                if source_id != "oakd":
-                    source.stop()
-                    logger.info(f"[RESTREAMER] Отключен источник {source_id} из-за низкого качества сигнала")
-
-            # Применяем низкокачественный профиль для DAI
-            dai_profile = first_engine.profiles[signal_level]
-            if "oakd" in self.input_sources and "oakd" in self.output_streamers:
-                # Проверяем, запущен ли источник
-                if hasattr(self.input_sources["oakd"], "is_active") and not self.input_sources["oakd"].is_active():
-                    self.input_sources["oakd"].start(dai_profile)
-
-                # Если у источника есть метод restart_if_needed, используем его
-                if hasattr(self.input_sources["oakd"], "restart_if_needed"):
-                    self.input_sources["oakd"].restart_if_needed(dai_profile)
-
-                # Обновляем профиль для выходного стримера
-                self.output_streamers["oakd"].update_profile(dai_profile)
-                logger.info(f"[RESTREAMER] DAI камера настроена на низкое качество: {dai_profile}")
-            else:
+            if "oakd" not in self.input_sources or "oakd" not in self.output_streamers:
                 logger.error("[RESTREAMER] Источник или стример для DAI камеры не найден!")
+            return {
+                source_id: signal_level if source_id == "oakd" and self.is_demanded(source_id) else None
+                for source_id in self.input_sources
+            }
 
-        else:
-            # Приоритизируем включение всех источников и настраиваем их согласно политикам
-            for source_id, policy_engine in self.policy_engines.items():
-                # Получаем соответствующий профиль для текущего уровня сигнала
-                if signal_level in policy_engine.profiles:
-                    profile = policy_engine.profiles[signal_level]
-                else:
-                    logger.error(f"[RESTREAMER] Недопустимый уровень сигнала {signal_level} для {source_id}")
-                    continue
+        return {source_id: signal_level if self.is_demanded(source_id) else None for source_id in self.policy_engines}
+
+    def _apply_source_level(self, source_id: str, level: Optional[int]):
+        """Переводит один источник на уровень профиля или отключает его (level=None)."""
+        with self._source_locks[source_id]:
+            if level is None:
+                self._disable_passthrough(source_id)
+                self.input_sources[source_id].stop()
+                logger.info(f"[RESTREAMER] Отключен источник {source_id} из-за низкого качества сигнала")
+                return
 
-                # Применяем профиль к источнику
-                if source_id in self.input_sources:
-                    # Проверяем, есть ли метод is_active у источника
-                    source_active = True
-                    if hasattr(self.input_sources[source_id], "is_active"):
-                        source_active = self.input_sources[source_id].is_active()
-
-                    # Запускаем источник, если он был остановлен
-                    if not source_active:
-                        self.input_sources[source_id].start(profile)
-                        logger.info(f"[RESTREAMER] Перезапущен источник {source_id} с профилем: {profile}")
-                    else:
-                        # Иначе обновляем профиль через policy engine
-                        policy_engine.evaluate_and_apply({"level": signal_level})
-                        logger.info(f"[RESTREAMER] Обновлен профиль для источника {source_id}: {profile}")
-
-                # Обновляем настройки выходного стримера
-                if source_id in self.output_streamers:
-                    self.output_streamers[source_id].update_profile(profile)
-                    logger.info(f"[RESTREAMER] Обновлен профиль для стримера {source_id}: {profile}")
+            profiles = self.policy_engines[source_id].profiles
+            level = min(level + self.encoder_penalty[source_id], len(profiles) - 1)
+            profile = profiles[level]
+
+            # На родном профиле камеры ретранслируем поток без перекодирования
+            if self._passthrough_allowed(source_id, level):
+                self._enable_passthrough(source_id)
+                return
+            self._disable_passthrough(source_id)
+
+            self._apply_source_profile(source_id, profile)
+
+            # Запускаем источник, если он был остановлен
+            if not self.input_sources[source_id].is_active():
+                self.input_sources[source_id].start()
+                logger.info(f"[RESTREAMER] Перезапущен источник {source_id} с профилем: {profile}")
+
+            # Обновляем настройки выходного стримера
+            if source_id in self.output_streamers:
+                self._profile_target(source_id).update_profile(profile)
+                logger.info(f"[RESTREAMER] Обновлен профиль для стримера {source_id}: {profile}")
+
+    def _apply_source_profile(self, source_id: str, profile: dict):
+        """
+        Переключает камеру на ближайший родной поток (основной или дополнительный) под профиль,
+        а декодер ffmpeg - на разрешение профиля, чтобы не уменьшать кадры на стороне сервиса.
+        """
+        if source_id == "oakd":
+            return
+        if self.config.input_backend == "ffmpeg" or len(self.config.device_configs[source_id].streams) > 1:
+            self.input_sources[source_id].apply_profile(profile)
+
+    def _profile_target(self, source_id: str):
+        """Куда передавать профиль: детектор движения подменяет его облегчённым, пока камера статична."""
+        return self.motion_gates.get(source_id) or self.output_streamers[source_id]
+
+    def _abort_source_update(self, source_id: str):
+        """
+        Прерывает зависшее применение профиля.
+
+        В режиме process процесс конвейера завершается и перезапускается при следующей команде.
+        В режиме thread убиваются процессы ffmpeg стримера и останавливается источник, чтобы
+        поток применения вышел из ожидания и отпустил блокировку источника. Повторно профиль
+        применяет цикл управления.
+        """
+        pipeline = self.pipelines.get(source_id)
+        if pipeline:
+            if pipeline.is_alive():
+                pipeline.process.terminate()
+                logger.warning(f"[RESTREAMER] Процесс конвейера {source_id} завершён из-за зависания")
+            return
+        streamer = self.output_streamers.get(source_id)
+        if hasattr(streamer, "abort"):
+            streamer.abort()
+        source = self.input_sources[source_id]
+        if hasattr(source, "abort"):
+            source.abort()
+        logger.warning(f"[RESTREAMER] Применение профиля для {source_id} не уложилось в дедлайн, кодировщик и источник остановлены")
+
+    def _apply_quality_policy(self, signal_level: int):
+        """
+        Применяет политику управления качеством на основе уровня сигнала.
+
+        Args:
+            signal_level: Уровень сигнала (0 - высокий, > 0 - деградация)
+        """
+        logger.info(f"[RESTREAMER] Обновление политики качества, уровень сигнала: {signal_level}")
+
+        if not self.policy_engines:
+            logger.error("[RESTREAMER] Нет доступных policy engines для применения!")
+            return
+
+        if self.update_mosaic(signal_level):
+            return
+
+        for source_id, level in self._plan_quality_policy(signal_level).items():
+            try:
+                self._apply_source_level(source_id, level)
+            except Exception as e:
+                logger.error(f"[RESTREAMER] Ошибка применения профиля для {source_id}: {e}")
 
     def stop(self):
         """Останавливает все источники, стримеры и мониторинг."""
         self.running = False
+        self._stopping.set()
+        for thread in list(self._bring_up_threads.values()):
+            thread.join(timeout=self.config.source_open_timeout + 1)
 
         # Ожидаем завершения потока мониторинга
+        if self.control_loop:
+            self.control_loop.stop()
         if self.monitoring_thread and self.monitoring_thread.is_alive():
             self.monitoring_thread.join(timeout=2)
+        if self.rtcp_feedback:
+            self.rtcp_feedback.stop()
 
         # Останавливаем источники
         for source_id, source in self.input_sources.items():
@@ -272,15 +842,27 @@ class Restreamer:
             except Exception as e:
                 logger.error(f"[RESTREAMER] Ошибка при остановке источника {source_id}: {e}")
 
+        # Останавливаем мозаику и ретрансляцию без перекодирования
+        self._disable_mosaic()
+        for source_id in self.passthroughs:
+            self._disable_passthrough(source_id)
+
         # Останавливаем стримеры
         for streamer_id, streamer in self.output_streamers.items():
             try:
                 streamer.stop_streaming()
-                streamer.close()
+                if hasattr(streamer, "shutdown"):
+                    streamer.shutdown()
+                else:
+                    streamer.close()
                 logger.info(f"[RESTREAMER] Остановлен стример {streamer_id}")
             except Exception as e:
                 logger.error(f"[RESTREAMER] Ошибка при остановке стримера {streamer_id}: {e}")
 
+        # Завершаем процессы конвейеров
+        for pipeline in self.pipelines.values():
+            pipeline.shutdown()
+
         logger.info("[RESTREAMER] Все источники и стримеры остановлены")
 
     def get_status(self) -> Dict[str, Any]:
@@ -291,6 +873,33 @@ class Restreamer:
             Словарь с информацией о статусе всех компонентов
         """
         status = {"signal_level": self.current_signal_level, "running": self.running, "sources": {}, "streamers": {}}
+        status["policy"] = self.signal_policy.get_stats()
+        if self.rtcp_feedback:
+            status["feedback"] = self.rtcp_feedback.get_stats()
+        status["signal_history"] = [
+            {"time": round(ts, 1), "score": round(score, 1), "raw_level": raw_level, "level": level}
+            for ts, score, raw_level, level in list(self.signal_history)
+        ]
+        if self.bandwidth is not None:
+            status["bandwidth"] = {**self.bandwidth.get_stats(), "dropped": sorted(self.dropped_sources)}
+        if self.control_loop:
+            status["control"] = self.control_loop.get_status()
+        if self.bring_up:
+            status["bring_up"] = {source_id: dict(state) for source_id, state in self.bring_up.items()}
+        if self.mosaic is not None:
+            status["mosaic"] = self.mosaic.get_stats()
+        if self.config.lazy_start:
+            status["demand"] = {
+                source_id: {
+                    "subscribers": self.subscribers[source_id],
+                    "demanded": self.is_demanded(source_id),
+                    "running": self._source_running(source_id),
+                }
+                for source_id in self.input_sources
+            }
+            status["idle_teardowns"] = self.idle_teardowns
+        if self.motion_gates:
+            status["motion"] = {source_id: gate.get_stats() for source_id, gate in self.motion_gates.items()}
 
         # Собираем информацию об источниках
         for source_id, source in self.input_sources.items():
@@ -303,9 +912,21 @@ class Restreamer:
 
         # Собираем информацию о стримерах
         for streamer_id, streamer in self.output_streamers.items():
-            if hasattr(streamer, "get_status"):
+            if streamer_id in self.passthroughs and self.passthroughs[streamer_id].is_active():
+                status["streamers"][streamer_id] = self.passthroughs[streamer_id].get_status()
+            elif hasattr(streamer, "get_status"):
                 status["streamers"][streamer_id] = streamer.get_status()
             else:
                 status["streamers"][streamer_id] = {"active": "unknown"}
+        mosaic_streamer = self.mosaic.streamer if self.mosaic is not None else None
+        if mosaic_streamer is not None:
+            status["streamers"]["mosaic"] = mosaic_streamer.get_status()
+
+        # Гистограммы задержки кадра от захвата до записи в канал ffmpeg по каждому потоку
+        status["latency"] = {
+            streamer_id: streamer_status["latency"]
+            for streamer_id, streamer_status in status["streamers"].items()
+            if "latency" in streamer_status
+        }
 
         return status